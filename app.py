@@ -1,19 +1,78 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, g
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g, jsonify, has_request_context, Response, stream_with_context, send_file, abort, make_response
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from flask_migrate import Migrate
 from datetime import datetime, timedelta
 import calendar
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple, deque, OrderedDict
+from functools import wraps
+import click
+import csv
+import hashlib
+import io
 import json
+import time
+import numpy as np
 import pytz
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy.orm import selectinload
+from werkzeug.http import is_resource_modified
 
 
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'
 
+# Prometheus metrics, served by /metrics. Under gunicorn each worker writes its values to
+# PROMETHEUS_MULTIPROC_DIR (set up by gunicorn.conf.py) and /metrics sums all workers.
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request wall time by endpoint', ['endpoint', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+REQUESTS = Counter('http_requests', 'Requests by endpoint and status', ['endpoint', 'method', 'status'])
+POOL_CHECKOUTS = Counter('db_pool_checkouts', 'Connections handed out by the pool')
+POOL_WAITS = Counter('db_pool_waits', 'Checkouts that found no idle connection in the pool')
+POOL_TIMEOUTS = Counter('db_pool_timeouts', 'Checkouts that gave up after pool_timeout')
+POOL_CHECKOUT_SECONDS = Histogram(
+    'db_pool_checkout_seconds', 'Time to get a connection from the pool',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 20, 30))
+POOL_IN_USE = Gauge('db_pool_connections_in_use', 'Connections currently checked out',
+                    multiprocess_mode='livesum')
+CHECKOUTS = Counter('sales_checkouts', 'Checkout attempts by result', ['result'])
+PAGE_CACHE = Counter('page_cache_requests', 'Cached page requests by endpoint and result', ['endpoint', 'result'])
+CATALOGUE_CACHE = Counter('catalogue_cache_lookups', 'Catalogue cache lookups by result (hit, miss)', ['result'])
+SALE_LINE_ITEMS = Histogram('sale_line_items', 'Cart lines per completed sale',
+                            buckets=(1, 2, 3, 4, 5, 7, 10, 15, 20, 50))
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that reports checkouts, waits and timeouts to Prometheus."""
+
+    def connect(self):
+        if self.checkedin() == 0:
+            POOL_WAITS.inc()
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+        POOL_CHECKOUTS.inc()
+        POOL_IN_USE.inc()
+        return connection
+
+    def _do_return_conn(self, record):
+        POOL_IN_USE.dec()
+        super()._do_return_conn(record)
+
 app.jinja_env.filters['tojson'] = json.dumps
 
 # Use PostgreSQL in production (from DATABASE_URL env var), SQLite locally
@@ -24,21 +83,32 @@ if database_url:
     if database_url.startswith('postgres://'):
         database_url = database_url.replace('postgres://', 'postgresql://')
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-    # PostgreSQL connection pool settings for production
+    # PostgreSQL connection pool settings for production. Every request thread of a worker
+    # (gunicorn.conf.py exports GUNICORN_THREADS) gets its own connection, so requests never
+    # queue for the pool behind each other; DB_POOL_SIZE overrides it. The database has to
+    # allow workers * (pool_size + max_overflow) connections.
     app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
         'pool_pre_ping': True,  # Verify connections before use
         'pool_recycle': 300,    # Recycle connections every 5 minutes
         'pool_timeout': 20,     # Wait 20 seconds for connection
-        'max_overflow': 0,      # Don't create extra connections
-        'pool_size': 1          # Use single connection for free tier
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 2)),  # For the background job thread (its session + progress updates)
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or os.environ.get('GUNICORN_THREADS') or 1),
+        'poolclass': MeteredQueuePool
     }
 else:
     # Local development uses SQLite
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': MeteredQueuePool}
 
 app.config['TIMEZONE'] = 'Africa/Nairobi'
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+
+def include_in_migrations(obj, name, type_, reflected, compare_to):
+    # The stock search index (FTS5 tables on SQLite, trigram index on PostgreSQL) lives
+    # outside the models, keep autogenerate from proposing to drop it
+    return not (reflected and compare_to is None and (name or '').startswith(('stock_item_fts', 'ix_stock_item_search')))
+
+migrate = Migrate(app, db, include_object=include_in_migrations)
 
 # Models
 class User(db.Model):
@@ -57,13 +127,25 @@ class StockItem(db.Model):
     description = db.Column(db.Text)
     sales = db.relationship('SaleItem', back_populates='stock_item')  # Added relationship
 
+# Backs the POS product search (lower(name) LIKE 'q%'); varchar_pattern_ops lets PostgreSQL
+# use it for LIKE prefixes under any collation
+db.Index('ix_stock_item_name_lower', db.func.lower(StockItem.name).label('lower_name'),
+         postgresql_ops={'lower_name': 'varchar_pattern_ops'})
+
+def _sale_business_date(context):
+    # Local calendar date of the row's (naive UTC) date, stored so reports group and filter on it
+    sale_date = context.get_current_parameters().get('date')
+    return local_business_date(sale_date) if sale_date is not None else None
+
 class Sale(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, default=datetime.utcnow)
+    business_date = db.Column(db.Date, default=_sale_business_date)  # date in TIMEZONE, filled on insert
     total_amount = db.Column(db.Float)
     payment_method = db.Column(db.String(20))
     mpesa_code = db.Column(db.String(50))
     created_by = db.Column(db.String(80))
+    idempotency_key = db.Column(db.String(64))  # sent by the till, makes checkout retries safe
     items = db.relationship('SaleItem', back_populates='sale')  # Added back_populates
 
 class SaleItem(db.Model):
@@ -72,18 +154,1677 @@ class SaleItem(db.Model):
     item_id = db.Column(db.Integer, db.ForeignKey('stock_item.id'))
     quantity = db.Column(db.Integer)
     price = db.Column(db.Float)
+    # Snapshot of the stock item at sale time, so edits and deletions don't rewrite history
+    name = db.Column(db.String(100))
+    unit_cost = db.Column(db.Float)  # buying price per unit
     sale = db.relationship('Sale', back_populates='items')  # Added relationship
     stock_item = db.relationship('StockItem', back_populates='sales')
 
+# Indexes for the reporting, history and POS queries (see migration 5c0e8a1f7b23)
+db.Index('ix_sale_date_id', Sale.date, Sale.id)                      # date ranges, keyset paging
+# seller / payment method filters over business_date ranges (re-keyed in migration d9f3b1c7e5a2)
+db.Index('ix_sale_created_by_business_date', Sale.created_by, Sale.business_date)
+db.Index('ix_sale_payment_method_business_date', Sale.payment_method, Sale.business_date)
+db.Index('ix_sale_item_sale_id', SaleItem.sale_id)
+db.Index('ux_sale_idempotency_key', Sale.idempotency_key, unique=True)  # checkout replays (migration a7d2c4e6f8b0)
+db.Index('ix_sale_business_date', Sale.business_date)                 # day filters and grouping (migration c5e1a9d3f7b2)
+db.Index('ix_sale_item_item_id', SaleItem.item_id)
+db.Index('ix_stock_item_in_stock', StockItem.name, StockItem.id,     # in-stock catalogue for the POS
+         postgresql_where=StockItem.quantity > 0, sqlite_where=StockItem.quantity > 0)
+
+# Reporting rollups, maintained by checkout() and rebuilt with `flask rebuild-rollups`
+class DailySalesSummary(db.Model):
+    business_date = db.Column(db.Date, primary_key=True)  # local (TIMEZONE) date of the sale
+    sales_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    cost = db.Column(db.Float, nullable=False, default=0.0)
+    profit = db.Column(db.Float, nullable=False, default=0.0)
+
+class DailyProductSales(db.Model):
+    business_date = db.Column(db.Date, primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100))
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    cost = db.Column(db.Float, nullable=False, default=0.0)
+    profit = db.Column(db.Float, nullable=False, default=0.0)
+
+# Version stamps shared by all workers; bumped in the same transaction as the data they cover
+class CacheVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime)  # naive UTC time of the last bump, for Last-Modified
+
+# Long admin operations (backups, resets, rollup rebuilds) run as background jobs, see run_job()
+class BackgroundJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text)                      # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued/running/done/failed
+    done = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    message = db.Column(db.String(255))
+    result_path = db.Column(db.String(255))          # file produced by the job, if any
+    error = db.Column(db.Text)
+    created_by = db.Column(db.String(80))
+    worker = db.Column(db.String(100))               # 'host:pid' of the process running it
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    heartbeat_at = db.Column(db.DateTime, default=datetime.utcnow)  # touched while queued or running
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+def bump_cache_version(name):
+    """Increment a version stamp inside the current transaction (the caller commits)."""
+    now = datetime.utcnow()
+    updated = db.session.execute(
+        db.update(CacheVersion).where(CacheVersion.name == name)
+        .values(version=CacheVersion.version + 1, changed_at=now)
+    ).rowcount
+    if not updated:
+        db.session.add(CacheVersion(name=name, version=1, changed_at=now))
+
+def read_cache_version(name):
+    return db.session.query(CacheVersion.version).filter_by(name=name).scalar() or 0
+
+def read_cache_stamps(names):
+    """{name: (version, changed_at)} for several stamps in one query; never bumped ones are (0, None)."""
+    stamps = {name: (0, None) for name in names}
+    for name, version, changed_at in db.session.query(
+            CacheVersion.name, CacheVersion.version, CacheVersion.changed_at).filter(CacheVersion.name.in_(names)):
+        stamps[name] = (version, changed_at)
+    return stamps
+
+# Stock search index. SQLite: an FTS5 trigram table fed by triggers, created at startup.
+# PostgreSQL: a pg_trgm GIN index over STOCK_SEARCH_DOCUMENT, created by a migration.
+STOCK_SEARCH_MIN_TERM = 3  # trigram indexes cannot serve shorter terms, those use LIKE
+STOCK_SEARCH_DOCUMENT = "coalesce(name, '') || ' ' || coalesce(size, '') || ' ' || coalesce(description, '')"
+
+STOCK_SEARCH_FTS_TOKENIZER = 'trigram'  # needs SQLite 3.34+
+_sqlite_fts_available = None
+
+def ensure_stock_search_index():
+    """
+    Create the SQLite FTS5 index over stock name/size/description and its sync triggers.
+    SQLite builds without FTS5 or the trigram tokenizer (older than 3.34) get no index,
+    and search_stock() falls back to LIKE.
+    """
+    global _sqlite_fts_available
+    if db.engine.dialect.name != 'sqlite':
+        return
+    _sqlite_fts_available = None
+    try:
+        _create_sqlite_stock_search_index()
+    except OperationalError as e:
+        app.logger.warning(f"Stock search index not created, searching with LIKE instead: {e.orig}")
+
+def _create_sqlite_stock_search_index():
+    with db.engine.begin() as conn:
+        if conn.execute(db.text("SELECT 1 FROM sqlite_master WHERE name = 'stock_item_fts'")).first():
+            return
+        conn.execute(db.text(
+            "CREATE VIRTUAL TABLE stock_item_fts USING fts5("
+            "name, size, description, content='stock_item', content_rowid='id', "
+            f"tokenize='{STOCK_SEARCH_FTS_TOKENIZER}')"
+        ))
+        conn.execute(db.text(
+            "CREATE TRIGGER stock_item_fts_ai AFTER INSERT ON stock_item BEGIN "
+            "INSERT INTO stock_item_fts(rowid, name, size, description) "
+            "VALUES (new.id, new.name, new.size, new.description); END"
+        ))
+        conn.execute(db.text(
+            "CREATE TRIGGER stock_item_fts_ad AFTER DELETE ON stock_item BEGIN "
+            "INSERT INTO stock_item_fts(stock_item_fts, rowid, name, size, description) "
+            "VALUES ('delete', old.id, old.name, old.size, old.description); END"
+        ))
+        # Only text changes touch the index, not the quantity updates made at checkout
+        conn.execute(db.text(
+            "CREATE TRIGGER stock_item_fts_au AFTER UPDATE OF name, size, description ON stock_item BEGIN "
+            "INSERT INTO stock_item_fts(stock_item_fts, rowid, name, size, description) "
+            "VALUES ('delete', old.id, old.name, old.size, old.description); "
+            "INSERT INTO stock_item_fts(rowid, name, size, description) "
+            "VALUES (new.id, new.name, new.size, new.description); END"
+        ))
+        conn.execute(db.text("INSERT INTO stock_item_fts(stock_item_fts) VALUES ('rebuild')"))
+
+def sqlite_fts_available():
+    global _sqlite_fts_available
+    if _sqlite_fts_available is None:
+        _sqlite_fts_available = db.session.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE name = 'stock_item_fts'")
+        ).first() is not None
+    return _sqlite_fts_available
+
+_pg_trgm_available = None
+
+def pg_trgm_available():
+    global _pg_trgm_available
+    if _pg_trgm_available is None:
+        _pg_trgm_available = db.session.execute(
+            db.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).first() is not None
+    return _pg_trgm_available
+
+def contains_pattern(term):
+    """'%term%' for ILIKE with escape='\\', term's own wildcards matched literally."""
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def like_stock_search(term):
+    """Unindexed case-insensitive LIKE '%term%' search over name, size and description."""
+    pattern = contains_pattern(term)
+    return StockItem.query.filter(
+        db.or_(
+            StockItem.name.ilike(pattern, escape='\\'),
+            StockItem.size.ilike(pattern, escape='\\'),
+            StockItem.description.ilike(pattern, escape='\\')
+        )
+    ).order_by(StockItem.id).all()
+
+def search_stock(term):
+    """
+    Stock items whose name, size or description contains term (case-insensitive), best match first.
+    Uses the FTS5 index on SQLite (LIKE when it could not be created) and the pg_trgm index
+    on PostgreSQL.
+    """
+    dialect = db.engine.dialect.name
+    if len(term) < STOCK_SEARCH_MIN_TERM:
+        return like_stock_search(term)
+
+    if dialect == 'sqlite' and sqlite_fts_available():
+        return StockItem.query.from_statement(db.text(
+            "SELECT stock_item.* FROM stock_item "
+            "JOIN stock_item_fts ON stock_item_fts.rowid = stock_item.id "
+            "WHERE stock_item_fts MATCH :phrase ORDER BY stock_item_fts.rank, stock_item.id"
+        ).bindparams(phrase='"' + term.replace('"', '""') + '"')).all()
+
+    if dialect == 'postgresql':
+        document = db.literal_column(STOCK_SEARCH_DOCUMENT)
+        query = StockItem.query.filter(document.ilike(contains_pattern(term), escape='\\'))
+        if pg_trgm_available():
+            query = query.order_by(db.func.similarity(document, term).desc(), StockItem.id)
+        else:
+            query = query.order_by(StockItem.id)
+        return query.all()
+
+    return like_stock_search(term)
+
+def enable_sqlite_wal(dbapi_connection, connection_record):
+    # WAL lets readers and one writer work at once (e.g. a background job streaming a backup
+    # while requests and the job's progress updates write); the setting sticks to the file
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.close()
+
 # Create tables
 with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', enable_sqlite_wal)
     db.create_all()
+    ensure_stock_search_index()
 
 
 @app.template_filter('format_currency')
 def format_currency_filter(value):
     return "{:,.2f}".format(value)
 
+# Reporting queries
+def format_day_bucket(value):
+    """Normalise a DB date bucket (date on PostgreSQL, 'YYYY-MM-DD' string on SQLite)."""
+    return value if isinstance(value, str) else value.strftime('%Y-%m-%d')
+
+def sale_date_range(query, start_date=None, end_date=None):
+    """Restrict a query on Sale to local business dates start_date..end_date (either may be None)."""
+    if start_date is not None:
+        query = query.filter(Sale.business_date >= start_date)
+    if end_date is not None:
+        query = query.filter(Sale.business_date <= end_date)
+    return query
+
+def profit_by_day(start_date=None, end_date=None):
+    """
+    Per local day revenue, cost and profit for sales on local dates start_date..end_date
+    (default: all). Returns { 'YYYY-MM-DD': {'sales': .., 'cost': .., 'profit': .., 'count': ..} }
+    in one round trip. 'sales' uses Sale.total_amount and falls back to the line totals when it is missing.
+    """
+    line_totals = db.session.query(
+        SaleItem.sale_id.label('sale_id'),
+        db.func.sum(SaleItem.price * SaleItem.quantity).label('revenue'),
+        db.func.sum(db.func.coalesce(SaleItem.unit_cost, 0.0) * SaleItem.quantity).label('cost')
+    ).join(Sale, Sale.id == SaleItem.sale_id)
+    line_totals = sale_date_range(line_totals, start_date, end_date).group_by(SaleItem.sale_id).subquery()
+
+    day = Sale.business_date
+    rows = sale_date_range(db.session.query(
+        day.label('day'),
+        db.func.count(Sale.id),
+        db.func.sum(db.func.coalesce(Sale.total_amount, line_totals.c.revenue, 0.0)),
+        db.func.sum(db.func.coalesce(line_totals.c.cost, 0.0)),
+        db.func.sum(db.func.coalesce(line_totals.c.revenue, 0.0) - db.func.coalesce(line_totals.c.cost, 0.0))
+    ).outerjoin(line_totals, line_totals.c.sale_id == Sale.id), start_date, end_date) \
+     .group_by(day).order_by(day).all()
+
+    return {
+        format_day_bucket(d): {'sales': float(sales or 0.0), 'cost': float(cost or 0.0),
+                      'profit': float(profit or 0.0), 'count': count}
+        for d, count, sales, cost, profit in rows
+    }
+
+def product_sales_by_day(start_date=None, end_date=None):
+    """
+    Per local day, per product line totals for sales on local dates start_date..end_date (default: all).
+    Returns a list of dicts with 'item_id', 'name', 'quantity', 'sale_date', 'revenue', 'cost', 'profit'.
+    """
+    day = Sale.business_date
+    # Lines of deleted stock items have no item_id any more: group those by their name snapshot
+    deleted_item_name = db.case((SaleItem.item_id.is_(None), SaleItem.name))
+    rows = sale_date_range(db.session.query(
+        day.label('day'),
+        SaleItem.item_id,
+        db.func.max(SaleItem.name),  # one row per item and day, even if it was renamed that day
+        db.func.sum(SaleItem.quantity),
+        db.func.sum(SaleItem.price * SaleItem.quantity),
+        db.func.sum(db.func.coalesce(SaleItem.unit_cost, 0.0) * SaleItem.quantity)
+    ).join(Sale, Sale.id == SaleItem.sale_id), start_date, end_date) \
+     .group_by(day, SaleItem.item_id, deleted_item_name).order_by(day).all()
+
+    items = []
+    for d, item_id, name, qty, revenue, cost in rows:
+        revenue = float(revenue or 0.0)
+        cost = float(cost or 0.0)
+        items.append({
+            'item_id': item_id,
+            'name': name if name is not None else (f"Item#{item_id}" if item_id is not None else 'Deleted item'),
+            'quantity': int(qty or 0),
+            'sale_date': d,
+            'revenue': revenue,
+            'cost': cost,
+            'profit': revenue - cost
+        })
+    return items
+
+def local_business_date(utc_dt):
+    """Local (TIMEZONE) calendar date of a naive UTC datetime."""
+    tz = pytz.timezone(app.config.get('TIMEZONE', 'Africa/Nairobi'))
+    return pytz.UTC.localize(utc_dt).astimezone(tz).date()
+
+def _rollup_upsert(model, rows, keys):
+    """INSERT rollup rows, adding the numeric columns onto any existing row with the same keys."""
+    if not rows:
+        return
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = model.__table__
+    stmt = insert(table).values(rows)
+    increments = [c for c in rows[0] if c not in keys and c != 'name']
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={c: table.c[c] + stmt.excluded[c] for c in increments}
+    )
+    db.session.execute(stmt)
+
+def daily_summary_rows(start_date, end_date):
+    """Rollup totals for local dates start_date..end_date, keyed by 'YYYY-MM-DD'."""
+    rows = DailySalesSummary.query.filter(
+        DailySalesSummary.business_date >= start_date,
+        DailySalesSummary.business_date <= end_date
+    ).order_by(DailySalesSummary.business_date).all()
+    return {
+        row.business_date.strftime('%Y-%m-%d'): {'sales': row.revenue, 'cost': row.cost,
+                                                 'profit': row.profit, 'count': row.sales_count}
+        for row in rows
+    }
+
+def period_comparison(start_date, end_date, product_name=None):
+    """
+    Revenue, profit and product_name's profit for local dates start_date..end_date and for the
+    equal-length period just before it, in one query over both windows of the rollups.
+    Returns {'current': {...}, 'previous': {...}} with 'revenue', 'profit', 'product_profit'.
+    """
+    previous_start = start_date - timedelta(days=(end_date - start_date).days + 1)
+
+    def window_sums(model, column):
+        in_current = model.business_date >= start_date
+        return (db.func.coalesce(db.func.sum(db.case((in_current, column), else_=0.0)), 0.0),
+                db.func.coalesce(db.func.sum(db.case((in_current, 0.0), else_=column)), 0.0))
+
+    summary = db.select(
+        *window_sums(DailySalesSummary, DailySalesSummary.revenue),
+        *window_sums(DailySalesSummary, DailySalesSummary.profit)
+    ).where(DailySalesSummary.business_date.between(previous_start, end_date)).subquery()
+    product = db.select(*window_sums(DailyProductSales, DailyProductSales.profit)).where(
+        DailyProductSales.name == product_name,
+        DailyProductSales.business_date.between(previous_start, end_date)
+    ).subquery()
+    (revenue, previous_revenue, profit, previous_profit,
+     product_profit, previous_product_profit) = db.session.execute(
+        db.select(summary, product).select_from(summary.join(product, db.true()))  # two one-row aggregates
+    ).one()
+    return {
+        'current': {'revenue': revenue, 'profit': profit, 'product_profit': product_profit},
+        'previous': {'revenue': previous_revenue, 'profit': previous_profit,
+                     'product_profit': previous_product_profit}
+    }
+
+def percent_change(current, previous):
+    """Change from previous to current in percent, 0.0 when the previous value is zero."""
+    return (current - previous) / abs(previous) * 100 if previous else 0.0
+
+# Columnar product analytics. For long ranges the profit report covers up to one
+# DailyProductSales row per product and day (hundreds of thousands of rows). They are read
+# in batches straight into NumPy columns, and every per product / per day figure of the
+# report is a vectorised group-by over those columns instead of a loop over row dicts.
+PRODUCT_COLUMNS_BATCH = 50000
+
+def daily_product_columns(start_date, end_date):
+    """
+    Per product rollup rows for local dates start_date..end_date as columns:
+    'day' (days since start_date), 'product' (index into 'names'), 'quantity', 'revenue',
+    'profit'. Products are keyed by name (Item#<id> when unnamed), numbered in order of
+    first appearance in (date, item) order.
+    """
+    codes = {}
+    chunks = []
+    table = DailyProductSales.__table__
+    # Core rows (no ORM loading); the date comes back as the driver returns it (a date, or
+    # 'YYYY-MM-DD' text on SQLite), NumPy parses either
+    result = db.session.connection().execution_options(yield_per=PRODUCT_COLUMNS_BATCH).execute(
+        db.select(db.type_coerce(table.c.business_date, db.String), table.c.item_id, table.c.name,
+                  table.c.quantity, table.c.revenue, table.c.profit)
+        .where(table.c.business_date >= start_date, table.c.business_date <= end_date)
+        .order_by(table.c.business_date, table.c.item_id)
+    )
+    for rows in result.partitions():
+        dates, item_ids, names, quantity, revenue, profit = zip(*rows)
+        chunks.append((
+            np.array(dates, dtype='datetime64[D]'),
+            np.fromiter((codes.setdefault(name if name is not None else f"Item#{item_id}", len(codes))
+                         for item_id, name in zip(item_ids, names)), dtype=np.int64, count=len(rows)),
+            np.array(quantity, dtype=np.int64),
+            np.array(revenue, dtype=np.float64),
+            np.array(profit, dtype=np.float64)
+        ))
+    if chunks:
+        dates, product, quantity, revenue, profit = (np.concatenate(column) for column in zip(*chunks))
+    else:
+        dates, product = np.empty(0, dtype='datetime64[D]'), np.empty(0, dtype=np.int64)
+        quantity, revenue, profit = np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+    return {
+        'day': (dates - np.datetime64(start_date, 'D')).astype(np.int64),
+        'product': product,
+        'quantity': quantity,
+        'revenue': revenue,
+        'profit': profit,
+        'names': list(codes)
+    }
+
+def product_report(start_date, end_date, today, top_n=10):
+    """
+    Product figures of the profit report for local dates start_date..end_date:
+    'top_products' (top_n by profit), 'most_sold' ((name, quantity) over the range) and
+    'todays_items' (today's sales per product). Ties go to the product seen first.
+    Best sellers per day / week / month come from top_sellers().
+    """
+    columns = daily_product_columns(start_date, end_date)
+    names, day, product = columns['names'], columns['day'], columns['product']
+    quantity, revenue, profit = columns['quantity'], columns['revenue'], columns['profit']
+    products = len(names)
+
+    # Totals per product
+    product_quantity = np.bincount(product, weights=quantity, minlength=products).astype(np.int64)
+    product_revenue = np.bincount(product, weights=revenue, minlength=products)
+    product_profit = np.bincount(product, weights=profit, minlength=products)
+
+    top_products = []
+    for i in np.argsort(-product_profit, kind='stable')[:top_n].tolist():
+        product_rev, product_pro = float(product_revenue[i]), float(product_profit[i])
+        top_products.append({
+            'name': names[i],
+            'quantity_sold': int(product_quantity[i]),
+            'revenue': product_rev,
+            'profit': product_pro,
+            'margin': round(product_pro / product_rev * 100 if product_rev else 0.0, 1)
+        })
+
+    most_sold = ('N/A', 0)
+    if products:
+        best = int(np.argmax(product_quantity))
+        most_sold = (names[best], int(product_quantity[best]))
+
+    # Today's sales per product, in order of first appearance
+    todays_items = []
+    today_rows = np.flatnonzero(day == (today - start_date).days)
+    if today_rows.size:
+        today_products, first_row, product_of_row = np.unique(product[today_rows], return_index=True, return_inverse=True)
+        today_quantity = np.bincount(product_of_row, weights=quantity[today_rows]).astype(np.int64)
+        today_revenue = np.bincount(product_of_row, weights=revenue[today_rows])
+        today_profit = np.bincount(product_of_row, weights=profit[today_rows])
+        for i in np.argsort(first_row).tolist():
+            item_quantity, item_revenue = int(today_quantity[i]), float(today_revenue[i])
+            todays_items.append({
+                'name': names[int(today_products[i])],
+                'quantity': item_quantity,
+                'revenue': item_revenue,
+                'profit': float(today_profit[i]),
+                'unit_price': item_revenue / item_quantity if item_quantity > 0 else 0.0
+            })
+
+    return {
+        'top_products': top_products,
+        'most_sold': most_sold,
+        'todays_items': todays_items
+    }
+
+# Best sellers per calendar period, ranked in the database with a window function over the
+# daily product rollup, so only k rows per period come back whatever the range.
+TOP_SELLER_BUCKETS = ('day', 'week', 'month')
+TOP_SELLERS_MAX_K = 50
+
+def period_start_expr(column, bucket):
+    """SQL expression for the first date of the day, ISO week (Monday) or month a date column falls in."""
+    if bucket == 'day':
+        return column
+    if db.engine.dialect.name == 'postgresql':
+        return db.cast(db.func.date_trunc(bucket, column), db.Date)
+    if bucket == 'week':
+        return db.func.date(column, '-6 days', 'weekday 1')
+    return db.func.date(column, 'start of month')
+
+def top_sellers(start_date, end_date, bucket='day', k=1):
+    """
+    The k best selling products (by quantity, ties by name) of every day, week or month with
+    sales between local dates start_date and end_date; only sales inside the range count, so
+    the first and last week or month can be partial.
+    Returns [{'period': 'YYYY-MM-DD' (first day of the day/week/month), 'items': [{'rank',
+    'name', 'quantity', 'revenue', 'profit'}, ...]}, ...] in date order.
+    """
+    name = db.func.coalesce(DailyProductSales.name,
+                            db.literal('Item#') + db.cast(DailyProductSales.item_id, db.String))
+    period = period_start_expr(DailyProductSales.business_date, bucket)
+    totals = db.select(
+        period.label('period'),
+        name.label('name'),
+        db.func.sum(DailyProductSales.quantity).label('quantity'),
+        db.func.sum(DailyProductSales.revenue).label('revenue'),
+        db.func.sum(DailyProductSales.profit).label('profit')
+    ).where(
+        DailyProductSales.business_date.between(start_date, end_date)
+    ).group_by(period, name).subquery()
+    ranked = db.select(
+        totals,
+        db.func.row_number().over(partition_by=totals.c.period,
+                                  order_by=(totals.c.quantity.desc(), totals.c.name)).label('rank')
+    ).subquery()
+    rows = db.session.execute(
+        db.select(ranked).where(ranked.c.rank <= k).order_by(ranked.c.period, ranked.c.rank)
+    ).all()
+
+    periods = []
+    for row in rows:
+        key = format_day_bucket(row.period)
+        if not periods or periods[-1]['period'] != key:
+            periods.append({'period': key, 'items': []})
+        periods[-1]['items'].append({'rank': row.rank, 'name': row.name, 'quantity': int(row.quantity),
+                                     'revenue': row.revenue, 'profit': row.profit})
+    return periods
+
+def top_seller_args(args):
+    """(bucket, k) from request arguments 'bucket' and 'k', defaulting to each day's single best seller."""
+    bucket = args.get('bucket', 'day')
+    if bucket not in TOP_SELLER_BUCKETS:
+        bucket = 'day'
+    k = args.get('k', 1, type=int) or 1
+    return bucket, min(max(k, 1), TOP_SELLERS_MAX_K)
+
+def record_sale_rollups(sale, lines):
+    """
+    Add one sale to the daily rollups, inside the caller's transaction.
+    lines: list of dicts with 'item_id', 'name', 'quantity', 'revenue', 'cost'.
+    """
+    record_sales_rollups([(sale.business_date, sale.total_amount, lines)])
+
+def record_sales_rollups(sales):
+    """
+    Add several sales to the daily rollups with one upsert per table, inside the caller's
+    transaction. sales: list of (Sale.business_date, total_amount, lines) as for record_sale_rollups().
+    """
+    per_day, per_item = {}, {}
+    for business_date, total_amount, lines in sales:
+        # One row per product and day (the same item can appear on several cart lines)
+        for line in lines:
+            row = per_item.setdefault((business_date, line['item_id']), {
+                'business_date': business_date, 'item_id': line['item_id'], 'name': line['name'],
+                'quantity': 0, 'revenue': 0.0, 'cost': 0.0, 'profit': 0.0
+            })
+            row['quantity'] += line['quantity']
+            row['revenue'] += line['revenue']
+            row['cost'] += line['cost']
+            row['profit'] += line['revenue'] - line['cost']
+
+        revenue = sum(line['revenue'] for line in lines)
+        cost = sum(line['cost'] for line in lines)
+        day = per_day.setdefault(business_date, {
+            'business_date': business_date, 'sales_count': 0, 'revenue': 0.0, 'cost': 0.0, 'profit': 0.0
+        })
+        day['sales_count'] += 1
+        day['revenue'] += float(total_amount) if total_amount is not None else revenue
+        day['cost'] += cost
+        day['profit'] += revenue - cost
+
+    # In key order, so concurrent checkouts lock the rollup rows in the same order (no deadlocks)
+    _rollup_upsert(DailySalesSummary, [per_day[key] for key in sorted(per_day)], ['business_date'])
+    _rollup_upsert(DailyProductSales, [per_item[key] for key in sorted(per_item)], ['business_date', 'item_id'])
+
+def rebuild_rollups():
+    """Recompute both rollup tables from the raw sale and sale_item rows."""
+    DailyProductSales.query.delete()
+    DailySalesSummary.query.delete()
+
+    db.session.bulk_insert_mappings(DailySalesSummary, [
+        {'business_date': datetime.strptime(day, '%Y-%m-%d').date(), 'sales_count': totals['count'],
+         'revenue': totals['sales'], 'cost': totals['cost'], 'profit': totals['profit']}
+        for day, totals in profit_by_day().items()
+    ])
+
+    # Deleting a stock item clears item_id on its sale lines. Those rows keep their own
+    # product rows under a negative stand-in id per name; every report keys products by name.
+    product_sales = product_sales_by_day()
+    deleted_names = sorted({row['name'] for row in product_sales if row['item_id'] is None})
+    deleted_ids = {name: -n for n, name in enumerate(deleted_names, 1)}
+    product_rows = [
+        {'business_date': row['sale_date'],
+         'item_id': row['item_id'] if row['item_id'] is not None else deleted_ids[row['name']],
+         'name': row['name'], 'quantity': row['quantity'], 'revenue': row['revenue'], 'cost': row['cost'],
+         'profit': row['profit']}
+        for row in product_sales
+    ]
+    db.session.bulk_insert_mappings(DailyProductSales, product_rows)
+    sales_changed()
+    db.session.commit()
+    return len(product_rows)
+
+@app.cli.command('rebuild-rollups')
+@click.option('--if-empty', is_flag=True, help='Only rebuild when the rollups have never been built.')
+def rebuild_rollups_command(if_empty):
+    """Backfill the daily sales rollups from existing sales."""
+    if if_empty and DailySalesSummary.query.first() is not None:
+        print("Rollups already populated, skipping.")
+        return
+    product_rows = rebuild_rollups()
+    print(f"✓ Rebuilt {DailySalesSummary.query.count()} daily rows and {product_rows} product rows.")
+
+# Sales history pagination
+SALES_PAGE_SIZE = 50
+MAX_SALES_PAGE_SIZE = 200
+
+def sales_cursor(sale):
+    """Opaque keyset cursor for the position just after this sale ('<iso date>_<id>')."""
+    return f"{sale.date.isoformat()}_{sale.id}"
+
+def parse_sales_cursor(value):
+    """Inverse of sales_cursor(); None for a missing or malformed cursor (start from the newest sale)."""
+    if not value:
+        return None
+    try:
+        date_str, sale_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(date_str), int(sale_id)
+    except ValueError:
+        return None
+
+def page_size_arg():
+    """'per_page' query argument, clamped to 1..MAX_SALES_PAGE_SIZE."""
+    per_page = request.args.get('per_page', SALES_PAGE_SIZE, type=int)
+    return max(1, min(per_page or SALES_PAGE_SIZE, MAX_SALES_PAGE_SIZE))
+
+def keyset_page(query, cursor, page_size):
+    """
+    Newest-first (date, id) keyset pagination of a Sale query.
+    Returns (sales, next_cursor); next_cursor is None on the last page.
+    The cost depends on page_size, not on how many sales come before the cursor.
+    """
+    position = parse_sales_cursor(cursor)
+    if position:
+        query = query.filter(db.tuple_(Sale.date, Sale.id) < position)
+    rows = query.order_by(Sale.date.desc(), Sale.id.desc()).limit(page_size + 1).all()
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, sales_cursor(rows[-1])
+    return rows, None
+
+def filtered_sales_query(args):
+    """
+    Sale query with the /sales filters from args applied: start_date / end_date (local
+    'YYYY-MM-DD', inclusive), payment_method, seller, min_amount, max_amount.
+    Missing, 'all' or malformed values are ignored.
+    """
+    sales_q = Sale.query
+
+    # Date filters (on the stored local business date)
+    start_date = args.get('start_date')
+    if start_date:
+        try:
+            sales_q = sales_q.filter(Sale.business_date >= datetime.strptime(start_date, '%Y-%m-%d').date())
+        except ValueError:
+            pass
+
+    end_date = args.get('end_date')
+    if end_date:
+        try:
+            sales_q = sales_q.filter(Sale.business_date <= datetime.strptime(end_date, '%Y-%m-%d').date())
+        except ValueError:
+            pass
+
+    # Payment method and seller filters
+    payment_method = args.get('payment_method')
+    if payment_method and payment_method != 'all':
+        sales_q = sales_q.filter(Sale.payment_method == payment_method)
+
+    seller = args.get('seller')
+    if seller and seller != 'all':
+        sales_q = sales_q.filter(Sale.created_by == seller)
+
+    # Amount filters
+    min_amount = args.get('min_amount')
+    if min_amount:
+        try:
+            sales_q = sales_q.filter(Sale.total_amount >= float(min_amount))
+        except ValueError:
+            pass
+
+    max_amount = args.get('max_amount')
+    if max_amount:
+        try:
+            sales_q = sales_q.filter(Sale.total_amount <= float(max_amount))
+        except ValueError:
+            pass
+
+    return sales_q
+
+def url_with_args(endpoint, **overrides):
+    """URL for endpoint keeping the current query arguments (filters), with overrides applied."""
+    args = request.args.to_dict()
+    args.update(overrides)
+    return url_for(endpoint, **{k: v for k, v in args.items() if v is not None})
+
+# Seller / payment method values for the /sales filter dropdowns. Built with SELECT DISTINCT
+# once per worker, extended in place when checkout() sees a new value, and re-read after
+# SALES_FILTER_CACHE_TTL seconds so values added by the other workers show up too.
+# The sets are shared by the worker's request threads, only touch them under the lock.
+SALES_FILTER_CACHE_TTL = 300
+_sales_filter_cache = {'sellers': None, 'payment_methods': None, 'loaded_at': 0.0}
+_sales_filter_lock = threading.Lock()
+
+def sales_filter_values():
+    """Sorted (sellers, payment_methods) for the filter dropdowns."""
+    cache = _sales_filter_cache
+    if cache['sellers'] is None or time.monotonic() - cache['loaded_at'] > SALES_FILTER_CACHE_TTL:
+        sellers = {value for (value,) in db.session.query(Sale.created_by).distinct() if value}
+        methods = {value for (value,) in db.session.query(Sale.payment_method).distinct() if value}
+        with _sales_filter_lock:
+            cache.update(sellers=sellers, payment_methods=methods, loaded_at=time.monotonic())
+    with _sales_filter_lock:
+        return sorted(cache['sellers'] or ()), sorted(cache['payment_methods'] or ())
+
+def note_sales_filter_values(seller, payment_method):
+    """Add a committed sale's seller and payment method to the cached dropdown values."""
+    cache = _sales_filter_cache
+    with _sales_filter_lock:
+        if cache['sellers'] is None:
+            return
+        if seller:
+            cache['sellers'].add(seller)
+        if payment_method:
+            cache['payment_methods'].add(payment_method)
+
+def invalidate_sales_filter_values():
+    with _sales_filter_lock:
+        _sales_filter_cache['sellers'] = None
+
+# Sales export
+SALES_EXPORT_COLUMNS = ['sale_id', 'date', 'seller', 'payment_method', 'mpesa_code', 'sale_total',
+                        'item_id', 'item', 'quantity', 'unit_price', 'line_total']
+SALES_EXPORT_BATCH = 1000
+# Larger exports are written by a background job: streamed, they could outlast the gunicorn
+# worker timeout (30 s, gunicorn.conf.py) and reach the browser cut short
+SALES_EXPORT_STREAM_MAX = 100000
+
+def sales_export_line_count(filters):
+    """Number of rows sales_export_rows(filters) yields."""
+    return filtered_sales_query(filters).outerjoin(SaleItem, SaleItem.sale_id == Sale.id) \
+        .with_entities(db.func.count()).scalar()
+
+def sales_export_rows(filters):
+    """
+    One dict per sale line (SALES_EXPORT_COLUMNS) for the sales matching the /sales filters,
+    oldest first. Rows are read in batches of SALES_EXPORT_BATCH from a server-side cursor,
+    so memory does not grow with the number of sales. Dates are local time with their UTC offset.
+    The query is only built once iteration starts, in the session of the streaming context.
+    """
+    tz = pytz.timezone(app.config.get('TIMEZONE', 'Africa/Nairobi'))
+    rows = filtered_sales_query(filters).outerjoin(SaleItem, SaleItem.sale_id == Sale.id) \
+        .with_entities(Sale.id, Sale.date, Sale.created_by, Sale.payment_method, Sale.mpesa_code,
+                       Sale.total_amount, SaleItem.item_id, SaleItem.name, SaleItem.quantity, SaleItem.price) \
+        .order_by(Sale.date, Sale.id, SaleItem.id) \
+        .yield_per(SALES_EXPORT_BATCH)
+    for sale_id, date, seller, method, mpesa_code, total, item_id, name, quantity, price in rows:
+        yield {
+            'sale_id': sale_id,
+            'date': pytz.UTC.localize(date).astimezone(tz).isoformat() if date else None,
+            'seller': seller,
+            'payment_method': method,
+            'mpesa_code': mpesa_code,
+            'sale_total': total,
+            'item_id': item_id,
+            'item': name if name is not None else (f"Item#{item_id}" if item_id is not None else None),
+            'quantity': quantity,
+            'unit_price': price,
+            'line_total': price * quantity if price is not None and quantity is not None else None
+        }
+
+def sales_export_chunks(rows, fmt='csv'):
+    """Serialise export rows as CSV (with a header) or JSON lines, yielding one string per batch."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=SALES_EXPORT_COLUMNS) if fmt == 'csv' else None
+    if writer:
+        writer.writeheader()
+    for count, row in enumerate(rows, 1):
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row) + '\n')
+        if count % SALES_EXPORT_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+# Product catalogue cache
+CatalogueItem = namedtuple('CatalogueItem', 'id name buying_price selling_price size quantity description')
+_CatalogueSnapshot = namedtuple('_CatalogueSnapshot', 'version loaded_at items order lower_names')
+
+class CatalogueCache:
+    """
+    Read-through copy of the stock catalogue, one per worker process.
+
+    add/edit/delete_stock bump the 'catalogue' CacheVersion row in the same transaction.
+    Each worker re-reads that stamp at most every check_interval seconds and reloads when it
+    moved, so POS and stock list reads normally do not touch the database at all.
+    Checkout changes stock levels without a bump: this worker applies its own sales in place,
+    and every copy is reloaded after max_age seconds (checkout re-validates stock in the DB).
+    Catalogues with more than max_items rows are not cached; callers then query the database.
+
+    Shared by all request threads of the worker: readers take a reference to the current
+    snapshot and never lock, reloads and in-place sale updates hold _lock. hits/misses are
+    unlocked and only approximate; the catalogue_cache_lookups counter on /metrics is exact.
+    """
+
+    def __init__(self, check_interval=5, max_age=60, max_items=20000):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'items': len(snapshot.items) if snapshot and snapshot.items is not None else 0,
+            'version': snapshot.version if snapshot else None
+        }
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _hit(self, snapshot):
+        self.hits += 1
+        CATALOGUE_CACHE.labels('hit').inc()
+        return snapshot
+
+    def _current(self):
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and now - snapshot.loaded_at < self.max_age:
+            if now - self._checked_at < self.check_interval:
+                return self._hit(snapshot)
+            self._checked_at = now
+            if read_cache_version('catalogue') == snapshot.version:
+                return self._hit(snapshot)
+
+        with self._lock:
+            if self._snapshot is not snapshot and self._snapshot is not None:
+                # Another thread reloaded while we waited
+                return self._hit(self._snapshot)
+            self.misses += 1
+            CATALOGUE_CACHE.labels('miss').inc()
+            # Read the stamp before the rows: a bump in between only causes an extra reload
+            version = read_cache_version('catalogue')
+            rows = db.session.query(
+                StockItem.id, StockItem.name, StockItem.buying_price, StockItem.selling_price,
+                StockItem.size, StockItem.quantity, StockItem.description
+            ).order_by(StockItem.id).limit(self.max_items + 1).all()
+            if len(rows) > self.max_items:
+                items = order = lower_names = None
+            else:
+                items = {row[0]: CatalogueItem(*row) for row in rows}
+                order = sorted(items, key=lambda item_id: (items[item_id].name, item_id))
+                lower_names = {item_id: item.name.lower() for item_id, item in items.items()}
+            snapshot = _CatalogueSnapshot(version, time.monotonic(), items, order, lower_names)
+            self._snapshot = snapshot
+            self._checked_at = snapshot.loaded_at
+            return snapshot
+
+    def items(self):
+        """Every catalogue item in id order, or None when the catalogue is too large to cache."""
+        snapshot = self._current()
+        if snapshot.items is None:
+            return None
+        return [snapshot.items[item_id] for item_id in sorted(snapshot.items)]
+
+    def search(self, term, limit):
+        """
+        In-stock items whose name starts with, then contains, the lower-cased term.
+        Returns (items, truncated), or None when the catalogue is too large to cache.
+        """
+        snapshot = self._current()
+        if snapshot.items is None:
+            return None
+        prefix, substring = [], []
+        for item_id in snapshot.order:
+            item = snapshot.items[item_id]
+            if item.quantity <= 0:
+                continue
+            name = snapshot.lower_names[item_id]
+            if name.startswith(term):
+                prefix.append(item)
+                if len(prefix) > limit:
+                    break
+            elif term in name:
+                substring.append(item)
+        matches = prefix + substring
+        return matches[:limit], len(matches) > limit
+
+    def apply_sale(self, quantities):
+        """Apply a committed sale's stock decrements ({item_id: quantity}) to this worker's copy."""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.items is None:
+                return
+            for item_id, quantity in quantities.items():
+                item = snapshot.items.get(item_id)
+                if item is not None:
+                    snapshot.items[item_id] = item._replace(quantity=item.quantity - quantity)
+
+catalogue_cache = CatalogueCache(
+    check_interval=app.config.get('CATALOGUE_CACHE_CHECK_INTERVAL', 5),
+    max_age=app.config.get('CATALOGUE_CACHE_MAX_AGE', 60),
+    max_items=app.config.get('CATALOGUE_CACHE_MAX_ITEMS', 20000)
+)
+
+def catalogue_changed():
+    """Call before committing an add/edit/delete of stock items."""
+    bump_cache_version('catalogue')
+    catalogue_cache.invalidate()
+
+def sales_changed():
+    """Call before committing checkouts and any other change to sales or the rollups."""
+    bump_cache_version('sales')
+
+# Rendered page cache. Report pages are cached per worker by route, query string and user,
+# and validated against the CacheVersion stamps of the data they show. The same stamps make
+# their ETag and Last-Modified, so a refresh with nothing new gets a 304 before the view runs.
+class PageCache:
+    """
+    LRU of rendered page bodies, one per worker process, shared by its request threads (_lock).
+    Entries are keyed without the data version and replaced when it moves, so the cache never
+    holds more than max_entries pages however often the data changes.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (version, body, mimetype)
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """(body, mimetype) rendered at this data version, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1:]
+
+    def put(self, key, version, body, mimetype):
+        with self._lock:
+            self._entries[key] = (version, body, mimetype)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+page_cache = PageCache(max_entries=app.config.get('PAGE_CACHE_MAX_ENTRIES', 256))
+
+def _build_token():
+    """Hash of this file and the templates, so validators change with every deploy that changes pages."""
+    digest = hashlib.sha1()
+    paths = [os.path.abspath(__file__)]
+    for root, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        paths += [os.path.join(root, name) for name in files]
+    for path in sorted(paths):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# Same in every worker (content, not start time), or set APP_BUILD to a release id
+APP_BUILD = os.environ.get('APP_BUILD') or _build_token()
+
+def cached_page(*stamps):
+    """
+    Serve a logged-in GET page from page_cache while the named CacheVersion stamps stay put.
+    Responses get a weak ETag and a Last-Modified from the stamps and must be revalidated
+    (private, no-cache); conditional requests that still match get a 304 without rendering.
+    Pages are cached per user (the layout shows their name and role links) and per local day
+    (reports default to today), and ETags include APP_BUILD so a deploy invalidates them.
+    Requests with flash messages waiting are rendered as usual.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            endpoint = request.endpoint
+            if request.method != 'GET' or 'user_id' not in session or '_flashes' in session:
+                PAGE_CACHE.labels(endpoint, 'bypass').inc()
+                return view(*args, **kwargs)
+
+            # Read the stamps before the view reads the data: a bump in between only costs a re-render
+            current = read_cache_stamps(stamps)
+            version = tuple(current[name][0] for name in stamps)
+            tz = pytz.timezone(app.config.get('TIMEZONE', 'Africa/Nairobi'))
+            today = datetime.now(tz).date()
+            key = (endpoint, tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))),
+                   session['user_id'], session.get('role'), today)
+            etag = hashlib.sha1(repr((key, version, APP_BUILD)).encode()).hexdigest()
+            # The page also changes at local midnight, so it is never older than today's start
+            start_of_day = tz.localize(datetime.combine(today, datetime.min.time())) \
+                .astimezone(pytz.UTC).replace(tzinfo=None)
+            last_modified = max([changed_at for _, changed_at in current.values() if changed_at] + [start_of_day])
+
+            def with_validators(response):
+                response.set_etag(etag, weak=True)
+                response.last_modified = last_modified
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+                return response
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                PAGE_CACHE.labels(endpoint, 'not_modified').inc()
+                return with_validators(Response(status=304))
+
+            cached = page_cache.get(key, version)
+            if cached is not None:
+                PAGE_CACHE.labels(endpoint, 'hit').inc()
+                return with_validators(Response(cached[0], mimetype=cached[1]))
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or '_flashes' in session:
+                PAGE_CACHE.labels(endpoint, 'bypass').inc()
+                return response
+            PAGE_CACHE.labels(endpoint, 'miss').inc()
+            page_cache.put(key, version, response.get_data(), response.mimetype)
+            return with_validators(response)
+        return wrapper
+    return decorator
+
+# Request instrumentation. Each request's wall time and SQL (statement count, total time,
+# slowest statement) are collected on g from engine events. Requests slower than
+# SLOW_REQUEST_MS are logged with their statements, and every endpoint keeps a rolling
+# window of samples per worker for /admin/perf.
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 500))
+app.config['PERF_WINDOW'] = int(os.environ.get('PERF_WINDOW', 500))
+SLOW_LOG_MAX_STATEMENTS = 50
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class RequestStats:
+    """Rolling per-endpoint request samples, one instance per worker process."""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._samples = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, wall_ms, sql_count, sql_ms, slowest):
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append((wall_ms, sql_count, sql_ms, slowest))
+            self._totals[endpoint] = self._totals.get(endpoint, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+    def summary(self):
+        """One dict per endpoint over its window, slowest p95 first."""
+        with self._lock:
+            snapshot = {endpoint: (list(samples), self._totals[endpoint])
+                        for endpoint, samples in self._samples.items()}
+        rows = []
+        for endpoint, (samples, total) in snapshot.items():
+            walls = sorted(s[0] for s in samples)
+            slowest = max((s[3] for s in samples if s[3]), key=lambda s: s[0], default=None)
+            rows.append({
+                'endpoint': endpoint,
+                'requests': total,
+                'window': len(samples),
+                'p50_ms': _percentile(walls, 50),
+                'p95_ms': _percentile(walls, 95),
+                'max_ms': walls[-1],
+                'avg_sql': sum(s[1] for s in samples) / len(samples),
+                'max_sql': max(s[1] for s in samples),
+                'avg_sql_ms': sum(s[2] for s in samples) / len(samples),
+                'slowest_sql_ms': slowest[0] if slowest else 0.0,
+                'slowest_sql': slowest[1] if slowest else ''
+            })
+        rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+        return rows
+
+request_stats = RequestStats(window=app.config['PERF_WINDOW'])
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._perf_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    perf = g.get('perf')
+    started = getattr(context, '_perf_started', None)
+    if perf is None or started is None:
+        return
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    perf['sql_count'] += 1
+    perf['sql_ms'] += elapsed_ms
+    if perf['slowest'] is None or elapsed_ms > perf['slowest'][0]:
+        perf['slowest'] = (elapsed_ms, statement)
+    if len(perf['statements']) < SLOW_LOG_MAX_STATEMENTS:
+        perf['statements'].append((elapsed_ms, statement))
+
+with app.app_context():
+    event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+
+def _one_line(statement, limit=300):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + '...'
+
+@app.before_request
+def start_request_timer():
+    g.perf = {'started': time.perf_counter(), 'sql_count': 0, 'sql_ms': 0.0,
+              'slowest': None, 'statements': []}
+
+@app.after_request
+def record_request_timing(response):
+    perf = g.pop('perf', None)
+    if perf is None or request.endpoint == 'static':
+        return response
+    wall_ms = (time.perf_counter() - perf['started']) * 1000
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_LATENCY.labels(endpoint, request.method).observe(wall_ms / 1000)
+    REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+    slowest = (perf['slowest'][0], _one_line(perf['slowest'][1])) if perf['slowest'] else None
+    request_stats.record(endpoint, wall_ms, perf['sql_count'], perf['sql_ms'], slowest)
+    response.headers['Server-Timing'] = f"app;dur={wall_ms:.1f}, db;dur={perf['sql_ms']:.1f}"
+
+    if wall_ms >= app.config['SLOW_REQUEST_MS']:
+        lines = [f"  {ms:8.1f} ms  {_one_line(statement)}" for ms, statement in perf['statements']]
+        if perf['sql_count'] > len(perf['statements']):
+            lines.append(f"  ... {perf['sql_count'] - len(perf['statements'])} more statements")
+        app.logger.warning(
+            f"Slow request: {request.method} {request.full_path.rstrip('?')} ({endpoint}) "
+            f"{wall_ms:.0f} ms, {perf['sql_count']} SQL statements in {perf['sql_ms']:.0f} ms"
+            + ''.join('\n' + line for line in lines)
+        )
+    return response
+
+# Bulk stock import
+STOCK_IMPORT_BATCH = 1000
+STOCK_IMPORT_MAX_ERRORS = 500   # errors kept for the report, the rest are only counted
+
+def parse_stock_row(row):
+    """Validate one CSV row. Returns (values, errors); values is None when the row is rejected."""
+    errors = []
+    name = (row.get('name') or '').strip()
+    size = (row.get('size') or '').strip()
+    if not name:
+        errors.append('name is required')
+    elif len(name) > 100:
+        errors.append('name is longer than 100 characters')
+    if len(size) > 50:
+        errors.append('size is longer than 50 characters')
+
+    values = {'name': name, 'size': size or None, 'description': (row.get('description') or '').strip() or None}
+    for field, cast in (('buying_price', float), ('selling_price', float), ('quantity', int)):
+        raw = (row.get(field) or '').strip().replace(',', '')
+        if not raw:
+            errors.append(f'{field} is required')
+            continue
+        try:
+            values[field] = cast(raw)
+        except ValueError:
+            errors.append(f'{field} "{raw}" is not a valid {"whole number" if cast is int else "number"}')
+            continue
+        if values[field] < 0:
+            errors.append(f'{field} cannot be negative')
+    return (None, errors) if errors else (values, [])
+
+def _upsert_stock_batch(batch, add_quantities):
+    """
+    Insert or update one batch of parsed rows ({(name, size): values}) keyed by name + size.
+    Existing items are matched with one query and changed with one executemany UPDATE,
+    new items are added with one executemany INSERT. Returns (inserted, updated).
+    """
+    size_key = db.func.coalesce(StockItem.size, '')
+    existing = {}
+    for item_id, name, size, quantity in db.session.query(
+        StockItem.id, StockItem.name, size_key, StockItem.quantity
+    ).filter(db.tuple_(StockItem.name, size_key).in_(list(batch))).order_by(StockItem.id):
+        existing.setdefault((name, size), (item_id, quantity))   # duplicates: update the oldest
+
+    updates, inserts = [], []
+    for key, values in batch.items():
+        if key in existing:
+            item_id, quantity = existing[key]
+            # name and size are the key, leave them (and the search index) untouched
+            row = {k: v for k, v in values.items() if k not in ('name', 'size')}
+            row['id'] = item_id
+            if add_quantities:
+                row['quantity'] = quantity + values['quantity']
+            updates.append(row)
+        else:
+            inserts.append(values)
+    if updates:
+        db.session.execute(db.update(StockItem), updates)
+    if inserts:
+        db.session.execute(db.insert(StockItem), inserts)
+    return len(inserts), len(updates)
+
+def import_stock_csv(stream, add_quantities=False):
+    """
+    Upsert stock items from a CSV (header: name, buying_price, selling_price, quantity, and
+    optionally size, description) in a single pass over the stream. Valid rows are written in
+    batches of STOCK_IMPORT_BATCH; invalid rows are skipped and reported. A name + size that
+    appears twice in the file keeps its last row. The caller commits.
+    Returns a summary dict with counts, 'errors' ([(line, [messages])]) and 'seconds'.
+    """
+    started = time.perf_counter()
+    summary = {'rows': 0, 'inserted': 0, 'updated': 0, 'rejected': 0, 'errors': []}
+    reader = csv.DictReader(stream)
+    reader.fieldnames = [(f or '').strip().lower() for f in reader.fieldnames or []]
+    missing = [f for f in ('name', 'buying_price', 'selling_price', 'quantity') if f not in reader.fieldnames]
+    if missing:
+        summary['errors'].append((1, [f"missing column(s): {', '.join(missing)}"]))
+        summary['seconds'] = time.perf_counter() - started
+        return summary
+
+    batch = {}
+    for row in reader:
+        summary['rows'] += 1
+        values, errors = parse_stock_row(row)
+        if errors:
+            summary['rejected'] += 1
+            if len(summary['errors']) < STOCK_IMPORT_MAX_ERRORS:
+                summary['errors'].append((reader.line_num, errors))
+            continue
+        key = (values['name'], values['size'] or '')
+        if key in batch and add_quantities:
+            values['quantity'] += batch[key]['quantity']
+        batch[key] = values
+        if len(batch) >= STOCK_IMPORT_BATCH:
+            inserted, updated = _upsert_stock_batch(batch, add_quantities)
+            summary['inserted'] += inserted
+            summary['updated'] += updated
+            batch = {}
+    if batch:
+        inserted, updated = _upsert_stock_batch(batch, add_quantities)
+        summary['inserted'] += inserted
+        summary['updated'] += updated
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+# Background jobs. Each worker process runs submitted jobs on its own single thread, so a
+# long backup or rebuild neither hits the gunicorn timeout nor ties up a request worker.
+# State and progress live in the background_job table, so any worker can show them.
+JOB_TYPES = {}   # kind -> (label, function(job_id, progress, **params) -> (message, result_path))
+JOB_PROGRESS_INTERVAL = 1.0   # seconds between progress writes
+JOB_HEARTBEAT_INTERVAL = 10.0  # seconds between heartbeat writes for this worker's jobs
+JOB_STALE_AFTER = 120          # seconds without a heartbeat before an unfinished job counts as interrupted
+_job_executor = None
+_job_executor_lock = threading.Lock()
+_worker_jobs = set()   # ids of the jobs queued or running on this worker's job thread
+
+def background_job(kind, label):
+    """Register a function that can be submitted with submit_job(kind, ...)."""
+    def register(fn):
+        JOB_TYPES[kind] = (label, fn)
+        return fn
+    return register
+
+def _worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _update_job(job_id, **values):
+    # On its own connection: the job's session may be in the middle of a transaction
+    job_ids = job_id if isinstance(job_id, list) else [job_id]
+    with db.engine.begin() as conn:
+        conn.execute(db.update(BackgroundJob).where(BackgroundJob.id.in_(job_ids)).values(**values))
+
+def submit_job(kind, created_by=None, **params):
+    """Record a job and queue it on this worker's job thread. Returns the job id."""
+    global _job_executor
+    if kind not in JOB_TYPES:
+        raise ValueError(f"Unknown job type {kind!r}")
+    job = BackgroundJob(kind=kind, params=json.dumps(params), created_by=created_by, worker=_worker_name())
+    db.session.add(job)
+    db.session.commit()
+    with _job_executor_lock:
+        # Created lazily so the thread belongs to the gunicorn worker, not the preloading master
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job')
+            threading.Thread(target=_job_heartbeat, name='job-heartbeat', daemon=True).start()
+        _worker_jobs.add(job.id)
+    _job_executor.submit(run_job, job.id)
+    return job.id
+
+def jobs_active():
+    """Number of jobs queued or running on this worker (gunicorn.conf.py holds off recycling)."""
+    return len(_worker_jobs)
+
+def touch_job_heartbeats():
+    """Record that this worker's queued and running jobs are still alive."""
+    with _job_executor_lock:
+        job_ids = list(_worker_jobs)
+    if job_ids:
+        _update_job(job_ids, heartbeat_at=datetime.utcnow())
+
+def _job_heartbeat():
+    # Daemon thread next to the job thread; it dies with the worker, and so do the heartbeats
+    while True:
+        time.sleep(JOB_HEARTBEAT_INTERVAL)
+        try:
+            with app.app_context():
+                touch_job_heartbeats()
+        except Exception as e:
+            app.logger.warning(f"Could not record job heartbeats: {e}")
+
+def wait_for_jobs(timeout):
+    """Wait up to timeout seconds for this worker's jobs to finish. True if they all did."""
+    deadline = time.monotonic() + timeout
+    while jobs_active() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    return not jobs_active()
+
+def run_job(job_id):
+    """Run one job in its own app context, recording progress, result or the error."""
+    try:
+        _run_job(job_id)
+    finally:
+        with _job_executor_lock:
+            _worker_jobs.discard(job_id)
+
+def _run_job(job_id):
+    with app.app_context():
+        job = db.session.get(BackgroundJob, job_id)
+        label, fn = JOB_TYPES[job.kind]
+        params = json.loads(job.params or '{}')
+        _update_job(job_id, status='running', started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow(),
+                    message=f'{label} started')
+        last_write = [0.0]
+
+        def progress(done, total=None, message=None):
+            now = time.monotonic()
+            if now - last_write[0] >= JOB_PROGRESS_INTERVAL:
+                last_write[0] = now
+                _update_job(job_id, done=done, total=total, **({'message': message} if message else {}))
+
+        try:
+            message, result_path = fn(job_id, progress, **params)
+            db.session.commit()
+            _update_job(job_id, status='done', finished_at=datetime.utcnow(), message=message,
+                        result_path=result_path)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Job {job_id} ({job.kind}) failed: {e}")
+            _update_job(job_id, status='failed', finished_at=datetime.utcnow(),
+                        message=f'{label} failed: {e}'[:255], error=traceback.format_exc())
+        finally:
+            db.session.remove()
+
+def mark_interrupted_jobs():
+    """
+    Fail the unfinished jobs whose worker stopped sending heartbeats (restarts, deploys, crashes).
+    Works across hosts and containers, unlike probing the pid in BackgroundJob.worker.
+    """
+    now = datetime.utcnow()
+    db.session.execute(
+        db.update(BackgroundJob)
+        .where(BackgroundJob.status.in_(['queued', 'running']),
+               db.func.coalesce(BackgroundJob.heartbeat_at, BackgroundJob.created_at)
+               < now - timedelta(seconds=JOB_STALE_AFTER))
+        .values(status='failed', finished_at=now, message='Interrupted: the worker running it stopped')
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+BACKUP_DIR = os.environ.get('BACKUP_DIR', 'backups')
+
+def write_sales_backup(progress, filters=None, prefix='sales_backup', fmt='csv'):
+    """Stream the sales export (CSV or JSON lines) to a file in BACKUP_DIR. Returns (path, line rows)."""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    path = os.path.join(BACKUP_DIR, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}")
+    total = sales_export_line_count(filters or {})
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        for chunk in sales_export_chunks(sales_export_rows(filters or {}), fmt):
+            csvfile.write(chunk)
+            written = min(written + SALES_EXPORT_BATCH, total)
+            progress(written, total, f'Writing {path}')
+    return path, total
+
+@background_job('sales_backup', 'Sales backup')
+def sales_backup_job(job_id, progress, filters=None, fmt='csv', prefix='sales_backup'):
+    path, rows = write_sales_backup(progress, filters, prefix, fmt)
+    return f'Backup created: {path} ({rows} lines)', path
+
+@background_job('rebuild_rollups', 'Report rollup rebuild')
+def rebuild_rollups_job(job_id, progress):
+    progress(0, 1, 'Recomputing daily rollups')
+    product_rows = rebuild_rollups()
+    return f'Rebuilt {DailySalesSummary.query.count()} daily rows and {product_rows} product rows', None
+
+@background_job('reset_sales', 'Sales data reset')
+def reset_sales_job(job_id, progress, backup=False):
+    path = None
+    if backup:
+        path, _ = write_sales_backup(progress)
+    progress(0, None, 'Deleting sales')
+    SaleItem.query.delete()
+    Sale.query.delete()
+    DailyProductSales.query.delete()
+    DailySalesSummary.query.delete()
+    sales_changed()
+    db.session.commit()
+    invalidate_sales_filter_values()
+    return 'All sales data has been reset' + (f', backup: {path}' if path else ''), path
+
+# Checkout idempotency: the POS sends a fresh key with every cart. A retried or double
+# submitted checkout carries the same key and gets the original sale back instead of a new one.
+IDEMPOTENCY_KEY_MAX = 64
+
+def idempotency_key_arg(value):
+    """Normalised idempotency key, or None when missing or unusable (the request is then not deduplicated)."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    if len(value) > IDEMPOTENCY_KEY_MAX:
+        app.logger.warning(f"Ignoring idempotency key longer than {IDEMPOTENCY_KEY_MAX} characters")
+        return None
+    return value
+
+def sale_for_idempotency_key(key):
+    return Sale.query.filter_by(idempotency_key=key).first() if key else None
+
+# Checkout helpers
+def cart_quantity(value):
+    """A cart line's quantity as a positive int, or None (0, negative, fractional, not a number)."""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        return None
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return None
+    return quantity if quantity > 0 else None
+
+def reserve_stock(cart):
+    """
+    Validate and decrement stock for every line of a cart inside the current transaction.
+
+    Items are fetched in one query, then each distinct item is decremented with a conditional
+    UPDATE (quantity >= requested), so two tills selling the last pair at the same time cannot
+    both succeed and stock never goes negative. Updates run in item id order so concurrent
+    carts lock rows in the same order.
+
+    Returns (stock_items keyed by id, failures, requested quantities by id). failures holds
+    one message per failed line; when it is non-empty the caller must roll back. Lines with a
+    quantity that is not a positive whole number fail before anything is read, and requested
+    is then empty (a negative quantity would otherwise add stock through the UPDATE).
+    """
+    requested, failures = {}, []
+    for item in cart:
+        quantity = cart_quantity(item.get('quantity'))
+        if quantity is None:
+            failures.append(f"Invalid quantity {item.get('quantity')!r} for item ID {item.get('id')}!")
+        else:
+            requested[int(item['id'])] = requested.get(int(item['id']), 0) + quantity
+    if failures:
+        return {}, failures, {}
+
+    stock_items = {s.id: s for s in StockItem.query.filter(StockItem.id.in_(list(requested))).all()}
+
+    for item_id, quantity in requested.items():
+        stock_item = stock_items.get(item_id)
+        if not stock_item:
+            failures.append(f"Item ID {item_id} not found!")
+        elif stock_item.quantity < quantity:
+            failures.append(f"Not enough stock for {stock_item.name}! ({stock_item.quantity} left, {quantity} requested)")
+    if failures:
+        return stock_items, failures, requested
+
+    # Core UPDATEs on the session's connection: the ORM-enabled form costs as much again per
+    # statement, which used to make a one line cart slower than the per-line code it replaced
+    stock = StockItem.__table__
+    connection = db.session.connection()
+    for item_id in sorted(requested):
+        quantity = requested[item_id]
+        result = connection.execute(
+            db.update(stock)
+            .where(stock.c.id == item_id, stock.c.quantity >= quantity)
+            .values(quantity=stock.c.quantity - quantity)
+        )
+        if result.rowcount != 1:
+            # Sold by another till between our read and this update
+            failures.append(f"Not enough stock for {stock_items[item_id].name}! (just sold out, {quantity} requested)")
+    return stock_items, failures, requested
+
+# Batch checkout for sales the POS queued while offline
+CHECKOUT_BATCH_MAX = 500
+CHECKOUT_BATCH_ATTEMPTS = 3
+OFFLINE_SALE_CLOCK_SKEW = timedelta(minutes=10)   # how far in the future a till's clock may be
+
+def parse_batch_sale(entry):
+    """
+    Validate one queued sale: {'cart': [...] or its JSON string, 'payment_method', 'mpesa_code',
+    'total', 'date' (ISO time the sale was made, default now), 'idempotency_key'}. Returns (sale, errors).
+    """
+    if not isinstance(entry, dict):
+        return None, ['sale must be an object']
+    errors = []
+    cart = entry.get('cart')
+    if isinstance(cart, str):
+        try:
+            cart = json.loads(cart)
+        except ValueError:
+            cart = None
+    lines = []
+    if not isinstance(cart, list) or not cart:
+        errors.append('cart must be a non-empty list')
+    else:
+        for item in cart:
+            try:
+                line = {'id': int(item['id']), 'quantity': cart_quantity(item['quantity']),
+                        'price': float(item['price'])}
+            except (KeyError, TypeError, ValueError):
+                errors.append(f'invalid cart line {item!r}')
+                continue
+            if line['quantity'] is None:
+                errors.append(f"quantity for item ID {line['id']} must be a positive whole number")
+            lines.append(line)
+
+    if not entry.get('payment_method'):
+        errors.append('payment_method is required')
+    try:
+        total = float(entry['total'])
+    except (KeyError, TypeError, ValueError):
+        errors.append('total must be a number')
+        total = None
+
+    date = datetime.utcnow()
+    if entry.get('date'):
+        try:
+            parsed = datetime.fromisoformat(str(entry['date']).replace('Z', '+00:00'))
+            if parsed.tzinfo is None:
+                parsed = pytz.timezone(app.config.get('TIMEZONE', 'Africa/Nairobi')).localize(parsed)
+            date = parsed.astimezone(pytz.UTC).replace(tzinfo=None)
+            if date > datetime.utcnow() + OFFLINE_SALE_CLOCK_SKEW:
+                errors.append('date is in the future')
+        except ValueError:
+            errors.append(f"invalid date {entry['date']!r}")
+
+    if errors:
+        return None, errors
+    return {'cart': lines, 'payment_method': entry['payment_method'], 'mpesa_code': entry.get('mpesa_code') or '',
+            'total': total, 'date': date, 'idempotency_key': idempotency_key_arg(entry.get('idempotency_key'))}, []
+
+def _allocate_batch_stock(sales):
+    """
+    Check every sale's cart against stock, in order, as if they were rung up one after another.
+    Returns (stock_items by id, {sale index: failure messages}, total decrement per item id).
+    """
+    requested = []
+    for sale in sales:
+        quantities = {}
+        for line in sale['cart']:
+            quantities[line['id']] = quantities.get(line['id'], 0) + line['quantity']
+        requested.append(quantities)
+
+    item_ids = {item_id for quantities in requested for item_id in quantities}
+    stock_items = {s.id: s for s in StockItem.query.filter(StockItem.id.in_(list(item_ids))).all()}
+    remaining = {item_id: item.quantity for item_id, item in stock_items.items()}
+
+    failures, decrements = {}, {}
+    for index, quantities in enumerate(requested):
+        messages = []
+        for item_id, quantity in quantities.items():
+            if item_id not in stock_items:
+                messages.append(f"Item ID {item_id} not found!")
+            elif remaining[item_id] < quantity:
+                messages.append(f"Not enough stock for {stock_items[item_id].name}! "
+                                f"({remaining[item_id]} left, {quantity} requested)")
+        if messages:
+            failures[index] = messages
+            continue
+        for item_id, quantity in quantities.items():
+            remaining[item_id] -= quantity
+            decrements[item_id] = decrements.get(item_id, 0) + quantity
+    return stock_items, failures, decrements
+
+def checkout_batch(sales, created_by):
+    """
+    Record many validated sales (from parse_batch_sale) in one transaction.
+
+    Stock for the whole batch is read with one query and checked sale by sale; sales that
+    would oversell are rejected, the rest decrement each item once with a conditional UPDATE
+    (quantity >= total requested), as in reserve_stock(). If another till sold the same
+    stock in between, the batch is re-checked from fresh quantities. Sales, sale items and
+    rollups are then written with one bulk INSERT / upsert each.
+    Sales whose idempotency key is already recorded (or repeated earlier in the batch) are
+    not written again; they map to the original sale id and are listed in the replayed set.
+    Returns ({index: sale id or list of failure messages}, decrements, replayed indexes).
+    The caller commits.
+    """
+    keys = [sale['idempotency_key'] for sale in sales if sale['idempotency_key']]
+    known = dict(db.session.query(Sale.idempotency_key, Sale.id).filter(Sale.idempotency_key.in_(keys))) if keys else {}
+    replayed, repeats, first_in_batch = {}, {}, {}
+    for index, sale in enumerate(sales):
+        key = sale['idempotency_key']
+        if key in known:
+            replayed[index] = known[key]
+        elif key in first_in_batch:
+            repeats[index] = first_in_batch[key]
+        elif key:
+            first_in_batch[key] = index
+    pending = [index for index in range(len(sales)) if index not in replayed and index not in repeats]
+
+    for attempt in range(CHECKOUT_BATCH_ATTEMPTS):
+        stock_items, failures, decrements = _allocate_batch_stock([sales[i] for i in pending])
+        failures = {pending[position]: messages for position, messages in failures.items()}
+        raced = False
+        stock, connection = StockItem.__table__, db.session.connection()
+        for item_id in sorted(decrements):
+            result = connection.execute(
+                db.update(stock)
+                .where(stock.c.id == item_id, stock.c.quantity >= decrements[item_id])
+                .values(quantity=stock.c.quantity - decrements[item_id])
+            )
+            if result.rowcount != 1:
+                raced = True
+                break
+        if not raced:
+            break
+        db.session.rollback()
+    else:
+        raise RuntimeError('stock kept changing during the batch, try again')
+
+    accepted = [index for index in pending if index not in failures]
+    sale_ids = []
+    if accepted:
+        business_dates = {i: local_business_date(sales[i]['date']) for i in accepted}
+        sale_rows = [{'date': sales[i]['date'], 'business_date': business_dates[i], 'total_amount': sales[i]['total'],
+                      'payment_method': sales[i]['payment_method'], 'mpesa_code': sales[i]['mpesa_code'],
+                      'created_by': created_by, 'idempotency_key': sales[i]['idempotency_key']} for i in accepted]
+        if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+            sale_ids = db.session.scalars(
+                db.insert(Sale).returning(Sale.id, sort_by_parameter_order=True), sale_rows
+            ).all()
+        else:
+            # No RETURNING (SQLite before 3.35): one INSERT per sale
+            connection = db.session.connection()
+            sale_ids = [connection.execute(db.insert(Sale.__table__), row).inserted_primary_key[0] for row in sale_rows]
+
+        sale_items, rollup_sales = [], []
+        for index, sale_id in zip(accepted, sale_ids):
+            lines = []
+            for line in sales[index]['cart']:
+                stock_item = stock_items[line['id']]
+                sale_items.append({'sale_id': sale_id, 'item_id': stock_item.id, 'name': stock_item.name,
+                                   'unit_cost': stock_item.buying_price,
+                                   'quantity': line['quantity'], 'price': line['price']})
+                lines.append({'item_id': stock_item.id, 'name': stock_item.name, 'quantity': line['quantity'],
+                              'revenue': line['price'] * line['quantity'],
+                              'cost': stock_item.buying_price * line['quantity']})
+            rollup_sales.append((business_dates[index], sales[index]['total'], lines))
+        db.session.execute(db.insert(SaleItem), sale_items)
+        record_sales_rollups(rollup_sales)
+        sales_changed()
+
+    results = dict(failures)
+    results.update(zip(accepted, sale_ids))
+    results.update(replayed)
+    # A key repeated within the batch gets whatever its first occurrence got
+    for index, first in repeats.items():
+        results[index] = results[first]
+    return results, decrements, set(replayed) | set(repeats)
+
 # Routes
 # @app.route('/')
 # def home():
@@ -171,21 +1912,30 @@ def admin_dashboard():
         return redirect(url_for('login'))
     return render_template('admin/dashboard.html')
 
+@app.route('/admin/perf', methods=['GET', 'POST'])
+def perf_stats():
+    """Rolling per-endpoint request timings and SQL counts for this worker."""
+    if 'user_id' not in session or session['role'] != 'admin':
+        return redirect(url_for('login'))
+    if request.method == 'POST':
+        request_stats.reset()
+        flash('Performance statistics cleared.', 'info')
+        return redirect(url_for('perf_stats'))
+    return render_template('admin/perf.html', rows=request_stats.summary(),
+                           slow_ms=app.config['SLOW_REQUEST_MS'], window=request_stats.window,
+                           worker_pid=os.getpid(), catalogue=catalogue_cache.stats())
+
 @app.route('/admin/stock')
 def stock_list():
     search_query = request.args.get('search', '').strip()
     
     if search_query:
-        # Search across name, size, and description fields
-        items = StockItem.query.filter(
-            db.or_(
-                StockItem.name.contains(search_query),
-                StockItem.size.contains(search_query),
-                StockItem.description.contains(search_query)
-            )
-        ).all()
+        # Search across name, size, and description fields (full-text index, ranked)
+        items = search_stock(search_query)
     else:
-        items = StockItem.query.all()
+        items = catalogue_cache.items()
+        if items is None:
+            items = StockItem.query.order_by(StockItem.id).all()
     
     return render_template('admin/stock_list.html', items=items, search_query=search_query)
 
@@ -201,11 +1951,44 @@ def add_stock():
             description=request.form.get('description')
         )
         db.session.add(new_item)
+        catalogue_changed()
         db.session.commit()
         flash('Item added successfully!')
         return redirect(url_for('stock_list'))
     return render_template('admin/add_stock.html')
 
+@app.route('/admin/stock/import', methods=['GET', 'POST'])
+def import_stock():
+    """Bulk add/update stock items from an uploaded CSV, with a per-row error report."""
+    if 'user_id' not in session or session['role'] != 'admin':
+        return redirect(url_for('login'))
+
+    summary = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Choose a CSV file to import.', 'error')
+            return redirect(url_for('import_stock'))
+        try:
+            summary = import_stock_csv(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''),
+                                       add_quantities=request.form.get('quantity_mode') == 'add')
+            if summary['inserted'] or summary['updated']:
+                catalogue_changed()
+            db.session.commit()
+        except (UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            flash(f'Could not read the file: {e}', 'error')
+            return redirect(url_for('import_stock'))
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Stock import error: {str(e)}")
+            flash(f'Import failed, nothing was changed: {e}', 'error')
+            return redirect(url_for('import_stock'))
+        flash(f"Imported {summary['inserted'] + summary['updated']} of {summary['rows']} rows "
+              f"({summary['inserted']} new, {summary['updated']} updated, {summary['rejected']} rejected).",
+              'success' if not summary['rejected'] else 'info')
+    return render_template('admin/import_stock.html', summary=summary, max_errors=STOCK_IMPORT_MAX_ERRORS)
+
 @app.route('/admin/stock/edit/<int:id>', methods=['GET', 'POST'])
 def edit_stock(id):
     item = StockItem.query.get(id)
@@ -216,6 +1999,7 @@ def edit_stock(id):
         item.size = request.form.get('size')
         item.quantity = int(request.form['quantity'])
         item.description = request.form.get('description')
+        catalogue_changed()
         db.session.commit()
         flash('Item updated successfully!')
         return redirect(url_for('stock_list'))
@@ -225,6 +2009,7 @@ def edit_stock(id):
 def delete_stock(id):
     item = StockItem.query.get(id)
     db.session.delete(item)
+    catalogue_changed()
     db.session.commit()
     flash('Item deleted successfully!')
     return redirect(url_for('stock_list'))
@@ -288,19 +2073,8 @@ def delete_stock(id):
 
 # app.py (profit_analysis route)
 
-@app.route('/admin/profit-analysis')
-def profit_analysis():
-    """
-    Robust profit analysis route:
-    - Accepts time_range values sent by the template: 'today', 'week', 'month', 'quarter', 'year'
-    - Converts date range to naive UTC datetimes for DB querying (assumes DB datetimes are naive UTC)
-    - Localizes sale datetimes correctly and groups by Nairobi date
-    - Zero-fills missing dates so chart arrays are same length and chronological
-    - Builds chart_data with 'dates', 'sales', 'profits', 'expenses'
-    """
-    # Get time range from query parameter (template uses values like 'today','week','month','quarter','year')
-    time_range = request.args.get('time_range', 'week')
-
+def profit_date_range(time_range):
+    """(start_date, end_date) local dates of a profit report time_range, ending today."""
     nairobi_tz = pytz.timezone(app.config.get('TIMEZONE', 'Africa/Nairobi'))
     today = datetime.now(nairobi_tz).date()
 
@@ -319,82 +2093,29 @@ def profit_analysis():
     else:
         # fallback to last 30 days
         start_date = today - timedelta(days=29)
+    return start_date, today
 
-    end_date = today
-
-    # Build aware datetimes in Nairobi, then convert to UTC and then to naive UTC datetimes for DB comparison
-    start_dt_nairobi = nairobi_tz.localize(datetime.combine(start_date, datetime.min.time()))
-    end_dt_nairobi   = nairobi_tz.localize(datetime.combine(end_date,   datetime.max.time()))
-
-    # Convert to UTC (aware), then to naive by removing tzinfo (common pattern if DB stores naive UTC)
-    utc_start_aware = start_dt_nairobi.astimezone(pytz.UTC)
-    utc_end_aware   = end_dt_nairobi.astimezone(pytz.UTC)
-    utc_start_naive = utc_start_aware.replace(tzinfo=None)
-    utc_end_naive   = utc_end_aware.replace(tzinfo=None)
-
-    # Query sales between these naive UTC datetimes
-    sales = Sale.query.filter(Sale.date >= utc_start_naive).filter(Sale.date <= utc_end_naive).all()
-
-    # Prepare containers
-    profit_data = {}            # keyed by ISO date 'YYYY-MM-DD'
-    # We'll track cost (buying_price * qty) so expenses = cost
-    # and revenue (price * qty)
-    all_items_sold = []         # list of dicts per sold item for further aggregations
-
-    # Aggregate per sale
-    for sale in sales:
-        # Ensure sale.date is treated as UTC-aware before converting to Nairobi
-        sale_dt = sale.date
-        if sale_dt is None:
-            continue
+@app.route('/admin/profit-analysis')
+@cached_page('sales')
+def profit_analysis():
+    """
+    Robust profit analysis route:
+    - Accepts time_range values sent by the template: 'today', 'week', 'month', 'quarter', 'year'
+    - Reads the daily rollup tables (DailySalesSummary / DailyProductSales), already grouped by Nairobi date
+    - Zero-fills missing dates so chart arrays are same length and chronological
+    - Builds chart_data with 'dates', 'sales', 'profits', 'expenses'
+    - Compares revenue, profit, margin and the top product with the previous period of the same length
+    """
+    # Get time range from query parameter (template uses values like 'today','week','month','quarter','year')
+    time_range = request.args.get('time_range', 'week')
+    start_date, end_date = profit_date_range(time_range)
+    today = end_date
+    best_seller_bucket, best_seller_k = top_seller_args(request.args)
 
-        if sale_dt.tzinfo is None:
-            # DB-stored naive -> we assume it's UTC
-            sale_dt_aware = pytz.UTC.localize(sale_dt)
-        else:
-            sale_dt_aware = sale_dt
-
-        sale_date_nairobi = sale_dt_aware.astimezone(nairobi_tz).date()
-        date_key = sale_date_nairobi.strftime('%Y-%m-%d')
-
-        if date_key not in profit_data:
-            profit_data[date_key] = {'sales': 0.0, 'cost': 0.0, 'profit': 0.0}
-
-        # If you store Sale.total_amount, use it to add to sales. If not, derive from items.
-        if sale.total_amount is not None:
-            profit_data[date_key]['sales'] += float(sale.total_amount or 0.0)
-        # Now iterate items to compute cost and profit accurately
-        for item in sale.items:
-            # item.price is unit selling price, item.quantity number sold
-            qty = float(item.quantity or 0)
-            unit_price = float(item.price or 0.0)
-            revenue = unit_price * qty
-
-            # Default buying price zero if stock_item missing
-            stock_item = None
-            if hasattr(item, 'stock_item') and item.stock_item:
-                stock_item = item.stock_item
-            else:
-                stock_item = db.session.get(StockItem, item.item_id)
-
-            buying_price = float(stock_item.buying_price) if stock_item and stock_item.buying_price is not None else 0.0
-            cost = buying_price * qty
-            profit = revenue - cost
-
-            # Add to per-day totals
-            profit_data[date_key]['sales'] += revenue if sale.total_amount is None else 0.0  # avoid double count if total_amount already used
-            profit_data[date_key]['cost'] += cost
-            profit_data[date_key]['profit'] += profit
-
-            # Save item for product-level analysis
-            all_items_sold.append({
-                'name': stock_item.name if stock_item else f"Item#{item.item_id}",
-                'quantity': int(qty),
-                'sale_date': sale_date_nairobi,
-                'revenue': revenue,
-                'cost': cost,
-                'profit': profit
-            })
+    # Read the daily rollups (one row per local date, plus one per product per date)
+    # instead of recomputing the range from raw sales
+    profit_data = daily_summary_rows(start_date, end_date)   # keyed by ISO date 'YYYY-MM-DD'
+    products = product_report(start_date, end_date, today)
 
     # Build full date list from start_date .. end_date inclusive (chronological order)
     dates_list = []
@@ -425,34 +2146,22 @@ def profit_analysis():
     total_profit = sum(chart_profits)
     profit_margin = (total_profit / total_revenue * 100) if total_revenue else 0.0
 
-    # Build per-product stats
-    product_stats = {}
-    for it in all_items_sold:
-        name = it['name']
-        product = product_stats.setdefault(name, {'quantity_sold': 0, 'revenue': 0.0, 'profit': 0.0})
-        product['quantity_sold'] += it['quantity']
-        product['revenue']      += it['revenue']
-        product['profit']       += it['profit']
-
-    top_products_list = []
-    for name, stats in product_stats.items():
-        margin = (stats['profit'] / stats['revenue'] * 100) if stats['revenue'] else 0.0
-        top_products_list.append({
-            'name': name,
-            'quantity_sold': stats['quantity_sold'],
-            'revenue': stats['revenue'],
-            'profit': stats['profit'],
-            'margin': round(margin, 1)
-        })
-    top_products_list.sort(key=lambda x: x['profit'], reverse=True)
-    top_products_list = top_products_list[:10]
+    # Per product figures (top products, best sellers per day and over the range, today's items)
+    top_products_list = products['top_products']
+
+    # Changes against the previous period of the same length (yesterday, the 7 days before, ...)
+    comparison = period_comparison(start_date, end_date,
+                                   top_products_list[0]['name'] if top_products_list else None)
+    current, previous = comparison['current'], comparison['previous']
+    revenue_change = percent_change(current['revenue'], previous['revenue'])
+    profit_change = percent_change(current['profit'], previous['profit'])
+    # Margin moves in percentage points
+    previous_margin = (previous['profit'] / previous['revenue'] * 100) if previous['revenue'] else 0.0
+    margin_change = (profit_margin - previous_margin) if previous['revenue'] else 0.0
 
-     # Ensure top_product always has a numeric 'change' field so template can round() it
     if top_products_list:
         top_product = top_products_list[0]
-        # add default 'change' if missing (use 0.0 or compute a real change)
-        if 'change' not in top_product or top_product.get('change') is None:
-            top_product['change'] = 0.0
+        top_product['change'] = percent_change(current['product_profit'], previous['product_profit'])
     else:
         top_product = {
             'name': 'N/A',
@@ -460,79 +2169,17 @@ def profit_analysis():
             'profit': 0.0,
             'change': 0.0
         }
-    # Build daily_item_counts and most_sold_per_day
-    daily_item_counts = {}
-    for it in all_items_sold:
-        date_str = it['sale_date'].strftime('%Y-%m-%d')
-        daily_item_counts.setdefault(date_str, {})
-        daily_item_counts[date_str][it['name']] = daily_item_counts[date_str].get(it['name'], 0) + it['quantity']
-
-    most_sold_per_day = {}
-    for date_key, counts in daily_item_counts.items():
-        if counts:
-            most_sold_per_day[date_key] = max(counts.items(), key=lambda x: x[1])[0]
-
-    # Weekly and monthly: top product by quantity
-    weekly_counts_by_product = {}
-    monthly_counts_by_product = {}
-    for it in all_items_sold:
-        week_key = f"{it['sale_date'].isocalendar()[0]}-W{it['sale_date'].isocalendar()[1]}"
-        month_key = it['sale_date'].strftime('%Y-%m')
-        weekly_counts_by_product.setdefault((week_key, it['name']), 0)
-        weekly_counts_by_product[(week_key, it['name'])] += it['quantity']
-        monthly_counts_by_product.setdefault((month_key, it['name']), 0)
-        monthly_counts_by_product[(month_key, it['name'])] += it['quantity']
-
-    # find top weekly product overall (across the range)
-    weekly_agg = {}
-    for (wk, name), qty in weekly_counts_by_product.items():
-        weekly_agg[name] = weekly_agg.get(name, 0) + qty
-    monthly_agg = {}
-    for (mk, name), qty in monthly_counts_by_product.items():
-        monthly_agg[name] = monthly_agg.get(name, 0) + qty
-
-    weekly_top_name, weekly_top_qty = ("N/A", 0)
-    if weekly_agg:
-        weekly_top_name, weekly_top_qty = max(weekly_agg.items(), key=lambda x: x[1])
-
-    monthly_top_name, monthly_top_qty = ("N/A", 0)
-    if monthly_agg:
-        monthly_top_name, monthly_top_qty = max(monthly_agg.items(), key=lambda x: x[1])
-
-    # Dummy change numbers (replace with actual comparators if you track previous periods)
-    revenue_change = 0.0
-    profit_change = 0.0
-    margin_change = 0.0
-
-    # Get today's items for the template
-    today_items = []
-    today_date_str = today.strftime('%Y-%m-%d')
-    if today_date_str in profit_data:
-        # Get today's items from all_items_sold
-        today_items = [item for item in all_items_sold if item['sale_date'].strftime('%Y-%m-%d') == today_date_str]
-        
-        # Group by product name and aggregate
-        today_items_grouped = {}
-        for item in today_items:
-            name = item['name']
-            if name not in today_items_grouped:
-                today_items_grouped[name] = {
-                    'name': name,
-                    'quantity': 0,
-                    'revenue': 0.0,
-                    'profit': 0.0,
-                    'unit_price': 0.0
-                }
-            today_items_grouped[name]['quantity'] += item['quantity']
-            today_items_grouped[name]['revenue'] += item['revenue']
-            today_items_grouped[name]['profit'] += item['profit']
-        
-        # Calculate unit price (average)
-        for item in today_items_grouped.values():
-            if item['quantity'] > 0:
-                item['unit_price'] = item['revenue'] / item['quantity']
-        
-        today_items = list(today_items_grouped.values())
+    # Best sellers per day / week / month (k and bucket from the page's controls)
+    best_sellers = top_sellers(start_date, end_date, best_seller_bucket, best_seller_k)
+    days_with_sales = sum(1 for day in profit_data.values() if day['sales'])
+
+    # Weekly and monthly: top product by quantity. Summed over every week (or month) of the
+    # range these are the range totals, so both are the range's best seller.
+    weekly_top_name, weekly_top_qty = products['most_sold']
+    monthly_top_name, monthly_top_qty = products['most_sold']
+
+    # Get today's items for the template (grouped by product)
+    today_items = products['todays_items']
 
     return render_template('admin/profit_analysis.html',
                            profit_data=profit_data,
@@ -545,8 +2192,11 @@ def profit_analysis():
                            margin_change=margin_change,
                            top_products=top_products_list,
                            top_product=top_product,
-                           most_sold_per_day=most_sold_per_day,
-                           daily_item_counts=daily_item_counts,
+                           best_sellers=best_sellers,
+                           best_seller_bucket=best_seller_bucket,
+                           best_seller_k=best_seller_k,
+                           best_seller_buckets=TOP_SELLER_BUCKETS,
+                           days_with_sales=days_with_sales,
                            weekly_most_sold_name=weekly_top_name,
                            weekly_most_sold_qty=weekly_top_qty,
                            monthly_most_sold_name=monthly_top_name,
@@ -556,6 +2206,37 @@ def profit_analysis():
                            today_date=today.strftime('%B %d, %Y'))
 
 
+@app.route('/api/reports/top-sellers')
+def top_sellers_api():
+    """
+    Best sellers per period as JSON. Range: time_range (as on the profit page) or explicit
+    start_date / end_date (YYYY-MM-DD); bucket: day, week or month; k: products per period.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['role'] != 'admin':
+        return jsonify({'error': 'Admins only'}), 403
+
+    start_date, end_date = profit_date_range(request.args.get('time_range', 'week'))
+    try:
+        if request.args.get('start_date'):
+            start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date()
+        if request.args.get('end_date'):
+            end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    if start_date > end_date:
+        return jsonify({'error': 'start_date is after end_date'}), 400
+
+    bucket, k = top_seller_args(request.args)
+    return jsonify({
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'bucket': bucket,
+        'k': k,
+        'periods': top_sellers(start_date, end_date, bucket, k)
+    })
+
 
 # POS Routes
 @app.route('/pos')
@@ -563,21 +2244,111 @@ def pos():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    items = StockItem.query.filter(StockItem.quantity > 0).all()
-    return render_template('sales/pos.html', items=items)
+    # Products are fetched as the cashier types, see product_search()
+    return render_template('sales/pos.html')
+
+PRODUCT_SEARCH_LIMIT = 20
+
+@app.route('/api/products/search')
+def product_search():
+    """
+    In-stock products matching ?q= for the POS screen, as compact JSON.
+    Name prefix matches (index backed) come first, then substring matches, capped at ?limit=.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    term = request.args.get('q', '').strip().lower()
+    limit = max(1, min(request.args.get('limit', PRODUCT_SEARCH_LIMIT, type=int) or PRODUCT_SEARCH_LIMIT, 100))
+    if not term:
+        return jsonify({'results': [], 'truncated': False})
+
+    cached = catalogue_cache.search(term, limit)
+    if cached is not None:
+        matches, truncated = cached
+    else:
+        # Catalogue too large for the in-process cache, search in the database
+        # Escape LIKE wildcards typed by the cashier
+        pattern = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        name = db.func.lower(StockItem.name)
+        in_stock = StockItem.query.filter(StockItem.quantity > 0)
+
+        matches = in_stock.filter(name.like(pattern + '%', escape='\\')) \
+            .order_by(StockItem.name, StockItem.id).limit(limit + 1).all()
+        if len(matches) <= limit:
+            matches += in_stock.filter(
+                name.like('%' + pattern + '%', escape='\\'),
+                db.not_(name.like(pattern + '%', escape='\\'))
+            ).order_by(StockItem.name, StockItem.id).limit(limit + 1 - len(matches)).all()
+        matches, truncated = matches[:limit], len(matches) > limit
+
+    return jsonify({
+        'results': [{
+            'id': item.id,
+            'name': item.name,
+            'price': item.selling_price,
+            'size': item.size,
+            'stock': item.quantity
+        } for item in matches],
+        'truncated': truncated
+    })
+
+OFFLINE_CATALOGUE_MAX = 20000
+
+@app.route('/api/products/catalogue')
+def product_catalogue():
+    """
+    Every in-stock product as compact rows [id, name, price, size, stock], for the POS to keep
+    in localStorage and search while the connection is down. 'complete' is false when the
+    catalogue is larger than OFFLINE_CATALOGUE_MAX (the first products by name are sent).
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    items = catalogue_cache.items()
+    if items is not None:
+        items = sorted((item for item in items if item.quantity > 0), key=lambda item: (item.name, item.id))
+    else:
+        items = StockItem.query.filter(StockItem.quantity > 0) \
+            .order_by(StockItem.name, StockItem.id).limit(OFFLINE_CATALOGUE_MAX + 1).all()
+    return jsonify({
+        'products': [[item.id, item.name, item.selling_price, item.size, item.quantity]
+                     for item in items[:OFFLINE_CATALOGUE_MAX]],
+        'complete': len(items) <= OFFLINE_CATALOGUE_MAX
+    })
 
 @app.route('/sales-viewer')
 def sales_viewer():
     if 'user_id' not in session or session['role'] != 'admin':
         return redirect(url_for('login'))
     
-    sales = Sale.query.all()
-    return render_template('admin/sales_viewer.html', sales=sales)
+    # One keyset page of sales, with their items (names included) loaded up front
+    # instead of lazy-loading them per row while the template renders
+    sales, next_cursor = keyset_page(
+        Sale.query.options(selectinload(Sale.items)),
+        request.args.get('cursor'),
+        page_size_arg()
+    )
+    return render_template('admin/sales_viewer.html', sales=sales,
+                           next_url=url_with_args('sales_viewer', cursor=next_cursor) if next_cursor else None,
+                           newest_url=url_with_args('sales_viewer', cursor=None) if request.args.get('cursor') else None)
 
 @app.route('/receipt/<int:sale_id>')
 def receipt(sale_id):
     sale = Sale.query.get_or_404(sale_id)
-    return render_template('sales/receipt.html', sale=sale)
+    # A sale never changes once written, so its receipt gets a strong validator that the
+    # browser may reuse for RECEIPT_MAX_AGE seconds and then revalidate. Sale ids can come
+    # back after a reset on SQLite, so the validator also covers when the sale was made.
+    etag = hashlib.sha1(f'{sale.id}:{sale.date.isoformat()}:{sale.business_date}:{APP_BUILD}'.encode()).hexdigest()
+    if not is_resource_modified(request.environ, etag=etag, last_modified=sale.date):
+        response = Response(status=304)
+    else:
+        response = make_response(render_template('sales/receipt.html', sale=sale))
+    response.set_etag(etag)
+    response.last_modified = sale.date
+    response.cache_control.private = True
+    response.cache_control.max_age = app.config.get('RECEIPT_MAX_AGE', 86400)
+    return response
 
 @app.route('/checkout', methods=['POST'])
 def checkout():
@@ -587,54 +2358,147 @@ def checkout():
         payment_method = request.form['payment_method']
         mpesa_code = request.form.get('mpesa_code', '')
         total = float(request.form['total'])
+        idempotency_key = idempotency_key_arg(request.form.get('idempotency_key'))
+
+        # A retry of a checkout that already went through: show that sale, write nothing
+        original = sale_for_idempotency_key(idempotency_key)
+        if original is not None:
+            CHECKOUTS.labels('replayed').inc()
+            return render_template('sales/checkout.html', sale=original)
         
         # Create sale record
         new_sale = Sale(
             total_amount=total,
             payment_method=payment_method,
             mpesa_code=mpesa_code,
-            created_by=session.get('username')
+            created_by=session.get('username'),
+            idempotency_key=idempotency_key
         )
         db.session.add(new_sale)
         db.session.flush()  # Get sale ID before commit
         
-        # Create sale items and update stock
+        # Validate and decrement stock for the whole cart at once
+        stock_items, failures, requested = reserve_stock(cart)
+        if failures:
+            db.session.rollback()
+            CHECKOUTS.labels('invalid' if not requested else
+                             'not_found' if len(stock_items) < len(requested) else 'out_of_stock').inc()
+            for message in failures:
+                flash(message, 'error')
+            return redirect(url_for('pos'))
+
+        # Create sale items
+        rollup_lines = []
         for item in cart:
-            stock_item = StockItem.query.get(item['id'])
-            if not stock_item:
-                flash(f"Item ID {item['id']} not found!", 'error')
-                return redirect(url_for('pos'))
-                
-            if stock_item.quantity < item['quantity']:
-                flash(f"Not enough stock for {stock_item.name}!", 'error')
-                return redirect(url_for('pos'))
-                
+            stock_item = stock_items[int(item['id'])]
+            quantity = cart_quantity(item['quantity'])  # validated by reserve_stock()
             sale_item = SaleItem(
                 sale_id=new_sale.id,
-                item_id=item['id'],
-                quantity=item['quantity'],
-                price=item['price']
+                item_id=stock_item.id,
+                quantity=quantity,
+                price=item['price'],
+                name=stock_item.name,
+                unit_cost=stock_item.buying_price
             )
-            stock_item.quantity -= item['quantity']
             db.session.add(sale_item)
+            rollup_lines.append({
+                'item_id': stock_item.id,
+                'name': stock_item.name,
+                'quantity': quantity,
+                'revenue': float(item['price']) * quantity,
+                'cost': stock_item.buying_price * quantity
+            })
         
+        # Keep the reporting rollups in step with the sale (same transaction)
+        record_sale_rollups(new_sale, rollup_lines)
+        sales_changed()
         db.session.commit()
+        CHECKOUTS.labels('success').inc()
+        SALE_LINE_ITEMS.observe(len(cart))
+        note_sales_filter_values(new_sale.created_by, new_sale.payment_method)
+        catalogue_cache.apply_sale(requested)
         return render_template('sales/checkout.html', sale=new_sale)
-        
+
     except Exception as e:
         db.session.rollback()
+        if isinstance(e, IntegrityError):
+            # A concurrent request (double tap) committed the same key first: show that sale
+            original = sale_for_idempotency_key(idempotency_key)
+            if original is not None:
+                CHECKOUTS.labels('replayed').inc()
+                return render_template('sales/checkout.html', sale=original)
+        CHECKOUTS.labels('error').inc()
         app.logger.error(f"Checkout error: {str(e)}")
         flash(f"Checkout failed: {str(e)}", 'error')
         return redirect(url_for('pos'))
     
+@app.route('/api/checkout/batch', methods=['POST'])
+def checkout_batch_api():
+    """
+    Record sales the POS queued while offline, in one round trip.
+    Body: {"sales": [{"cart": [...], "payment_method": .., "mpesa_code": .., "total": .., "date": ..,
+                      "idempotency_key": ..}, ...]}
+    Returns one result per sale, in order: {"status": "ok", "sale_id": .., "replayed": bool} or
+    {"status": "failed", "errors": [..]}. Resending a sale with the same key is safe.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    body = request.get_json(silent=True)
+    entries = body.get('sales') if isinstance(body, dict) else None
+    if not isinstance(entries, list):
+        return jsonify({'error': 'Expected a JSON object with a "sales" list'}), 400
+    if len(entries) > CHECKOUT_BATCH_MAX:
+        return jsonify({'error': f'At most {CHECKOUT_BATCH_MAX} sales per batch'}), 400
+
+    parsed = [parse_batch_sale(entry) for entry in entries]
+    valid = [index for index, (sale, _) in enumerate(parsed) if sale is not None]
+    try:
+        try:
+            outcome, decrements, replayed = checkout_batch([parsed[i][0] for i in valid], session.get('username'))
+            db.session.commit()
+        except IntegrityError:
+            # Another request committed one of these keys meanwhile; a second pass sees it as replayed
+            db.session.rollback()
+            outcome, decrements, replayed = checkout_batch([parsed[i][0] for i in valid], session.get('username'))
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        CHECKOUTS.labels('error').inc(len(valid))
+        app.logger.error(f"Batch checkout error: {str(e)}")
+        return jsonify({'error': f'Checkout failed: {e}'}), 500
+
+    results = [{'status': 'failed', 'errors': errors} for _, errors in parsed]
+    for position, index in enumerate(valid):
+        value = outcome[position]
+        if isinstance(value, list):
+            results[index] = {'status': 'failed', 'errors': value}
+            CHECKOUTS.labels('not_found' if any('not found' in m for m in value) else 'out_of_stock').inc()
+        elif position in replayed:
+            results[index] = {'status': 'ok', 'sale_id': value, 'replayed': True,
+                              'receipt_url': url_for('receipt', sale_id=value)}
+            CHECKOUTS.labels('replayed').inc()
+        else:
+            sale = parsed[index][0]
+            results[index] = {'status': 'ok', 'sale_id': value, 'replayed': False,
+                              'receipt_url': url_for('receipt', sale_id=value)}
+            CHECKOUTS.labels('success').inc()
+            SALE_LINE_ITEMS.observe(len(sale['cart']))
+            note_sales_filter_values(session.get('username'), sale['payment_method'])
+    catalogue_cache.apply_sale(decrements)
+
+    created = sum(1 for result in results if result['status'] == 'ok' and not result['replayed'])
+    failed = sum(1 for result in results if result['status'] == 'failed')
+    return jsonify({'results': results, 'created': created, 'replayed': len(results) - created - failed,
+                    'failed': failed})
+
 @app.route('/sales')
+@cached_page('sales')
 def sales():
     # Visible to logged-in users (admin and staff)
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    nairobi_tz = pytz.timezone(app.config.get('TIMEZONE', 'Africa/Nairobi'))
-    
     # Get filter parameters
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
@@ -644,85 +2508,49 @@ def sales():
     max_amount = request.args.get('max_amount')
     
     # Build query with filters
-    sales_q = Sale.query
-    
-    # Date filters
-    if start_date:
-        try:
-            start_dt = nairobi_tz.localize(datetime.strptime(start_date, '%Y-%m-%d'))
-            start_dt_utc = start_dt.astimezone(pytz.UTC).replace(tzinfo=None)
-            sales_q = sales_q.filter(Sale.date >= start_dt_utc)
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            end_dt = nairobi_tz.localize(datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
-            end_dt_utc = end_dt.astimezone(pytz.UTC).replace(tzinfo=None)
-            sales_q = sales_q.filter(Sale.date < end_dt_utc)
-        except ValueError:
-            pass
-    
-    # Payment method filter
-    if payment_method and payment_method != 'all':
-        sales_q = sales_q.filter(Sale.payment_method == payment_method)
-    
-    # Seller filter
-    if seller and seller != 'all':
-        sales_q = sales_q.filter(Sale.created_by == seller)
+    sales_q = filtered_sales_query(request.args)
     
-    # Amount filters
-    if min_amount:
-        try:
-            sales_q = sales_q.filter(Sale.total_amount >= float(min_amount))
-        except ValueError:
-            pass
-    
-    if max_amount:
-        try:
-            sales_q = sales_q.filter(Sale.total_amount <= float(max_amount))
-        except ValueError:
-            pass
-    
-    # Execute query and order by date desc
-    sales_q = sales_q.order_by(Sale.date.desc()).all()
-
-    # Group by date (Nairobi timezone)
+    # Fetch one keyset page (newest first), batch loading the items for the template
+    page_sales, next_cursor = keyset_page(
+        sales_q.options(selectinload(Sale.items)),
+        request.args.get('cursor'),
+        page_size_arg()
+    )
+
+    # Group the page by local business date (stored on each sale)
     grouped_sales = {}  # { '2025-09-12': [sale1, sale2], ... }
-    daily_totals = {}   # { '2025-09-12': 1500.0, ... }
 
-    for sale in sales_q:
-        try:
-            sale_dt = sale.date
-            if sale_dt.tzinfo is None:
-                # assume UTC in DB if naive
-                sale_dt = pytz.UTC.localize(sale_dt)
-            sale_local_date = sale_dt.astimezone(nairobi_tz).date()
-        except Exception:
-            # fallback: use naive date()
-            sale_local_date = sale.date.date()
-
-        date_key = sale_local_date.strftime('%Y-%m-%d')
-        if date_key not in grouped_sales:
-            grouped_sales[date_key] = []
-            daily_totals[date_key] = 0.0
-
-        grouped_sales[date_key].append(sale)
-        daily_totals[date_key] += sale.total_amount or 0.0
+    for sale in page_sales:
+        date_key = sale.business_date.strftime('%Y-%m-%d')
+        grouped_sales.setdefault(date_key, []).append(sale)
 
     # Sort grouped_sales keys descending
     sorted_dates = sorted(grouped_sales.keys(), reverse=True)
+
+    # Whole-day subtotals for the days on this page, from an aggregate query
+    # (a day can span two pages, its subtotal still covers all of its filtered sales)
+    daily_totals = {}   # { '2025-09-12': 1500.0, ... }
+    if sorted_dates:
+        day = Sale.business_date
+        day_rows = sale_date_range(
+            sales_q,
+            datetime.strptime(sorted_dates[-1], '%Y-%m-%d').date(),
+            datetime.strptime(sorted_dates[0], '%Y-%m-%d').date()
+        ).with_entities(day, db.func.sum(Sale.total_amount)).group_by(day).all()
+        daily_totals = {format_day_bucket(d): float(total or 0.0) for d, total in day_rows}
+        for date_key in sorted_dates:
+            daily_totals.setdefault(date_key, 0.0)
+
+    # Get unique sellers and payment methods for filter dropdowns (cached per worker)
+    unique_sellers, unique_payment_methods = sales_filter_values()
     
-    # Get unique sellers and payment methods for filter dropdowns
-    all_sales = Sale.query.all()
-    unique_sellers = list(set([sale.created_by for sale in all_sales if sale.created_by]))
-    unique_payment_methods = list(set([sale.payment_method for sale in all_sales if sale.payment_method]))
-    
-    # Calculate totals for filtered results
-    total_sales_count = len(sales_q)
-    total_amount = sum(sale.total_amount or 0.0 for sale in sales_q)
+    # Calculate totals for filtered results (all pages) in the database
+    total_sales_count, total_amount = sales_q.with_entities(
+        db.func.count(Sale.id), db.func.coalesce(db.func.sum(Sale.total_amount), 0.0)
+    ).one()
 
     return render_template('sales/sales.html',
+                           export_url=url_with_args('export_sales', cursor=None, per_page=None) if session.get('role') == 'admin' else None,
                            grouped_sales=grouped_sales,
                            daily_totals=daily_totals,
                            sorted_dates=sorted_dates,
@@ -730,6 +2558,9 @@ def sales():
                            unique_payment_methods=unique_payment_methods,
                            total_sales_count=total_sales_count,
                            total_amount=total_amount,
+                           page_sales_count=len(page_sales),
+                           next_url=url_with_args('sales', cursor=next_cursor) if next_cursor else None,
+                           newest_url=url_with_args('sales', cursor=None) if request.args.get('cursor') else None,
                            current_filters={
                                'start_date': start_date,
                                'end_date': end_date,
@@ -740,10 +2571,47 @@ def sales():
                            })
 
 
+@app.route('/admin/export/sales')
+def export_sales():
+    """
+    Download sales history, one row per sale line, as ?format=csv (default) or jsonl.
+    Accepts the /sales filters. The file is streamed while it is read from the database;
+    exports over SALES_EXPORT_STREAM_MAX lines are written by a background job instead.
+    """
+    if 'user_id' not in session or session['role'] != 'admin':
+        return redirect(url_for('login'))
+
+    fmt = 'jsonl' if request.args.get('format') == 'jsonl' else 'csv'
+    lines = sales_export_line_count(request.args)
+    if lines > SALES_EXPORT_STREAM_MAX:
+        job_id = submit_job('sales_backup', created_by=session.get('username'), filters=request.args.to_dict(),
+                            fmt=fmt, prefix='sales_export')
+        flash(f'The export has {lines} lines, too many to stream: job #{job_id} is writing it, '
+              f'download it here when it is done.', 'info')
+        return redirect(url_for('list_jobs'))
+    rows = sales_export_rows(request.args.copy())
+    filename = f"sales_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(sales_export_chunks(rows, fmt)),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @app.route('/health')
 def health_check():
     return 'OK', 200
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition, summed over every gunicorn worker in multiprocess mode."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        from prometheus_client import REGISTRY as registry
+    return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
 @app.route('/create_admin')
 def initialize_database():
     with app.app_context():
@@ -907,6 +2775,38 @@ def delete_user(id):
         flash('An error occurred while deleting the user. Please try again.', 'error')
         return redirect(url_for('manage_users'))
 
+@app.route('/admin/jobs')
+def list_jobs():
+    """Recent background jobs with their progress."""
+    if 'user_id' not in session or session['role'] != 'admin':
+        return redirect(url_for('login'))
+    mark_interrupted_jobs()
+    jobs = BackgroundJob.query.order_by(BackgroundJob.id.desc()).limit(50).all()
+    active = any(job.status in ('queued', 'running') for job in jobs)
+    return render_template('admin/jobs.html', jobs=jobs, active=active,
+                           job_types=[(kind, label) for kind, (label, _) in JOB_TYPES.items() if kind != 'reset_sales'])
+
+@app.route('/admin/jobs/submit', methods=['POST'])
+def start_job():
+    if 'user_id' not in session or session['role'] != 'admin':
+        return redirect(url_for('login'))
+    kind = request.form.get('kind')
+    if kind not in JOB_TYPES or kind == 'reset_sales':
+        flash('Unknown job type.', 'error')
+        return redirect(url_for('list_jobs'))
+    job_id = submit_job(kind, created_by=session.get('username'))
+    flash(f'{JOB_TYPES[kind][0]} started (job #{job_id}).', 'info')
+    return redirect(url_for('list_jobs'))
+
+@app.route('/admin/jobs/<int:job_id>/download')
+def download_job_result(job_id):
+    if 'user_id' not in session or session['role'] != 'admin':
+        return redirect(url_for('login'))
+    job = BackgroundJob.query.get_or_404(job_id)
+    if job.status != 'done' or not job.result_path or not os.path.exists(job.result_path):
+        abort(404)
+    return send_file(os.path.abspath(job.result_path), as_attachment=True)
+
 @app.route('/admin/reset-data', methods=['GET', 'POST'])
 def reset_business_data():
     """Reset all sales data to start fresh business operations"""
@@ -914,65 +2814,17 @@ def reset_business_data():
         return redirect(url_for('login'))
     
     if request.method == 'POST':
-        try:
-            # Get confirmation and backup option
-            confirm_reset = request.form.get('confirm_reset')
-            create_backup = request.form.get('create_backup', False)
-            
-            if confirm_reset == 'yes':
-                # Create backup if requested
-                if create_backup:
-                    # Export current data to CSV before deletion
-                    sales = Sale.query.all()
-                    backup_data = []
-                    for sale in sales:
-                        for item in sale.items:
-                            backup_data.append({
-                                'sale_id': sale.id,
-                                'date': sale.date.strftime('%Y-%m-%d %H:%M:%S'),
-                                'total_amount': sale.total_amount,
-                                'payment_method': sale.payment_method,
-                                'mpesa_code': sale.mpesa_code,
-                                'created_by': sale.created_by,
-                                'item_name': item.stock_item.name if item.stock_item else f"Item#{item.item_id}",
-                                'quantity': item.quantity,
-                                'price': item.price
-                            })
-                    
-                    # Save backup to file
-                    import csv
-                    from datetime import datetime
-                    backup_filename = f"sales_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                    with open(backup_filename, 'w', newline='', encoding='utf-8') as csvfile:
-                        if backup_data:
-                            fieldnames = backup_data[0].keys()
-                            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                            writer.writeheader()
-                            writer.writerows(backup_data)
-                    
-                    flash(f'Backup created: {backup_filename}', 'info')
-                
-                # Delete all sales and sale items
-                SaleItem.query.delete()
-                Sale.query.delete()
-                
-                # Reset stock quantities to original values (optional)
-                reset_stock = request.form.get('reset_stock', False)
-                if reset_stock:
-                    # You might want to add original_quantity field to StockItem model
-                    # For now, we'll just keep current quantities
-                    pass
-                
-                db.session.commit()
-                flash('All sales data has been reset successfully! You can now start fresh.', 'success')
-                return redirect(url_for('admin_dashboard'))
-            else:
-                flash('Data reset cancelled.', 'info')
-                return redirect(url_for('admin_dashboard'))
-                
-        except Exception as e:
-            db.session.rollback()
-            flash(f'Error resetting data: {str(e)}', 'error')
+        # Get confirmation and backup option
+        confirm_reset = request.form.get('confirm_reset')
+        create_backup = request.form.get('create_backup', False)
+
+        if confirm_reset == 'yes':
+            # The backup and the deletes can take minutes on a long history, run them as a job
+            job_id = submit_job('reset_sales', created_by=session.get('username'), backup=bool(create_backup))
+            flash(f'Sales data reset started (job #{job_id}).', 'info')
+            return redirect(url_for('list_jobs'))
+        else:
+            flash('Data reset cancelled.', 'info')
             return redirect(url_for('admin_dashboard'))
     
     # GET request - show confirmation page
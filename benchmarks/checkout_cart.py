@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Benchmark POST /checkout by cart size: checkouts/s and SQL statements per checkout.
+
+Carts of each --lines size are checked out back to back through Flask's test client, in
+--rounds rounds; the best round is reported, which keeps a busy machine's noise out of it.
+With --baseline REV, app.py and templates of an older git revision (e.g. the one before
+checkout validated and decremented the cart as a set) are run the same way, alternating
+with the current tree --repeat times, and the two are printed side by side. Each run gets
+its own throwaway SQLite database (--database-url applies without --baseline only);
+checkouts really sell stock, so never point it at a real database.
+
+    python benchmarks/checkout_cart.py --lines 1,5,20 --baseline 3508a73^
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(app_dir, database_url, lines, checkouts, rounds):
+    """Run the checkouts against the app in app_dir; returns {lines: {...}} per cart size."""
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, app_dir)
+    import app as app_module
+    from sqlalchemy import event
+
+    db, StockItem = app_module.db, app_module.StockItem
+    with app_module.app.app_context():
+        # Deep enough in stock that no run sells an item out
+        db.session.execute(db.insert(StockItem), [{
+            'name': f'Shoe {n}', 'buying_price': 1000.0, 'selling_price': 2000.0, 'size': str(36 + n % 11),
+            'quantity': 10 ** 7, 'description': f'Model {n}'
+        } for n in range(max(lines))])
+        db.session.commit()
+        item_ids = [item_id for (item_id,) in db.session.query(StockItem.id).order_by(StockItem.id)]
+        db.session.remove()
+        engine = db.engine
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=1, username='cashier1', role='staff')
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(1))
+    results = {}
+    for size in lines:
+        cart = json.dumps([{'id': item_id, 'quantity': 1, 'price': 2000.0} for item_id in item_ids[:size]])
+        form = {'cart': cart, 'payment_method': 'cash', 'total': str(2000.0 * size)}
+        client.post('/checkout', data=form)  # warm up caches and compiled statements
+        statements.clear()
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(checkouts):
+                response = client.post('/checkout', data=form)
+                if response.status_code != 200:
+                    sys.exit(f'checkout of {size} lines failed with {response.status_code}')
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[size] = {'checkouts_per_s': round(checkouts / best, 1),
+                         'statements': round(len(statements) / (checkouts * rounds), 1)}
+    return results
+
+
+def extract_revision(revision):
+    """app.py and templates of a git revision, in a temporary directory."""
+    app_dir = tempfile.mkdtemp(prefix='checkout-baseline-')
+    archive = os.path.join(app_dir, 'tree.tar')
+    subprocess.run(['git', 'archive', '--output', archive, revision, 'app.py', 'templates'], cwd=REPO, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(app_dir)
+    return app_dir
+
+
+def run_app(app_dir, args):
+    """Measure the app in app_dir in a subprocess (two app modules would clash in sys.modules)."""
+    output = os.path.join(tempfile.mkdtemp(), 'results.json')
+    subprocess.run([sys.executable, os.path.abspath(__file__), '--app-dir', app_dir, '--lines', args.lines,
+                    '--checkouts', str(args.checkouts), '--rounds', str(args.rounds), '--json', output],
+                   check=True, stdout=subprocess.DEVNULL)
+    with open(output) as f:
+        return {int(size): row for size, row in json.load(f).items()}
+
+
+def best_of(runs):
+    return {size: max((run[size] for run in runs), key=lambda row: row['checkouts_per_s']) for size in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', default='1,5,20', help='comma separated cart sizes')
+    parser.add_argument('--checkouts', type=int, default=200, help='checkouts per round')
+    parser.add_argument('--rounds', type=int, default=5, help='rounds per cart size, the best is reported')
+    parser.add_argument('--baseline', help='git revision to compare against')
+    parser.add_argument('--repeat', type=int, default=3, help='alternating runs of each app with --baseline')
+    parser.add_argument('--app-dir', default=REPO, help=argparse.SUPPRESS)
+    parser.add_argument('--database-url', help='database to fill (default: a temporary SQLite file)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    lines = [int(n) for n in args.lines.split(',')]
+    baseline = None
+    if args.baseline:
+        # Alternate the two apps so a slow patch on the machine hits both alike
+        baseline_dir, baseline_runs, runs = extract_revision(args.baseline), [], []
+        for _ in range(args.repeat):
+            baseline_runs.append(run_app(baseline_dir, args))
+            runs.append(run_app(args.app_dir, args))
+        baseline, results = best_of(baseline_runs), best_of(runs)
+    else:
+        database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'checkout.db')
+        results = measure(args.app_dir, database_url, lines, args.checkouts, args.rounds)
+
+    if baseline:
+        print(f"{'lines':>5} {'checkouts/s':>11} {'baseline':>9} {'speedup':>8} {'statements':>10} {'baseline':>9}")
+        for size in lines:
+            row, old = results[size], baseline[size]
+            print(f"{size:>5} {row['checkouts_per_s']:>11.1f} {old['checkouts_per_s']:>9.1f} "
+                  f"{row['checkouts_per_s'] / old['checkouts_per_s']:>7.2f}x "
+                  f"{row['statements']:>10.1f} {old['statements']:>9.1f}")
+    else:
+        print(f"{'lines':>5} {'checkouts/s':>11} {'statements':>10}")
+        for size in lines:
+            print(f"{size:>5} {results[size]['checkouts_per_s']:>11.1f} {results[size]['statements']:>10.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'current': results, 'baseline': baseline} if baseline else results, f, indent=2)
+        print(f'\nResults written to {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Print the query plans of each route's SQL with and without the hot-column indexes
+(migrations 5c0e8a1f7b23 and d9f3b1c7e5a2) on a seeded dataset.
+
+Every route is called once through Flask's test client; the statements it runs are
+captured and then EXPLAINed twice: with those indexes dropped and with them recreated.
+Runs against a throwaway SQLite database unless --database-url is given.
+
+    python benchmarks/explain_plans.py --sales 50000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import warnings
+from datetime import date, datetime, timedelta
+
+HOT_INDEXES = [
+    'ix_sale_date_id', 'ix_sale_created_by_business_date', 'ix_sale_payment_method_business_date',
+    'ix_sale_item_sale_id', 'ix_sale_item_item_id', 'ix_stock_item_in_stock',
+]
+
+ROUTES = [
+    '/pos',
+    '/api/products/search?q=shoe 1',
+    '/sales',
+    '/sales?seller=cashier1&payment_method=mpesa',
+    '/sales?seller=cashier1&start_date={month_ago}',
+    '/sales?payment_method=cash&start_date={month_ago}&end_date={today}',
+    '/sales-viewer',
+    '/admin/profit-analysis?time_range=year',
+    '/admin/stock',
+    '/admin/stock?search=shoe 12',
+]
+
+
+def seed(app_module, n_items, n_sales):
+    """Minimal dataset: n_items stock items and n_sales sales of 1-3 lines over the last year."""
+    db = app_module.db
+    random.seed(7)
+    db.session.execute(db.insert(app_module.StockItem), [{
+        'name': f'Shoe {n}', 'buying_price': 1000.0 + n % 500, 'selling_price': 1800.0 + n % 500,
+        'size': str(36 + n % 11), 'quantity': n % 20, 'description': f'Model {n % 37}'
+    } for n in range(n_items)])
+    now = datetime.utcnow()
+    for start in range(0, n_sales, 5000):
+        count = min(5000, n_sales - start)
+        sales = [{
+            'date': now - timedelta(minutes=random.randint(0, 365 * 24 * 60)),
+            'total_amount': 0.0,
+            'payment_method': random.choice(['cash', 'mpesa']),
+            'created_by': f'cashier{random.randint(1, 5)}'
+        } for _ in range(count)]
+        db.session.execute(db.insert(app_module.Sale), sales)
+        first_id = db.session.query(db.func.max(app_module.Sale.id)).scalar() - count + 1
+        db.session.execute(db.insert(app_module.SaleItem), [{
+            'sale_id': sale_id, 'item_id': random.randint(1, n_items),
+            'quantity': random.randint(1, 3), 'price': 2000.0
+        } for sale_id in range(first_id, first_id + count) for _ in range(random.randint(1, 3))])
+        db.session.commit()
+    app_module.rebuild_rollups()
+
+
+def capture_statements(app_module):
+    """Run every route once and return {route: [(statement, parameters), ...]}."""
+    from sqlalchemy import event
+
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=1, username='admin', role='admin')
+
+    today = date.today()
+    dates = {'today': today.isoformat(), 'month_ago': (today - timedelta(days=30)).isoformat()}
+    statements = {}
+    event.listen(app_module.db.engine, 'before_cursor_execute', record)
+    try:
+        for route in ROUTES:
+            app_module.catalogue_cache.invalidate()
+            captured.clear()
+            client.get(route.format(**dates))
+            seen, statements[route] = set(), []
+            for statement, parameters in captured:
+                if statement not in seen:
+                    seen.add(statement)
+                    statements[route].append((statement, parameters))
+    finally:
+        event.remove(app_module.db.engine, 'before_cursor_execute', record)
+    return statements
+
+
+def explain(conn, statement, parameters):
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = conn.exec_driver_sql(prefix + statement, parameters).all()
+    if conn.dialect.name == 'sqlite':
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--sales', type=int, default=50000)
+    parser.add_argument('--database-url', help='database to seed (default: a temporary SQLite file)')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or (
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'explain.db'))
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as app_module
+
+    # checkfirst reflects stock_item's lower(name) expression index, which SQLite cannot describe
+    warnings.filterwarnings('ignore', message='Skipped unsupported reflection')
+
+    with app_module.app.app_context():
+        db = app_module.db
+        if app_module.Sale.query.count() == 0:
+            print(f'Seeding {args.items:,} items and {args.sales:,} sales...')
+            seed(app_module, args.items, args.sales)
+            app_module.User.query.filter_by(username='admin').first() or db.session.add(
+                app_module.User(username='admin', password='-', role='admin'))
+            db.session.commit()
+
+        statements = capture_statements(app_module)
+        indexes = [ix for table in db.metadata.tables.values() for ix in table.indexes if ix.name in HOT_INDEXES]
+
+        # Go through the session's connection: production pool settings allow only one
+        plans = {}
+        for phase in ('before', 'after'):
+            conn = db.session.connection()
+            for ix in indexes:
+                if phase == 'before':
+                    ix.drop(conn, checkfirst=True)
+                else:
+                    ix.create(conn, checkfirst=True)
+            conn.exec_driver_sql('ANALYZE')
+            db.session.commit()
+            conn = db.session.connection()
+            for route, route_statements in statements.items():
+                for statement, parameters in route_statements:
+                    plans[(phase, route, statement)] = explain(conn, statement, parameters)
+            db.session.rollback()
+
+        for route, route_statements in statements.items():
+            print('\n' + '=' * 100 + f'\n{route}  ({len(route_statements)} distinct SELECTs)')
+            for statement, _ in route_statements:
+                print('-' * 100)
+                print(' '.join(statement.split())[:400])
+                for phase in ('before', 'after'):
+                    print(f'  [{phase}]')
+                    for line in plans[(phase, route, statement)]:
+                        print('    ' + line)
+
+
+if __name__ == '__main__':
+    main()
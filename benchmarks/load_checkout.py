@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Load test checkout throughput under real gunicorn serving profiles.
+
+The database is seeded once (seed_data.py), then for each profile a gunicorn server is
+started from gunicorn.conf.py with WEB_CONCURRENCY / GUNICORN_THREADS / GUNICORN_WORKER_CLASS
+set, so the app sizes its pool the way it does in production. --clients cashier threads log
+in and check out one-line carts back to back (with a /pos or /sales read every few sales),
+while --report-clients admins keep requesting the yearly profit report. Per profile it prints
+checkouts/s, checkout p50/p95, report p95, failed requests and the workers' total RSS.
+
+After every profile the database is checked: one sale per successful checkout, and stock
+reduced by exactly the quantities sold. A mismatch or 5xx points at shared state going
+wrong under concurrency (or a worker killed mid-request); the server log path is printed.
+
+Runs against a throwaway SQLite database unless --database-url is given. Checkouts really
+sell stock, so never point it at a real database.
+
+    python benchmarks/load_checkout.py --profiles sync:2:1,gthread:2:4 --clients 16 --duration 20
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import seed_data  # noqa: E402
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+READS = ['/pos', '/sales', '/api/products/search?q=nike']
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def worker_rss_mb(master_pid):
+    """Resident memory of the gunicorn workers (children of the master), from /proc."""
+    total = 0
+    try:
+        with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+            children = f.read().split()
+    except OSError:
+        return None
+    for pid in children:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total / 1024
+
+
+def database_totals(app_module):
+    db, Sale, SaleItem, StockItem = app_module.db, app_module.Sale, app_module.SaleItem, app_module.StockItem
+    with app_module.app.app_context():
+        totals = (
+            db.session.query(db.func.count(Sale.id)).scalar(),
+            db.session.query(db.func.coalesce(db.func.sum(SaleItem.quantity), 0)).scalar(),
+            db.session.query(db.func.coalesce(db.func.sum(StockItem.quantity), 0)).scalar()
+        )
+        db.session.remove()
+    return totals
+
+
+class Client:
+    """A logged-in browser session against the server."""
+
+    def __init__(self, base_url, username):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.request('/login', {'username': username, 'password': seed_data.PASSWORD})
+
+    def request(self, path, form=None):
+        """Returns (status, final path, seconds); redirects are followed."""
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        start = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, data=data, timeout=60) as response:
+                response.read()
+                status, url = response.status, response.url
+        except urllib.error.HTTPError as e:
+            status, url = e.code, e.url
+        except (urllib.error.URLError, OSError):
+            status, url = 599, path
+        return status, urllib.parse.urlparse(url).path, time.perf_counter() - start
+
+
+def run_profile(base_url, items, args, sellers):
+    stop = time.monotonic() + args.duration
+    lock = threading.Lock()
+    stats = {'checkouts': [], 'rejected': 0, 'reports': [], 'reads': 0, 'errors': 0, 'sold': 0}
+
+    def cashier(n):
+        rng = random.Random(n)
+        client = Client(base_url, sellers[n % len(sellers)])
+        done = 0
+        while time.monotonic() < stop:
+            item = rng.choice(items)
+            form = {'cart': json.dumps([{'id': item[0], 'quantity': 1, 'price': item[1]}]),
+                    'payment_method': rng.choice(['cash', 'mpesa']), 'total': str(item[1]),
+                    'idempotency_key': uuid.uuid4().hex}
+            status, path, seconds = client.request('/checkout', form)
+            with lock:
+                if status >= 500:
+                    stats['errors'] += 1
+                elif path == '/checkout':
+                    stats['checkouts'].append(seconds)
+                    stats['sold'] += 1
+                else:
+                    stats['rejected'] += 1  # redirected back to /pos with a flash message
+            done += 1
+            if done % args.read_every == 0:
+                status, _, _ = client.request(READS[done // args.read_every % len(READS)])
+                with lock:
+                    stats['reads'] += 1
+                    stats['errors'] += status >= 500
+
+    def reporter(n):
+        client = Client(base_url, 'admin')
+        while time.monotonic() < stop:
+            status, _, seconds = client.request('/admin/profit-analysis?time_range=year')
+            with lock:
+                stats['reports'].append(seconds)
+                stats['errors'] += status >= 500
+
+    threads = [threading.Thread(target=cashier, args=(n,)) for n in range(args.clients)]
+    threads += [threading.Thread(target=reporter, args=(n,)) for n in range(args.report_clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats['elapsed'] = time.monotonic() - started
+    return stats
+
+
+def start_server(database_url, worker_class, workers, threads):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, PORT=str(port), WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads), GUNICORN_WORKER_CLASS=worker_class,
+               PROMETHEUS_MULTIPROC_DIR=tempfile.mkdtemp(prefix='load-metrics-'))
+    log = tempfile.NamedTemporaryFile('w', prefix=f'gunicorn-{worker_class}-', suffix='.log', delete=False)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '--config', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+        cwd=REPO, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    server.log_path = log.name
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(base_url + '/health', timeout=1).read()
+            return server, base_url
+        except OSError:
+            if server.poll() is not None:
+                with open(log.name) as f:
+                    raise RuntimeError('gunicorn exited:\n' + f.read())
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not come up')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', default='sync:2:1,gthread:2:4',
+                        help='comma separated worker_class:workers:threads')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent cashiers')
+    parser.add_argument('--report-clients', type=int, default=1, help='admins requesting the profit report')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per profile')
+    parser.add_argument('--read-every', type=int, default=5, help='cashiers load a page every N checkouts')
+    parser.add_argument('--items', type=int, default=500, help='stock items in the catalogue')
+    parser.add_argument('--sales', type=int, default=20000, help='sales history for the report')
+    parser.add_argument('--database-url', help='database to fill (default: a temporary SQLite file)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db')
+    app_module = seed_data.load_app(database_url)
+    rng = random.Random(7)
+    with app_module.app.app_context():
+        StockItem = app_module.StockItem
+        sellers = seed_data.seed_users(app_module)[1:]
+        if StockItem.query.count() < args.items:
+            seed_data.seed_stock(app_module, args.items - StockItem.query.count(), rng)
+        have = app_module.Sale.query.count()
+        if have < args.sales:
+            print(f'Seeding {args.sales - have:,} sales...')
+            seed_data.seed_sales(app_module, args.sales - have, 1, sellers + ['admin'], rng)
+            app_module.rebuild_rollups()
+        # Items deep enough in stock that the run never sells them out
+        items = [(row.id, row.selling_price) for row in
+                 StockItem.query.filter(StockItem.quantity >= 100000).order_by(StockItem.id).all()]
+        app_module.db.session.remove()
+        app_module.db.engine.dispose()
+    if not items:
+        sys.exit('No deep-stock items to sell, seed more --items')
+
+    results = []
+    print(f"\n{'profile':<16} {'checkouts/s':>11} {'p50 ms':>8} {'p95 ms':>8} {'report p95':>10} "
+          f"{'rejected':>8} {'5xx':>5} {'RSS MB':>8}  consistent")
+    for profile in args.profiles.split(','):
+        worker_class, workers, threads = profile.split(':')
+        before = database_totals(app_module)
+        server, base_url = start_server(database_url, worker_class, int(workers), int(threads))
+        try:
+            stats = run_profile(base_url, items, args, sellers)
+            rss = worker_rss_mb(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+        after = database_totals(app_module)
+        new_sales, sold_quantity, stock_drop = after[0] - before[0], after[1] - before[1], before[2] - after[2]
+        consistent = new_sales == stats['sold'] and sold_quantity == stock_drop == stats['sold']
+
+        checkouts = stats['checkouts']
+        row = {
+            'profile': profile,
+            'checkouts_per_s': round(len(checkouts) / stats['elapsed'], 1),
+            'checkout_p50_ms': round(statistics.median(checkouts) * 1000, 1) if checkouts else None,
+            'checkout_p95_ms': round(percentile(checkouts, 95) * 1000, 1),
+            'report_p95_ms': round(percentile(stats['reports'], 95) * 1000, 1),
+            'reports': len(stats['reports']),
+            'reads': stats['reads'],
+            'rejected': stats['rejected'],
+            'errors': stats['errors'],
+            'worker_rss_mb': round(rss, 1) if rss is not None else None,
+            'consistent': consistent
+        }
+        results.append(row)
+        print(f"{profile:<16} {row['checkouts_per_s']:>11.1f} {row['checkout_p50_ms'] or 0:>8.1f} "
+              f"{row['checkout_p95_ms']:>8.1f} {row['report_p95_ms']:>10.1f} {row['rejected']:>8} "
+              f"{row['errors']:>5} {row['worker_rss_mb'] or 0:>8.1f}  "
+              + ('yes' if consistent else f'NO (sales {new_sales}, sold {sold_quantity}, stock -{stock_drop}, '
+                                          f"ok responses {stats['sold']})"))
+        if stats['errors'] or not consistent:
+            print(f'  server log: {server.log_path}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'clients': args.clients, 'report_clients': args.report_clients,
+                       'duration': args.duration, 'database': database_url.split(':')[0],
+                       'results': results}, f, indent=2)
+        print(f'\nResults written to {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Benchmark the profit report's product figures: per-row dicts vs NumPy columns.
+
+Fills DailyProductSales (the per product, per day rollup the report reads) with --rows
+rows spread over --days days, then computes the report's product figures over the whole
+range twice: with the previous implementation (one dict per rollup row, then a Python loop
+per figure, kept here as legacy_product_report) and with app.product_report(). Prints wall
+time and CPU time of one run and the tracemalloc peak of another for both, and checks that
+they return the same figures.
+
+Runs against a throwaway SQLite database unless --database-url is given; the rollup table
+is emptied first, so never point it at a real database.
+
+    python benchmarks/profit_analytics.py --rows 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import seed_data  # noqa: E402
+
+
+def seed_rollups(app_module, rows, days, items, end_date, rng):
+    """rows DailyProductSales rows over the days up to end_date; several items share a name (sizes)."""
+    db, DailyProductSales = app_module.db, app_module.DailyProductSales
+    db.session.execute(db.delete(DailyProductSales))
+    per_day = rows // days
+    batch = []
+    for offset in range(days):
+        business_date = end_date - timedelta(days=days - 1 - offset)
+        for item_id in sorted(rng.sample(range(1, items + 1), per_day)):
+            quantity = rng.choice([1, 1, 1, 2, 2, 3, 5])
+            price = 1000 + 37 * (item_id % 200)
+            cost = price * 0.6
+            batch.append({'business_date': business_date, 'item_id': item_id, 'name': f'Model {item_id // 4}',
+                          'quantity': quantity, 'revenue': price * quantity, 'cost': cost * quantity,
+                          'profit': (price - cost) * quantity})
+        if len(batch) >= 50000:
+            db.session.execute(db.insert(DailyProductSales), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(DailyProductSales), batch)
+    db.session.commit()
+    return per_day * days
+
+
+def legacy_product_report(app_module, start_date, end_date, today):
+    """The product part of profit_analysis() before the columnar engine."""
+    DailyProductSales = app_module.DailyProductSales
+    rows = DailyProductSales.query.filter(
+        DailyProductSales.business_date >= start_date,
+        DailyProductSales.business_date <= end_date
+    ).order_by(DailyProductSales.business_date, DailyProductSales.item_id).all()
+    all_items_sold = [{
+        'item_id': row.item_id,
+        'name': row.name if row.name is not None else f"Item#{row.item_id}",
+        'quantity': row.quantity,
+        'sale_date': row.business_date,
+        'revenue': row.revenue,
+        'cost': row.cost,
+        'profit': row.profit
+    } for row in rows]
+
+    product_stats = {}
+    for it in all_items_sold:
+        product = product_stats.setdefault(it['name'], {'quantity_sold': 0, 'revenue': 0.0, 'profit': 0.0})
+        product['quantity_sold'] += it['quantity']
+        product['revenue'] += it['revenue']
+        product['profit'] += it['profit']
+    top_products = []
+    for name, stats in product_stats.items():
+        margin = (stats['profit'] / stats['revenue'] * 100) if stats['revenue'] else 0.0
+        top_products.append({'name': name, 'quantity_sold': stats['quantity_sold'], 'revenue': stats['revenue'],
+                             'profit': stats['profit'], 'margin': round(margin, 1)})
+    top_products.sort(key=lambda x: x['profit'], reverse=True)
+
+    daily_item_counts = {}
+    for it in all_items_sold:
+        date_str = it['sale_date'].strftime('%Y-%m-%d')
+        daily_item_counts.setdefault(date_str, {})
+        daily_item_counts[date_str][it['name']] = daily_item_counts[date_str].get(it['name'], 0) + it['quantity']
+    most_sold_per_day = {}
+    for date_key, counts in daily_item_counts.items():
+        if counts:
+            most_sold_per_day[date_key] = max(counts.items(), key=lambda x: x[1])[0]
+
+    weekly_counts_by_product = {}
+    for it in all_items_sold:
+        week_key = f"{it['sale_date'].isocalendar()[0]}-W{it['sale_date'].isocalendar()[1]}"
+        weekly_counts_by_product[(week_key, it['name'])] = \
+            weekly_counts_by_product.get((week_key, it['name']), 0) + it['quantity']
+    weekly_agg = {}
+    for (wk, name), qty in weekly_counts_by_product.items():
+        weekly_agg[name] = weekly_agg.get(name, 0) + qty
+    most_sold = max(weekly_agg.items(), key=lambda x: x[1]) if weekly_agg else ('N/A', 0)
+
+    today_str = today.strftime('%Y-%m-%d')
+    grouped = {}
+    for item in all_items_sold:
+        if item['sale_date'].strftime('%Y-%m-%d') != today_str:
+            continue
+        entry = grouped.setdefault(item['name'], {'name': item['name'], 'quantity': 0, 'revenue': 0.0,
+                                                  'profit': 0.0, 'unit_price': 0.0})
+        entry['quantity'] += item['quantity']
+        entry['revenue'] += item['revenue']
+        entry['profit'] += item['profit']
+    for entry in grouped.values():
+        if entry['quantity'] > 0:
+            entry['unit_price'] = entry['revenue'] / entry['quantity']
+
+    return {
+        'top_products': top_products[:10],
+        'most_sold': most_sold,
+        'most_sold_per_day': most_sold_per_day,
+        'daily_item_counts': {day: {name: daily_item_counts[day][name]} for day, name in most_sold_per_day.items()},
+        'todays_items': list(grouped.values())
+    }
+
+
+def measure(label, function, app_module):
+    """Time one run, then measure the peak Python memory (tracemalloc) of a second one."""
+    app_module.db.session.remove()
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = function()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    del result
+    app_module.db.session.remove()
+    tracemalloc.start()
+    result = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<10} {wall:>8.2f} s wall {cpu:>8.2f} s CPU {peak / 2 ** 20:>9.1f} MB peak')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='rollup rows (product x day)')
+    parser.add_argument('--days', type=int, default=730, help='days they are spread over')
+    parser.add_argument('--items', type=int, default=2000, help='distinct items')
+    parser.add_argument('--database-url', help='database to fill (default: a temporary SQLite file)')
+    args = parser.parse_args()
+
+    app_module = seed_data.load_app(args.database_url or (
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'profit.db')))
+    today = datetime.now(pytz.timezone(app_module.app.config['TIMEZONE'])).date()
+    start_date = today - timedelta(days=args.days - 1)
+
+    with app_module.app.app_context():
+        print(f'Writing {args.rows:,} rollup rows...')
+        rows = seed_rollups(app_module, args.rows, args.days, args.items, today, random.Random(3))
+        print(f'\n{rows:,} rows, {args.days} days\n')
+        legacy = measure('dict rows', lambda: legacy_product_report(app_module, start_date, today, today), app_module)
+        columnar = measure('columnar', lambda: app_module.product_report(start_date, today, today), app_module)
+
+    # The per-day winners moved to top_sellers() (SQL); compare the figures product_report() returns
+    same = all(legacy[key] == columnar[key] for key in columnar)
+    print('\nsame figures:', 'yes' if same else 'NO')
+    for key in columnar:
+        if legacy[key] != columnar[key]:
+            print(f'  {key} differs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Benchmark the main routes through Flask's test client at growing history sizes.
+
+For each size the database is grown with seed_data.py (items, cashiers, sales over
+--years), then every route is requested --repeat times. Per route it reports the p50 and
+p95 latency, the SQL statements one request runs and the peak Python memory allocated
+while serving it (tracemalloc, measured on a separate request). The page cache is emptied
+before every request, so cached pages are timed rendering; CACHED_ROUTES are also timed
+as page cache hits, on rows marked "(cache hit)".
+
+Runs against a throwaway SQLite database unless --database-url is given. The rows it
+inserts are not removed (checkout really sells stock), so never point it at a real database.
+
+    python benchmarks/routes.py --sizes 10000,100000,1000000 --json results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import seed_data  # noqa: E402
+
+ROUTES = [
+    ('GET', '/pos'),
+    ('GET', '/api/products/search?q=nike'),
+    ('GET', '/sales'),
+    ('GET', '/sales?seller=cashier1&payment_method=mpesa'),
+    ('GET', '/sales-viewer'),
+    ('GET', '/admin/profit-analysis?time_range=week'),
+    ('GET', '/admin/profit-analysis?time_range=year'),
+    ('GET', '/admin/stock'),
+    ('GET', '/admin/stock?search=samba'),
+    ('POST', '/checkout'),
+]
+# Pages behind @cached_page, also timed when served from the page cache
+CACHED_ROUTES = [
+    '/sales',
+    '/admin/profit-analysis?time_range=year',
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class StatementCounter:
+    """Counts the statements sent to the database while enabled."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def checkout_form(app_module):
+    """A one-line cart for an item that will not run out of stock during the run."""
+    StockItem = app_module.StockItem
+    item = StockItem.query.order_by(StockItem.quantity.desc(), StockItem.id).first()
+    app_module.db.session.rollback()
+    return {
+        'cart': json.dumps([{'id': item.id, 'quantity': 1, 'price': item.selling_price}]),
+        'payment_method': 'cash',
+        'total': str(item.selling_price)
+    }
+
+
+def run_route(app_module, client, counter, method, route, form, repeat, cache_hits=False):
+    def call():
+        if not cache_hits:
+            app_module.page_cache.clear()
+        if method == 'POST':
+            response = client.post(route, data=form)
+        else:
+            response = client.get(route)
+        # Release the request's identity map like a real worker would between requests
+        app_module.db.session.remove()
+        return response
+
+    # Warm up once (templates, caches), then time
+    status = call().status_code
+    samples, statements = [], []
+    for _ in range(repeat):
+        counter.count = 0
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+        statements.append(counter.count)
+
+    tracemalloc.start()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'status': status,
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'sql_statements': max(statements),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000', help='comma separated numbers of sales')
+    parser.add_argument('--items', type=int, default=2000, help='stock items in the catalogue')
+    parser.add_argument('--years', type=float, default=3, help='history length the sales are spread over')
+    parser.add_argument('--repeat', type=int, default=20, help='timed requests per route')
+    parser.add_argument('--database-url', help='database to fill (default: a temporary SQLite file)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    app_module = seed_data.load_app(args.database_url or (
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'routes.db')))
+    rng = random.Random(42)
+    results = []
+    with app_module.app.app_context():
+        db, Sale, StockItem = app_module.db, app_module.Sale, app_module.StockItem
+        sellers = seed_data.seed_users(app_module)
+        if StockItem.query.count() < args.items:
+            seed_data.seed_stock(app_module, args.items - StockItem.query.count(), rng)
+        admin = app_module.User.query.filter_by(username='admin').first()
+        counter = StatementCounter(db.engine)
+
+        client = app_module.app.test_client()
+        with client.session_transaction() as session:
+            session.update(user_id=admin.id, username=admin.username, role=admin.role)
+
+        for size in sorted(int(s) for s in args.sizes.split(',')):
+            have = Sale.query.count()
+            if have < size:
+                print(f'\nGrowing the history to {size:,} sales...')
+                seed_data.seed_sales(app_module, size - have, args.years, sellers, rng)
+                app_module.rebuild_rollups()
+                app_module.invalidate_sales_filter_values()
+            if db.engine.dialect.name == 'postgresql':
+                db.session.execute(db.text('ANALYZE'))
+                db.session.commit()
+            form = checkout_form(app_module)
+
+            print(f'\n{size:,} sales, {args.items:,} items')
+            print(f"{'route':<56} {'p50 ms':>9} {'p95 ms':>9} {'SQL':>5} {'peak KB':>9}")
+            for method, route in ROUTES:
+                row = run_route(app_module, client, counter, method, route, form, args.repeat)
+                label = f'{method} {route}'
+                print(f"{label:<56} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                      f"{row['sql_statements']:>5} {row['peak_memory_kb']:>9.1f}"
+                      + ('' if row['status'] < 400 else f"  (HTTP {row['status']})"))
+                results.append({'sales': size, 'items': args.items, 'method': method, 'route': route,
+                                'page_cache_hit': False, **row})
+            for route in CACHED_ROUTES:
+                row = run_route(app_module, client, counter, 'GET', route, form, args.repeat, cache_hits=True)
+                label = f'GET {route} (cache hit)'
+                print(f"{label:<56} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                      f"{row['sql_statements']:>5} {row['peak_memory_kb']:>9.1f}")
+                results.append({'sales': size, 'items': args.items, 'method': 'GET', 'route': route,
+                                'page_cache_hit': True, **row})
+
+        dialect = db.engine.dialect.name
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'run_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+                'database': dialect,
+                'python': platform.python_version(),
+                'repeat': args.repeat,
+                'results': results
+            }, f, indent=2)
+        print(f'\nResults written to {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Fill a database with a synthetic but realistic shop history.
+
+Builds the app's own models (User, StockItem, Sale, SaleItem) with bulk INSERTs:
+- a catalogue of shoes with log-normal buying prices and 30-90% markups
+- a few cashiers plus an admin, all with password 'password123'
+- sales spread over N years with business growth, weekly and December seasonality,
+  trading hours peaking mid-afternoon (Africa/Nairobi), basket sizes of mostly 1-2 pairs,
+  Zipf-like product popularity and an M-Pesa/cash mix
+then rebuilds the reporting rollups.
+
+    python benchmarks/seed_data.py --items 5000 --sales 1000000 --years 3
+
+Without --database-url the app's own configuration is used (DATABASE_URL or the local
+SQLite database). Sales are appended, so running it twice doubles the history.
+"""
+
+import argparse
+import math
+import os
+import random
+import string
+import sys
+from datetime import datetime, timedelta, time as dt_time
+
+import pytz
+
+BRANDS = ['Nike', 'Adidas', 'Puma', 'Reebok', 'Vans', 'Converse', 'Bata', 'Clarks', 'Timberland', 'Fila',
+          'New Balance', 'Skechers', 'Asics', 'Jordan', 'Dr. Martens']
+MODELS = ['Air Max', 'Samba', 'Suede', 'Classic', 'Old Skool', 'Chuck Taylor', 'Desert Boot', 'Runner',
+          'Court', 'Trail', 'Loafer', 'Sandal', 'Slide', 'Oxford', 'Chelsea Boot', 'High Top']
+COLOURS = ['black', 'white', 'red', 'blue', 'grey', 'brown', 'green', 'navy', 'beige', 'pink']
+
+# Relative number of sales per weekday (Monday first) and per local hour of the day
+WEEKDAY_WEIGHTS = [0.85, 0.8, 0.85, 0.9, 1.1, 1.45, 0.7]
+HOUR_WEIGHTS = {8: 0.3, 9: 0.6, 10: 0.9, 11: 1.0, 12: 1.2, 13: 1.4, 14: 1.3, 15: 1.3,
+                16: 1.4, 17: 1.5, 18: 1.2, 19: 0.7, 20: 0.3}
+PAYMENT_METHODS = [('mpesa', 0.65), ('cash', 0.35)]
+PASSWORD = 'password123'
+
+
+def load_app(database_url=None):
+    """Import the app against database_url (default: its own configuration)."""
+    if database_url:
+        os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as app_module
+    return app_module
+
+
+def next_id(app_module, model):
+    db = app_module.db
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def sync_sequences(app_module):
+    """Explicit ids leave PostgreSQL serial sequences behind, move them past the max id."""
+    db = app_module.db
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for table in ('stock_item', 'sale', 'sale_item'):
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"GREATEST((SELECT max(id) FROM {table}), 1))"
+        ))
+    db.session.commit()
+
+
+def seed_users(app_module, cashiers=4):
+    """An 'admin' and cashier1..N; existing usernames are left alone. Returns the seller names."""
+    from werkzeug.security import generate_password_hash
+    db, User = app_module.db, app_module.User
+    password = generate_password_hash(PASSWORD)
+    names = [('admin', 'admin')] + [(f'cashier{n}', 'staff') for n in range(1, cashiers + 1)]
+    existing = {username for (username,) in db.session.query(User.username)}
+    db.session.add_all(User(username=name, password=password, role=role)
+                       for name, role in names if name not in existing)
+    db.session.commit()
+    return [name for name, _ in names]
+
+
+def seed_stock(app_module, count, rng):
+    """Append count stock items."""
+    db, StockItem = app_module.db, app_module.StockItem
+    first = next_id(app_module, StockItem)
+    for start in range(0, count, 10000):
+        rows = []
+        for n in range(first + start, first + min(count, start + 10000)):
+            brand, model, colour = rng.choice(BRANDS), rng.choice(MODELS), rng.choice(COLOURS)
+            buying = round(math.exp(rng.gauss(math.log(2500), 0.5)), -1)
+            rows.append({
+                'id': n,
+                'name': f'{brand} {model} {colour.title()} #{n}',
+                'buying_price': buying,
+                'selling_price': round(buying * rng.uniform(1.3, 1.9), -1),
+                'size': str(rng.randint(36, 46)),
+                'quantity': rng.choice([0, 2, 5, 10, 20, 50, 100, 100000]),
+                'description': f'{colour} {model.lower()} by {brand}'
+            })
+        db.session.execute(db.insert(StockItem), rows)
+        db.session.commit()
+
+
+def day_weights(start_date, days, rng):
+    """Relative sales volume per day: 60% growth over the period, weekly and December peaks, noise."""
+    weights = []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        growth = 1.0 + 0.6 * offset / max(days - 1, 1)
+        season = 1.6 if day.month == 12 else (1.2 if day.month in (1, 8) else 1.0)
+        weights.append(growth * season * WEEKDAY_WEIGHTS[day.weekday()] * rng.uniform(0.8, 1.2))
+    return weights
+
+
+def split_counts(total, weights):
+    """Split total into integer counts proportional to weights (largest remainder)."""
+    scale = total / sum(weights)
+    exact = [w * scale for w in weights]
+    counts = [int(x) for x in exact]
+    for i in sorted(range(len(exact)), key=lambda i: exact[i] - counts[i], reverse=True)[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def seed_sales(app_module, count, years=3, sellers=None, rng=None, batch_size=5000, progress=None):
+    """Append count sales (with their lines) spread over the last `years` years, oldest first."""
+    db, Sale, SaleItem, StockItem = app_module.db, app_module.Sale, app_module.SaleItem, app_module.StockItem
+    rng = rng or random.Random(1)
+    sellers = sellers or ['admin']
+    seller_weights = [1.0 / (n + 1) ** 0.5 for n in range(len(sellers))]
+    tz = pytz.timezone(app_module.app.config.get('TIMEZONE', 'Africa/Nairobi'))
+
+    items = db.session.query(StockItem.id, StockItem.name, StockItem.selling_price, StockItem.buying_price).all()
+    if not items:
+        raise SystemExit('No stock items to sell, seed some first (--items).')
+    rng.shuffle(items)
+    # Zipf-like popularity: a few best sellers, a long tail
+    popularity = [1.0 / (rank + 1) ** 1.1 for rank in range(len(items))]
+    cumulative, running = [], 0.0
+    for weight in popularity:
+        running += weight
+        cumulative.append(running)
+
+    today = datetime.now(tz).date()
+    days = max(1, int(365 * years))
+    start_date = today - timedelta(days=days - 1)
+    per_day = split_counts(count, day_weights(start_date, days, rng))
+    hours = list(HOUR_WEIGHTS)
+    hour_weights = list(HOUR_WEIGHTS.values())
+
+    sale_id, line_id = next_id(app_module, Sale), next_id(app_module, SaleItem)
+    sales, lines, done = [], [], 0
+
+    def flush():
+        if sales:
+            db.session.execute(db.insert(Sale), sales)
+            db.session.execute(db.insert(SaleItem), lines)
+            db.session.commit()
+            sales.clear()
+            lines.clear()
+            if progress:
+                progress(done, count)
+
+    for offset, day_count in enumerate(per_day):
+        day = start_date + timedelta(days=offset)
+        local_times = sorted(
+            datetime.combine(day, dt_time(rng.choices(hours, hour_weights)[0], rng.randrange(60), rng.randrange(60)))
+            for _ in range(day_count)
+        )
+        for local_time in local_times:
+            basket = min(1 + int(math.log(1 - rng.random()) / math.log(0.35)), 6)
+            total = 0.0
+            for item_id, name, price, cost in {items[i] for i in
+                                               (_bisect(cumulative, rng.random() * running) for _ in range(basket))}:
+                quantity = 1 if rng.random() < 0.85 else 2
+                lines.append({'id': line_id, 'sale_id': sale_id, 'item_id': item_id, 'name': name,
+                              'unit_cost': cost, 'quantity': quantity, 'price': price})
+                total += price * quantity
+                line_id += 1
+            payment = rng.choices([m for m, _ in PAYMENT_METHODS], [w for _, w in PAYMENT_METHODS])[0]
+            sales.append({
+                'id': sale_id,
+                'date': tz.localize(local_time).astimezone(pytz.UTC).replace(tzinfo=None),
+                'total_amount': total,
+                'payment_method': payment,
+                'mpesa_code': ''.join(rng.choices(string.ascii_uppercase + string.digits, k=10)) if payment == 'mpesa' else '',
+                'created_by': rng.choices(sellers, seller_weights)[0]
+            })
+            sale_id += 1
+            done += 1
+            if len(sales) >= batch_size:
+                flush()
+    flush()
+    sync_sequences(app_module)
+
+
+def _bisect(cumulative, value):
+    lo, hi = 0, len(cumulative) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if cumulative[mid] < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=2000, help='stock items to add')
+    parser.add_argument('--sales', type=int, default=100000, help='sales to add')
+    parser.add_argument('--years', type=float, default=3, help='history length the sales are spread over')
+    parser.add_argument('--cashiers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1, help='random seed')
+    parser.add_argument('--database-url', help='database to fill (default: the app configuration)')
+    args = parser.parse_args()
+
+    app_module = load_app(args.database_url)
+    rng = random.Random(args.seed)
+    with app_module.app.app_context():
+        sellers = seed_users(app_module, args.cashiers)
+        print(f'Adding {args.items:,} stock items...')
+        seed_stock(app_module, args.items, rng)
+        print(f'Adding {args.sales:,} sales over {args.years:g} years...')
+        seed_sales(app_module, args.sales, args.years, sellers, rng,
+                   progress=lambda done, total: print(f'  {done:,}/{total:,}', end='\r'))
+        print('\nRebuilding reporting rollups...')
+        app_module.rebuild_rollups()
+        print('✓ Done.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark the indexed stock search (search_stock) against the old LIKE '%q%' path
+(like_stock_search) at growing catalogue sizes.
+
+Runs against a throwaway SQLite database unless --database-url is given. The rows it
+inserts are not removed, so never point it at a real database.
+
+    python benchmarks/stock_search.py --sizes 10000,100000,1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BRANDS = ['Nike', 'Adidas', 'Puma', 'Reebok', 'Vans', 'Converse', 'Bata', 'Clarks', 'Timberland', 'Fila']
+MODELS = ['Air Max', 'Samba', 'Suede', 'Classic', 'Old Skool', 'Chuck Taylor', 'Desert Boot', 'Runner', 'Court', 'Trail']
+COLOURS = ['black', 'white', 'red', 'blue', 'grey', 'brown', 'green', 'navy', 'beige', 'pink']
+TERMS = ['air max', 'samba 77', 'navy', 'boot', 'xyzzy', 'ru']
+
+
+def make_row(n):
+    brand, model, colour = random.choice(BRANDS), random.choice(MODELS), random.choice(COLOURS)
+    return {
+        'name': f'{brand} {model} {n}',
+        'buying_price': round(random.uniform(500, 5000), 2),
+        'selling_price': round(random.uniform(800, 8000), 2),
+        'size': str(random.randint(36, 46)),
+        'quantity': random.randint(0, 50),
+        'description': f'{colour} {model.lower()} by {brand}, batch {n % 97}'
+    }
+
+
+def timed(fn, term, repeat):
+    samples, count = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(fn(term))
+        samples.append((time.perf_counter() - start) * 1000)
+        app_module.db.session.expunge_all()
+    return statistics.median(samples), count
+
+
+def main():
+    global app_module
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma separated catalogue sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per term, the median is reported')
+    parser.add_argument('--database-url', help='database to fill (default: a temporary SQLite file)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'stock_search.db')
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as app_module
+
+    random.seed(42)
+    results = []
+    with app_module.app.app_context():
+        db, StockItem = app_module.db, app_module.StockItem
+        have = StockItem.query.count()
+        for size in sorted(int(s) for s in args.sizes.split(',')):
+            # Grow the catalogue to the next size in batches
+            while have < size:
+                batch = [make_row(n) for n in range(have, min(size, have + 10000))]
+                db.session.execute(db.insert(StockItem), batch)
+                db.session.commit()
+                have += len(batch)
+            if db.engine.dialect.name == 'postgresql':
+                db.session.execute(db.text('ANALYZE stock_item'))
+                db.session.commit()
+
+            print(f'\n{size:,} items')
+            print(f"{'term':<10} {'indexed ms':>11} {'LIKE ms':>9} {'speedup':>8} {'matches':>8}")
+            for term in TERMS:
+                indexed_ms, indexed_count = timed(app_module.search_stock, term, args.repeat)
+                like_ms, like_count = timed(app_module.like_stock_search, term, args.repeat)
+                speedup = like_ms / indexed_ms if indexed_ms else float('inf')
+                print(f'{term:<10} {indexed_ms:>11.2f} {like_ms:>9.2f} {speedup:>7.1f}x {indexed_count:>8}')
+                results.append({
+                    'items': size, 'term': term,
+                    'indexed_ms': round(indexed_ms, 3), 'like_ms': round(like_ms, 3),
+                    'indexed_matches': indexed_count, 'like_matches': like_count
+                })
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -30,6 +30,9 @@ if [ -n "$DATABASE_URL" ]; then
     fi
     
     echo "Migrations completed successfully!"
+
+    # Backfill the reporting rollups the first time they are deployed
+    flask rebuild-rollups --if-empty
 else
     echo "No DATABASE_URL found, skipping migrations (local development)"
 fi
\ No newline at end of file
@@ -0,0 +1,63 @@
+# Loaded automatically by gunicorn from the working directory, before the app is imported.
+import glob
+import os
+import tempfile
+
+# Serving profile. The default is sync workers, one request at a time each. Threaded
+# workers (gthread) serve GUNICORN_THREADS requests per process, so a slow report only
+# holds one thread; they measured no faster than sync on SQLite (CPU bound), so switch
+# only once a PostgreSQL load test (benchmarks/load_checkout.py) shows the gain. app.py
+# sizes each worker's database pool to its thread count from GUNICORN_THREADS, set here.
+#
+#   WEB_CONCURRENCY        worker processes (default 2)
+#   GUNICORN_THREADS       request threads per worker (default 1 for sync, 4 for gthread)
+#   GUNICORN_WORKER_CLASS  sync (default), or gthread for threaded workers
+#
+# Database connections needed: WEB_CONCURRENCY * (pool size + DB_MAX_OVERFLOW).
+worker_class = os.environ.setdefault('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.setdefault('GUNICORN_THREADS', '1' if worker_class == 'sync' else '4'))
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+preload_app = True
+max_requests = 1000
+max_requests_jitter = 100
+timeout = 30  # long work (large sales exports, backups) runs as background jobs, see app.py
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 60))
+keepalive = 2
+
+# prometheus_client multiprocess mode: each worker writes its metrics to *.db files in this
+# directory and /metrics sums them. Start every deploy without the previous run's files; only
+# those are removed, in case the directory is shared with anything else.
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'stock-management-metrics'))
+os.makedirs(metrics_dir, exist_ok=True)
+for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+    os.remove(path)
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of workers that exited (--max-requests restarts them regularly)
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+# Background jobs (backups, sales resets, rollup rebuilds) run on a thread inside the
+# worker that started them, so recycling the worker after max_requests would kill them
+# halfway. gunicorn counts a request, and decides to recycle, right after pre_request:
+# while a job is queued or running, and for any request that may start one (not a GET),
+# push the limit one request further. The worker recycles on the first GET after its jobs
+# are done. Restarts and deploys (SIGTERM) still stop the worker: worker_exit gives its
+# jobs graceful_timeout to finish, and a job killed after that shows as failed
+# ("Interrupted") on the jobs page, to be started again.
+def pre_request(worker, req):
+    import app
+    if worker.nr + 1 >= worker.max_requests and (app.jobs_active() or req.method not in ('GET', 'HEAD')):
+        worker.max_requests = worker.nr + 2
+
+
+def worker_exit(server, worker):
+    import app
+    if app.jobs_active():
+        worker.log.info('Waiting up to %ss for %d background job(s)', graceful_timeout, app.jobs_active())
+        if not app.wait_for_jobs(graceful_timeout - 1):
+            worker.log.warning('Background jobs still running at exit; they will show as interrupted')
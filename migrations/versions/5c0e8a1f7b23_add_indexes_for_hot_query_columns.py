@@ -0,0 +1,44 @@
+"""Add indexes for hot query columns
+
+Revision ID: 5c0e8a1f7b23
+Revises: e2b9f4a6c8d1
+Create Date: 2026-10-17 13:35:52.640118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c0e8a1f7b23'
+down_revision = 'e2b9f4a6c8d1'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    # (name, table, columns, partial index condition)
+    ('ix_sale_date_id', 'sale', ['date', 'id'], None),
+    ('ix_sale_created_by_date', 'sale', ['created_by', 'date'], None),
+    ('ix_sale_payment_method_date', 'sale', ['payment_method', 'date'], None),
+    ('ix_sale_item_sale_id', 'sale_item', ['sale_id'], None),
+    ('ix_sale_item_item_id', 'sale_item', ['item_id'], None),
+    ('ix_stock_item_in_stock', 'stock_item', ['name', 'id'], 'quantity > 0'),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns, where in INDEXES:
+        # db.create_all() creates these itself on a fresh database
+        if name in {ix['name'] for ix in inspector.get_indexes(table)}:
+            continue
+        kwargs = {}
+        if where is not None:
+            kwargs = {'postgresql_where': sa.text(where), 'sqlite_where': sa.text(where)}
+        op.create_index(name, table, columns, unique=False, **kwargs)
+
+
+def downgrade():
+    for name, table, columns, where in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,48 @@
+"""Add daily sales rollup tables
+
+Revision ID: 6f1d2c3a9b7e
+Revises: 42bc9b96095f
+Create Date: 2026-10-17 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f1d2c3a9b7e'
+down_revision = '42bc9b96095f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() at app import may already have created these tables
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'daily_sales_summary' not in existing:
+        op.create_table('daily_sales_summary',
+            sa.Column('business_date', sa.Date(), nullable=False),
+            sa.Column('sales_count', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.Column('cost', sa.Float(), nullable=False),
+            sa.Column('profit', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('business_date')
+        )
+
+    if 'daily_product_sales' not in existing:
+        op.create_table('daily_product_sales',
+            sa.Column('business_date', sa.Date(), nullable=False),
+            sa.Column('item_id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=True),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.Column('cost', sa.Float(), nullable=False),
+            sa.Column('profit', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('business_date', 'item_id')
+        )
+
+
+def downgrade():
+    op.drop_table('daily_product_sales')
+    op.drop_table('daily_sales_summary')
@@ -0,0 +1,44 @@
+"""Add background_job table
+
+Revision ID: a3c5e7f9b1d2
+Revises: 5c0e8a1f7b23
+Create Date: 2026-10-17 17:40:12.518304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e7f9b1d2'
+down_revision = '5c0e8a1f7b23'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() at app import may already have created the table
+    if 'background_job' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('background_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('params', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('done', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('message', sa.String(length=255), nullable=True),
+        sa.Column('result_path', sa.String(length=255), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_by', sa.String(length=80), nullable=True),
+        sa.Column('worker', sa.String(length=100), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('background_job')
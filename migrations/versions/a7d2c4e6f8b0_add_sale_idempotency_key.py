@@ -0,0 +1,33 @@
+"""Add sale.idempotency_key with a unique index
+
+Revision ID: a7d2c4e6f8b0
+Revises: a3c5e7f9b1d2
+Create Date: 2026-10-17 18:25:41.093127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d2c4e6f8b0'
+down_revision = 'a3c5e7f9b1d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'idempotency_key' not in {c['name'] for c in inspector.get_columns('sale')}:
+        with op.batch_alter_table('sale', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+
+    # Unique, but NULLs (sales rung up without a key) never collide
+    if 'ux_sale_idempotency_key' not in {i['name'] for i in inspector.get_indexes('sale')}:
+        op.create_index('ux_sale_idempotency_key', 'sale', ['idempotency_key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_sale_idempotency_key', table_name='sale')
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_column('idempotency_key')
@@ -0,0 +1,28 @@
+"""Add background_job.heartbeat_at
+
+Revision ID: b7e4d2a6c8f1
+Revises: f2c6a8e0b4d9
+Create Date: 2026-10-17 23:41:08.215093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4d2a6c8f1'
+down_revision = 'f2c6a8e0b4d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows stay NULL; mark_interrupted_jobs() falls back to created_at for them
+    if 'heartbeat_at' not in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('background_job')}:
+        with op.batch_alter_table('background_job', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('background_job', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
@@ -0,0 +1,28 @@
+"""Add lower(name) index for POS product search
+
+Revision ID: b83e5f0d21c4
+Revises: 6f1d2c3a9b7e
+Create Date: 2026-10-17 10:02:15.884310
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b83e5f0d21c4'
+down_revision = '6f1d2c3a9b7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() creates the index itself on a fresh database. Expression indexes are
+    # not reflected on SQLite, so rely on IF NOT EXISTS rather than the inspector
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE INDEX IF NOT EXISTS ix_stock_item_name_lower ON stock_item (lower(name) varchar_pattern_ops)')
+    else:
+        op.execute('CREATE INDEX IF NOT EXISTS ix_stock_item_name_lower ON stock_item (lower(name))')
+
+
+def downgrade():
+    op.drop_index('ix_stock_item_name_lower', table_name='stock_item')
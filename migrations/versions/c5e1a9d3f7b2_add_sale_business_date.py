@@ -0,0 +1,52 @@
+"""Add sale.business_date (local calendar date) with an index, backfilled
+
+Revision ID: c5e1a9d3f7b2
+Revises: a7d2c4e6f8b0
+Create Date: 2026-10-17 20:04:17.362918
+
+"""
+from datetime import datetime
+
+from alembic import op
+from flask import current_app
+import pytz
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e1a9d3f7b2'
+down_revision = 'a7d2c4e6f8b0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'business_date' not in {c['name'] for c in inspector.get_columns('sale')}:
+        with op.batch_alter_table('sale', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('business_date', sa.Date(), nullable=True))
+
+    # Backfill from the naive UTC sale.date, in the app's TIMEZONE (as checkout fills it)
+    tz_name = current_app.config.get('TIMEZONE', 'Africa/Nairobi')
+    if bind.dialect.name == 'postgresql':
+        op.execute(sa.text(
+            "UPDATE sale SET business_date = date(timezone(:tz, timezone('UTC', date))) "
+            "WHERE business_date IS NULL AND date IS NOT NULL"
+        ).bindparams(tz=tz_name))
+    else:
+        # SQLite has no timezone database, shift by the zone's UTC offset (Nairobi has no DST)
+        offset_minutes = int(datetime.now(pytz.timezone(tz_name)).utcoffset().total_seconds() // 60)
+        op.execute(sa.text(
+            "UPDATE sale SET business_date = date(date, :shift) "
+            "WHERE business_date IS NULL AND date IS NOT NULL"
+        ).bindparams(shift=f'{offset_minutes:+d} minutes'))
+
+    if 'ix_sale_business_date' not in {i['name'] for i in inspector.get_indexes('sale')}:
+        op.create_index('ix_sale_business_date', 'sale', ['business_date'])
+
+
+def downgrade():
+    op.drop_index('ix_sale_business_date', table_name='sale')
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_column('business_date')
@@ -0,0 +1,32 @@
+"""Add cache_version table
+
+Revision ID: d4a7c91e0f32
+Revises: b83e5f0d21c4
+Create Date: 2026-10-17 11:20:47.103962
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7c91e0f32'
+down_revision = 'b83e5f0d21c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # db.create_all() at app import may already have created the table
+    if 'cache_version' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('cache_version',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version')
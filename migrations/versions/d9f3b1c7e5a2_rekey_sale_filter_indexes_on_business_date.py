@@ -0,0 +1,42 @@
+"""Re-key the sale seller / payment method indexes on business_date
+
+The sales filters range over sale.business_date since c5e1a9d3f7b2, so
+(created_by, date) and (payment_method, date) no longer serve them.
+
+Revision ID: d9f3b1c7e5a2
+Revises: b7e4d2a6c8f1
+Create Date: 2026-10-18 00:52:31.604217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f3b1c7e5a2'
+down_revision = 'b7e4d2a6c8f1'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    # (old name, new name, leading column)
+    ('ix_sale_created_by_date', 'ix_sale_created_by_business_date', 'created_by'),
+    ('ix_sale_payment_method_date', 'ix_sale_payment_method_business_date', 'payment_method'),
+]
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('sale')}
+    for old_name, new_name, column in INDEXES:
+        if old_name in existing:
+            op.drop_index(old_name, table_name='sale')
+        # db.create_all() creates the new ones itself on a fresh database
+        if new_name not in existing:
+            op.create_index(new_name, 'sale', [column, 'business_date'], unique=False)
+
+
+def downgrade():
+    for old_name, new_name, column in reversed(INDEXES):
+        op.drop_index(new_name, table_name='sale')
+        op.create_index(old_name, 'sale', [column, 'date'], unique=False)
@@ -0,0 +1,32 @@
+"""Add stock item full-text search index
+
+Revision ID: e2b9f4a6c8d1
+Revises: d4a7c91e0f32
+Create Date: 2026-10-17 12:41:09.276583
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b9f4a6c8d1'
+down_revision = 'd4a7c91e0f32'
+branch_labels = None
+depends_on = None
+
+# Must match STOCK_SEARCH_DOCUMENT in app.py so the planner can use the index
+DOCUMENT = "coalesce(name, '') || ' ' || coalesce(size, '') || ' ' || coalesce(description, '')"
+
+
+def upgrade():
+    # SQLite builds its FTS5 table and triggers at app startup (ensure_stock_search_index)
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(f'CREATE INDEX IF NOT EXISTS ix_stock_item_search_trgm ON stock_item USING gin (({DOCUMENT}) gin_trgm_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP INDEX IF EXISTS ix_stock_item_search_trgm')
@@ -0,0 +1,39 @@
+"""Add sale_item.name and sale_item.unit_cost, snapshots of the stock item, backfilled
+
+Revision ID: e8b3d5f1a9c7
+Revises: c5e1a9d3f7b2
+Create Date: 2026-10-17 21:13:52.604381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b3d5f1a9c7'
+down_revision = 'c5e1a9d3f7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('sale_item')}
+    with op.batch_alter_table('sale_item', schema=None) as batch_op:
+        if 'name' not in columns:
+            batch_op.add_column(sa.Column('name', sa.String(length=100), nullable=True))
+        if 'unit_cost' not in columns:
+            batch_op.add_column(sa.Column('unit_cost', sa.Float(), nullable=True))
+
+    # Best effort for past sales: today's stock item. Lines of deleted items stay NULL.
+    op.execute(
+        "UPDATE sale_item SET "
+        "name = (SELECT stock_item.name FROM stock_item WHERE stock_item.id = sale_item.item_id), "
+        "unit_cost = (SELECT stock_item.buying_price FROM stock_item WHERE stock_item.id = sale_item.item_id) "
+        "WHERE name IS NULL AND unit_cost IS NULL"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('sale_item', schema=None) as batch_op:
+        batch_op.drop_column('unit_cost')
+        batch_op.drop_column('name')
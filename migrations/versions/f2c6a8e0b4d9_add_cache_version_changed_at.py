@@ -0,0 +1,28 @@
+"""Add cache_version.changed_at
+
+Revision ID: f2c6a8e0b4d9
+Revises: e8b3d5f1a9c7
+Create Date: 2026-10-17 22:02:36.851470
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6a8e0b4d9'
+down_revision = 'e8b3d5f1a9c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing stamps stay NULL until their next bump; pages then fall back to the start of the day
+    if 'changed_at' not in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('cache_version')}:
+        with op.batch_alter_table('cache_version', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('changed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('cache_version', schema=None) as batch_op:
+        batch_op.drop_column('changed_at')
@@ -0,0 +1,70 @@
+"""
+Shared fixtures. The app is imported once against a throwaway SQLite database, and every
+test starts from empty tables and empty per-worker caches.
+
+    pip install -r requirements-dev.txt && python -m pytest -q
+"""
+
+import os
+import runpy
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='stock-tests-'), 'test.db')
+# A connection per thread, as gunicorn.conf.py sizes the pool for gthread workers: the threaded
+# tests run 8 request threads, and a smaller pool leaves them waiting on each other's connections
+os.environ['DB_POOL_SIZE'] = '8'
+
+import seed_data  # noqa: E402
+
+app_module = seed_data.load_app(os.environ['DATABASE_URL'])
+
+
+@pytest.fixture
+def app():
+    """The app module, inside an app context, with empty tables and caches."""
+    db = app_module.db
+    with app_module.app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        app_module.catalogue_cache.invalidate()
+        app_module.invalidate_sales_filter_values()
+        app_module.page_cache.clear()
+        yield app_module
+        db.session.remove()
+
+
+@pytest.fixture
+def login(app):
+    """login(username) -> a test client with that user's session ('admin', 'cashier1'..'cashier4')."""
+    seed_data.seed_users(app)
+
+    def client_for(username):
+        client = app.app.test_client()
+        response = client.post('/login', data={'username': username, 'password': seed_data.PASSWORD})
+        assert response.status_code == 302
+        return client
+    return client_for
+
+
+@pytest.fixture
+def load_gunicorn_conf(monkeypatch, tmp_path):
+    """
+    load_gunicorn_conf() -> gunicorn.conf.py's settings and hooks, with PROMETHEUS_MULTIPROC_DIR
+    at tmp_path/metrics. The environment it sets is restored afterwards.
+    """
+    for name, value in (('PROMETHEUS_MULTIPROC_DIR', str(tmp_path / 'metrics')),
+                        ('GUNICORN_WORKER_CLASS', 'sync'), ('GUNICORN_THREADS', '1')):
+        monkeypatch.setenv(name, value)
+    return lambda: SimpleNamespace(**runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py')))
+
+
+@pytest.fixture
+def gunicorn_conf(load_gunicorn_conf):
+    return load_gunicorn_conf()
@@ -0,0 +1,100 @@
+"""The batch checkout API the POS sends its offline sales to."""
+
+import pytest
+from sqlalchemy import event
+
+from test_checkout import add_item
+
+
+def offline_sale(item_id, quantity, key, price=5000.0, date='2026-03-01T10:00:00+03:00'):
+    return {'cart': [{'id': item_id, 'quantity': quantity, 'price': price}], 'payment_method': 'cash',
+            'total': price * quantity, 'date': date, 'idempotency_key': key}
+
+
+def post_batch(client, sales):
+    response = client.post('/api/checkout/batch', json={'sales': sales})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def stock(app, item_id):
+    app.db.session.expire_all()
+    return app.db.session.get(app.StockItem, item_id).quantity
+
+
+@pytest.fixture(params=['returning', 'no_returning'])
+def returning(request, app, monkeypatch):
+    """Run with INSERT .. RETURNING, and without it as on SQLite before 3.35."""
+    if request.param == 'returning':
+        yield request.param
+        return
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    monkeypatch.setattr(app.db.engine.dialect, 'insert_executemany_returning_sort_by_parameter_order', False)
+    event.listen(app.db.engine, 'before_cursor_execute', record)
+    yield request.param
+    event.remove(app.db.engine, 'before_cursor_execute', record)
+    assert not [statement for statement in statements if 'RETURNING' in statement.upper()]
+
+
+def test_batch_records_every_sale_in_order(app, login, returning):
+    item_id = add_item(app, 10)
+    data = post_batch(login('cashier1'), [offline_sale(item_id, n, f'key-{n}') for n in (1, 2, 3)])
+
+    assert data['created'] == 3 and data['failed'] == data['replayed'] == 0
+    sale_ids = [result['sale_id'] for result in data['results']]
+    sales = {sale.id: sale for sale in app.Sale.query}
+    assert [sales[sale_id].idempotency_key for sale_id in sale_ids] == ['key-1', 'key-2', 'key-3']
+    assert [sales[sale_id].items[0].quantity for sale_id in sale_ids] == [1, 2, 3]
+    assert all(sale.business_date.isoformat() == '2026-03-01' for sale in sales.values())
+    assert stock(app, item_id) == 4
+    assert app.DailyProductSales.query.one().quantity == 6
+
+
+def test_replayed_batch_writes_nothing(app, login, returning):
+    item_id = add_item(app, 10)
+    client = login('cashier1')
+    batch = [offline_sale(item_id, 2, 'key-a'), offline_sale(item_id, 1, 'key-b')]
+    first = post_batch(client, batch)
+
+    again = post_batch(client, batch)
+
+    assert again['created'] == 0 and again['replayed'] == 2
+    assert [r['sale_id'] for r in again['results']] == [r['sale_id'] for r in first['results']]
+    assert all(result['replayed'] for result in again['results'])
+    assert app.Sale.query.count() == 2
+    assert stock(app, item_id) == 7
+
+
+def test_repeated_key_in_a_batch_is_one_sale(app, login, returning):
+    item_id = add_item(app, 10)
+    data = post_batch(login('cashier1'), [offline_sale(item_id, 2, 'same'), offline_sale(item_id, 2, 'same')])
+
+    first, repeat = data['results']
+    assert first['status'] == repeat['status'] == 'ok'
+    assert repeat['sale_id'] == first['sale_id'] and repeat['replayed'] and not first['replayed']
+    assert app.Sale.query.count() == 1
+    assert stock(app, item_id) == 8
+
+
+def test_batch_records_the_sales_it_can(app, login, returning):
+    item_id = add_item(app, 5)
+    malformed = dict(offline_sale(item_id, 1, 'key-bad'), payment_method='')
+    data = post_batch(login('cashier1'), [
+        offline_sale(item_id, 3, 'key-1'),
+        offline_sale(item_id, 3, 'key-2'),        # only 2 left after the first sale
+        malformed,
+        offline_sale(item_id, 2, 'key-3'),
+        offline_sale(999999, 1, 'key-4'),          # no such item
+    ])
+
+    assert [result['status'] for result in data['results']] == ['ok', 'failed', 'failed', 'ok', 'failed']
+    assert 'Not enough stock' in data['results'][1]['errors'][0]
+    assert data['results'][2]['errors'] == ['payment_method is required']
+    assert 'not found' in data['results'][4]['errors'][0]
+    assert data['created'] == 2 and data['failed'] == 3
+    assert sorted(sale.idempotency_key for sale in app.Sale.query) == ['key-1', 'key-3']
+    assert stock(app, item_id) == 0
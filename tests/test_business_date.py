@@ -0,0 +1,88 @@
+"""Sale.business_date: the local (Africa/Nairobi, UTC+3) date of the sale, filled on insert and by migration."""
+
+import importlib.util
+import os
+from datetime import date, datetime
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import inspect
+
+from conftest import ROOT
+
+# (naive UTC sale time, local business date)
+SALE_TIMES = [
+    (datetime(2026, 3, 1, 20, 59, 59), date(2026, 3, 1)),   # 23:59:59 local
+    (datetime(2026, 3, 1, 21, 0, 0), date(2026, 3, 2)),     # local midnight
+    (datetime(2026, 3, 1, 21, 5, 0), date(2026, 3, 2)),     # just after local midnight
+    (datetime(2026, 2, 28, 22, 30, 0), date(2026, 3, 1)),   # across a month end
+    (datetime(2025, 12, 31, 23, 0, 0), date(2026, 1, 1)),   # across a year end
+]
+
+
+def business_dates(app):
+    app.db.session.expire_all()
+    return [(sale.date, sale.business_date) for sale in app.Sale.query.order_by(app.Sale.id)]
+
+
+def test_orm_insert_fills_the_business_date(app):
+    for sale_date, _ in SALE_TIMES:
+        app.db.session.add(app.Sale(date=sale_date, total_amount=1.0, payment_method='cash'))
+    app.db.session.commit()
+
+    assert business_dates(app) == SALE_TIMES
+
+
+def test_bulk_insert_fills_each_rows_business_date(app):
+    app.db.session.execute(app.db.insert(app.Sale), [
+        {'date': sale_date, 'total_amount': 1.0, 'payment_method': 'cash'} for sale_date, _ in SALE_TIMES
+    ])
+    app.db.session.commit()
+
+    assert business_dates(app) == SALE_TIMES
+
+
+def test_default_sale_time_gets_todays_business_date(app):
+    sale = app.Sale(total_amount=1.0, payment_method='cash')
+    app.db.session.add(sale)
+    app.db.session.commit()
+
+    assert sale.business_date == app.local_business_date(sale.date)
+
+
+def run_migration(app, filename):
+    path = os.path.join(ROOT, 'migrations', 'versions', filename)
+    spec = importlib.util.spec_from_file_location(filename[:-3], path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    with app.db.engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            migration.upgrade()
+
+
+def test_migration_backfills_existing_sales(app):
+    # Rows from before the column existed (Core insert: an explicit NULL, not the default)
+    app.db.session.execute(app.db.insert(app.Sale.__table__), [
+        {'date': sale_date, 'business_date': None, 'total_amount': 1.0} for sale_date, _ in SALE_TIMES
+    ] + [{'date': SALE_TIMES[0][0], 'business_date': date(2020, 1, 1), 'total_amount': 1.0}])
+    app.db.session.commit()
+    assert all(business_date is None for _, business_date in business_dates(app)[:-1])
+
+    run_migration(app, 'c5e1a9d3f7b2_add_sale_business_date.py')  # column and index exist, only the backfill runs
+
+    assert business_dates(app) == SALE_TIMES + [(SALE_TIMES[0][0], date(2020, 1, 1))]  # filled rows kept
+
+
+def test_filter_indexes_are_rekeyed_on_business_date(app):
+    with app.db.engine.begin() as connection:
+        for column in ('created_by', 'payment_method'):   # as left by migration 5c0e8a1f7b23
+            connection.exec_driver_sql(f'DROP INDEX ix_sale_{column}_business_date')
+            connection.exec_driver_sql(f'CREATE INDEX ix_sale_{column}_date ON sale ({column}, date)')
+
+    run_migration(app, 'd9f3b1c7e5a2_rekey_sale_filter_indexes_on_business_date.py')
+    run_migration(app, 'd9f3b1c7e5a2_rekey_sale_filter_indexes_on_business_date.py')  # already applied
+
+    indexes = {ix['name']: ix['column_names'] for ix in inspect(app.db.engine).get_indexes('sale')}
+    assert indexes['ix_sale_created_by_business_date'] == ['created_by', 'business_date']
+    assert indexes['ix_sale_payment_method_business_date'] == ['payment_method', 'business_date']
+    assert 'ix_sale_created_by_date' not in indexes and 'ix_sale_payment_method_date' not in indexes
@@ -0,0 +1,186 @@
+"""Checkout stock validation and decrements."""
+
+import json
+import random
+import threading
+import uuid
+from datetime import date
+
+import pytest
+
+
+def add_item(app, quantity, name='Samba OG White', price=5000.0):
+    item = app.StockItem(name=name, buying_price=price * 0.6, selling_price=price, quantity=quantity, size='42')
+    app.db.session.add(item)
+    app.db.session.commit()
+    return item.id
+
+
+def checkout_form(item_id, quantity, price=5000.0):
+    return {'cart': json.dumps([{'id': item_id, 'quantity': quantity, 'price': price}]),
+            'payment_method': 'cash', 'total': str(price * quantity if isinstance(quantity, (int, float)) else price),
+            'idempotency_key': uuid.uuid4().hex}
+
+
+@pytest.mark.parametrize('quantity', [-5, 0, 2.5, '3x', True])
+def test_checkout_rejects_invalid_quantities(app, login, quantity):
+    item_id = add_item(app, 8)
+    client = login('cashier1')
+
+    response = client.post('/checkout', data=checkout_form(item_id, quantity))
+
+    assert response.status_code == 302 and response.location.endswith('/pos')
+    app.db.session.expire_all()
+    assert app.db.session.get(app.StockItem, item_id).quantity == 8
+    assert app.Sale.query.count() == 0
+    assert app.DailyProductSales.query.count() == 0
+
+
+def test_checkout_accepts_whole_number_quantities(app, login):
+    item_id = add_item(app, 8)
+    client = login('cashier1')
+
+    assert client.post('/checkout', data=checkout_form(item_id, 3.0)).status_code == 200
+
+    app.db.session.expire_all()
+    assert app.db.session.get(app.StockItem, item_id).quantity == 5
+    assert app.SaleItem.query.one().quantity == 3
+    assert app.DailyProductSales.query.one().quantity == 3
+
+
+def test_batch_checkout_rejects_fractional_quantities(app, login):
+    item_id = add_item(app, 8)
+    client = login('cashier1')
+
+    response = client.post('/api/checkout/batch', json={'sales': [
+        {'cart': [{'id': item_id, 'quantity': 2.5, 'price': 5000.0}], 'payment_method': 'cash', 'total': 12500.0}
+    ]})
+
+    assert response.get_json()['results'][0]['status'] == 'failed'
+    app.db.session.expire_all()
+    assert app.db.session.get(app.StockItem, item_id).quantity == 8
+
+
+def test_concurrent_checkouts_never_oversell(app, login):
+    """Tills racing for a small stock: stock never goes negative and every sale matches a decrement."""
+    stock = {add_item(app, 10, name='Gazelle Blue'): 10, add_item(app, 6, name='Campus Grey'): 6}
+    item_ids = sorted(stock)
+    clients = [login(f'cashier{n % 4 + 1}') for n in range(8)]
+    sold = {item_id: 0 for item_id in item_ids}
+    sales, errors, lock = [], [], threading.Lock()
+    start = threading.Barrier(len(clients))
+
+    def till(n, client):
+        try:
+            sell(n, client)
+        except Exception as e:  # noqa: BLE001 - re-raised below
+            errors.append(e)
+
+    def sell(n, client):
+        rng = random.Random(n)
+        start.wait()
+        for _ in range(6):
+            # Both items, in either order, so concurrent carts lock rows in different orders
+            cart = [{'id': item_id, 'quantity': rng.randint(1, 2), 'price': 5000.0}
+                    for item_id in rng.sample(item_ids, 2)]
+            response = client.post('/checkout', data={
+                'cart': json.dumps(cart), 'payment_method': 'cash', 'idempotency_key': uuid.uuid4().hex,
+                'total': str(sum(line['quantity'] * line['price'] for line in cart))})
+            assert response.status_code in (200, 302), response.status_code
+            if response.status_code == 200:
+                with lock:
+                    sales.append(n)
+                    for line in cart:
+                        sold[line['id']] += line['quantity']
+
+    threads = [threading.Thread(target=till, args=(n, client)) for n, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    app.db.session.expire_all()
+    assert sales, 'no checkout went through'
+    assert len(sales) < 8 * 6, 'stock never ran out, nothing raced for it'
+    assert app.Sale.query.count() == len(sales)
+    for item_id in item_ids:
+        remaining = app.db.session.get(app.StockItem, item_id).quantity
+        recorded = app.db.session.query(app.db.func.sum(app.SaleItem.quantity)) \
+            .filter(app.SaleItem.item_id == item_id).scalar() or 0
+        assert remaining >= 0
+        assert stock[item_id] - remaining == recorded == sold[item_id]
+        assert (app.db.session.query(app.db.func.sum(app.DailyProductSales.quantity))
+                .filter(app.DailyProductSales.item_id == item_id).scalar() or 0) == recorded
+
+
+def test_rollup_rows_are_upserted_in_key_order(app, monkeypatch):
+    """Every checkout locks the rollup rows it touches in the same order, so two cannot deadlock."""
+    upserts = {}
+    monkeypatch.setattr(app, '_rollup_upsert', lambda model, rows, keys: upserts.setdefault(
+        model, [tuple(row[key] for key in keys) for row in rows]))
+    line = {'name': 'Samba', 'quantity': 1, 'revenue': 5000.0, 'cost': 3000.0}
+    today, yesterday = date(2026, 3, 2), date(2026, 3, 1)
+
+    app.record_sales_rollups([
+        (today, 10000.0, [dict(line, item_id=9), dict(line, item_id=2)]),
+        (yesterday, 5000.0, [dict(line, item_id=5)]),
+        (today, 5000.0, [dict(line, item_id=4)]),
+    ])
+
+    assert upserts[app.DailySalesSummary] == [(yesterday,), (today,)]
+    assert upserts[app.DailyProductSales] == [(yesterday, 5), (today, 2), (today, 4), (today, 9)]
+
+
+def test_checkout_replay_returns_the_original_sale(app, login):
+    item_id = add_item(app, 8)
+    client = login('cashier1')
+    form = checkout_form(item_id, 2)
+    first = client.post('/checkout', data=form)
+    sale = app.Sale.query.one()
+
+    again = client.post('/checkout', data=form)
+
+    assert again.status_code == 200 and again.get_data() == first.get_data()
+    app.db.session.expire_all()
+    assert app.Sale.query.one().id == sale.id
+    assert app.SaleItem.query.count() == 1
+    assert app.db.session.get(app.StockItem, item_id).quantity == 6
+    assert app.DailySalesSummary.query.one().sales_count == 1
+
+
+def test_checkout_with_a_new_key_is_a_new_sale(app, login):
+    item_id = add_item(app, 8)
+    client = login('cashier1')
+
+    for _ in range(2):
+        assert client.post('/checkout', data=checkout_form(item_id, 2)).status_code == 200
+
+    app.db.session.expire_all()
+    assert app.Sale.query.count() == 2
+    assert app.db.session.get(app.StockItem, item_id).quantity == 4
+
+
+def test_checkout_racing_the_same_key_shows_the_winners_sale(app, login, monkeypatch):
+    """A double tap whose first request commits between our key check and our insert."""
+    item_id = add_item(app, 8)
+    client = login('cashier1')
+    form = checkout_form(item_id, 2)
+    assert client.post('/checkout', data=form).status_code == 200
+    winner = app.Sale.query.one()
+    lookups = []
+    real_lookup = app.sale_for_idempotency_key
+
+    def lookup(key):
+        lookups.append(key)
+        return None if len(lookups) == 1 else real_lookup(key)  # the first check misses it
+
+    monkeypatch.setattr(app, 'sale_for_idempotency_key', lookup)
+    response = client.post('/checkout', data=form)
+
+    assert response.status_code == 200 and len(lookups) == 2  # the unique index raised, then found it
+    assert f'RCPT{winner.id}<'.encode() in response.get_data()
+    app.db.session.expire_all()
+    assert app.Sale.query.count() == 1
+    assert app.db.session.get(app.StockItem, item_id).quantity == 6
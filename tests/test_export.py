@@ -0,0 +1,53 @@
+"""Sales history export: streamed when small, written by a background job when large."""
+
+import csv
+import io
+import json
+
+from test_checkout import add_item
+from test_rollups import sell
+
+
+def make_sales(app, login):
+    item_id = add_item(app, 20)
+    client = login('cashier1')
+    for quantity in (1, 2, 3):
+        sell(client, item_id, quantity, 5000.0)
+    return item_id
+
+
+def test_export_streams_one_row_per_sale_line(app, login):
+    make_sales(app, login)
+
+    response = login('admin').get('/admin/export/sales')
+
+    assert response.status_code == 200 and response.mimetype == 'text/csv'
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == app.SALES_EXPORT_COLUMNS
+    assert [row[rows[0].index('quantity')] for row in rows[1:]] == ['1', '2', '3']
+
+
+def test_export_applies_the_sales_filters(app, login):
+    make_sales(app, login)
+
+    response = login('admin').get('/admin/export/sales?format=jsonl&min_amount=10000')
+
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['quantity'] for line in lines] == [2, 3]
+
+
+def test_large_export_runs_as_a_job(app, login, monkeypatch, tmp_path):
+    make_sales(app, login)
+    monkeypatch.setattr(app, 'SALES_EXPORT_STREAM_MAX', 2)
+    monkeypatch.setattr(app, 'BACKUP_DIR', str(tmp_path))
+
+    response = login('admin').get('/admin/export/sales?min_amount=1')
+
+    assert response.status_code == 302 and response.location.endswith('/admin/jobs')
+    assert app.wait_for_jobs(10)
+    job = app.BackgroundJob.query.one()
+    assert job.status == 'done', job.error
+    assert json.loads(job.params)['filters'] == {'min_amount': '1'}
+    with open(job.result_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == app.SALES_EXPORT_COLUMNS and len(rows) == 4
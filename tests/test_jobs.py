@@ -0,0 +1,89 @@
+"""Background jobs and the gunicorn hooks that keep max_requests from recycling a worker under them."""
+
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def blocking_job(app, monkeypatch):
+    """A registered job kind that runs until release is set."""
+    release = threading.Event()
+
+    def job(job_id, progress):
+        assert release.wait(10)
+        return 'Done', None
+
+    monkeypatch.setitem(app.JOB_TYPES, 'blocking', ('Blocking job', job))
+    yield release
+    release.set()
+    assert app.wait_for_jobs(10)
+
+
+def serve(conf, worker, method='GET'):
+    """What gunicorn's sync worker does per request: the hook, then count and maybe recycle."""
+    conf.pre_request(worker, SimpleNamespace(method=method, path='/'))
+    worker.nr += 1
+    if worker.nr >= worker.max_requests:
+        worker.alive = False
+
+
+def test_worker_is_not_recycled_while_a_job_runs(app, gunicorn_conf, blocking_job):
+    worker = SimpleNamespace(nr=0, max_requests=3, alive=True)
+    serve(gunicorn_conf, worker)
+    app.submit_job('blocking')
+    assert app.jobs_active() == 1
+
+    for _ in range(5):
+        serve(gunicorn_conf, worker)
+    assert worker.alive
+
+    blocking_job.set()
+    assert app.wait_for_jobs(10)
+    assert app.db.session.get(app.BackgroundJob, app.BackgroundJob.query.one().id).status == 'done'
+    serve(gunicorn_conf, worker)
+    assert not worker.alive
+
+
+def test_request_that_may_start_a_job_never_recycles_the_worker(app, gunicorn_conf):
+    worker = SimpleNamespace(nr=2, max_requests=3, alive=True)
+    serve(gunicorn_conf, worker, method='POST')
+    assert worker.alive
+    serve(gunicorn_conf, worker)
+    assert not worker.alive
+
+
+def test_jobs_without_a_recent_heartbeat_are_marked_interrupted(app):
+    now = datetime.utcnow()
+    stale, fresh, finished = (
+        app.BackgroundJob(kind='backup', status='running', worker='old-container:7',
+                          heartbeat_at=now - timedelta(seconds=app.JOB_STALE_AFTER + 5)),
+        app.BackgroundJob(kind='backup', status='running', worker='other-host:1', heartbeat_at=now),
+        app.BackgroundJob(kind='backup', status='done', worker='old-container:8',
+                          heartbeat_at=now - timedelta(days=1)),
+    )
+    app.db.session.add_all([stale, fresh, finished])
+    app.db.session.commit()
+
+    app.mark_interrupted_jobs()
+
+    app.db.session.expire_all()
+    assert stale.status == 'failed' and stale.message.startswith('Interrupted')
+    assert fresh.status == 'running'
+    assert finished.status == 'done'
+
+
+def test_running_jobs_keep_their_heartbeat_fresh(app, blocking_job):
+    job_id = app.submit_job('blocking')
+    long_ago = datetime.utcnow() - timedelta(days=1)
+    app.db.session.execute(app.db.update(app.BackgroundJob).values(heartbeat_at=long_ago))
+    app.db.session.commit()
+
+    app.touch_job_heartbeats()
+    app.mark_interrupted_jobs()
+
+    job = app.db.session.get(app.BackgroundJob, job_id)
+    assert job.heartbeat_at > long_ago
+    assert job.status in ('queued', 'running')
@@ -0,0 +1,36 @@
+"""Prometheus metrics: /metrics and the multiprocess directory gunicorn.conf.py prepares."""
+
+
+def test_startup_clears_only_metric_files(load_gunicorn_conf, tmp_path):
+    metrics_dir = tmp_path / 'metrics'
+    metrics_dir.mkdir()
+    (metrics_dir / 'counter_1234.db').write_bytes(b'stale')
+    (metrics_dir / 'notes.txt').write_text('not ours')
+    (metrics_dir / 'archive').mkdir()
+
+    load_gunicorn_conf()
+
+    assert sorted(path.name for path in metrics_dir.iterdir()) == ['archive', 'notes.txt']
+
+
+def lookups(result):
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value('catalogue_cache_lookups_total', {'result': result}) or 0
+
+
+def test_catalogue_cache_counts_hits_and_misses(app, login):
+    app.db.session.add(app.StockItem(name='Samba', buying_price=1, selling_price=2, quantity=3))
+    app.db.session.commit()
+    cache = app.CatalogueCache(check_interval=3600, max_age=3600)
+    hits, misses = lookups('hit'), lookups('miss')
+
+    cache.items()
+    cache.items()
+
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+    assert (lookups('hit') - hits, lookups('miss') - misses) == (1, 1)
+
+    client = login('admin')
+    client.get('/admin/stock')  # the shared cache: a miss, or a hit if already loaded
+    assert 'catalogue_cache_lookups_total{result="hit"}' in client.get('/metrics').get_data(as_text=True)
+    assert 'Catalogue cache:' in client.get('/admin/perf').get_data(as_text=True)
@@ -0,0 +1,63 @@
+"""Cached report pages and receipts: ETag / 304, invalidation after writes, flash messages."""
+
+from test_checkout import add_item
+from test_rollups import sell
+
+
+def test_unchanged_page_answers_304(app, login):
+    client = login('admin')
+    first = client.get('/sales')
+    etag = first.headers['ETag']
+
+    again = client.get('/sales', headers={'If-None-Match': etag})
+
+    assert first.status_code == 200 and etag.startswith('W/')
+    assert 'no-cache' in first.headers['Cache-Control'] and 'private' in first.headers['Cache-Control']
+    assert again.status_code == 304 and again.headers['ETag'] == etag
+
+
+def test_page_changes_after_a_sale(app, login):
+    item_id = add_item(app, 5, name='Gazelle Indoor')
+    admin = login('admin')
+    before = admin.get('/sales')
+    assert 'Gazelle Indoor' not in before.get_data(as_text=True)
+
+    sell(login('cashier1'), item_id, 1, 5000.0)
+    after = admin.get('/sales', headers={'If-None-Match': before.headers['ETag']})
+
+    assert after.status_code == 200 and after.headers['ETag'] != before.headers['ETag']
+    assert 'Gazelle Indoor' in after.get_data(as_text=True)
+
+
+def test_pending_flash_bypasses_the_cache(app, login):
+    client = login('admin')
+    cached = client.get('/sales')
+    with client.session_transaction() as session:
+        session['_flashes'] = [('info', 'Backup started (job #7).')]
+
+    response = client.get('/sales', headers={'If-None-Match': cached.headers['ETag']})
+
+    assert response.status_code == 200
+    assert 'Backup started (job #7).' in response.get_data(as_text=True)
+    assert 'Backup started' not in client.get('/sales').get_data(as_text=True)  # shown once, not cached
+
+
+def test_receipt_validator_changes_when_a_sale_id_is_reused(app, login):
+    item_id = add_item(app, 5)
+    client = login('cashier1')
+    sell(client, item_id, 1, 5000.0)
+    sale_id = app.Sale.query.one().id
+    receipt = client.get(f'/receipt/{sale_id}')
+    etag = receipt.headers['ETag']
+    assert not etag.startswith('W/') and receipt.cache_control.max_age > 0
+    assert client.get(f'/receipt/{sale_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    # A sales reset, then a new sale that gets the same id (SQLite reuses it)
+    app.SaleItem.query.delete()
+    app.Sale.query.delete()
+    app.db.session.commit()
+    sell(client, item_id, 2, 5000.0)
+    assert app.Sale.query.one().id == sale_id
+
+    response = client.get(f'/receipt/{sale_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
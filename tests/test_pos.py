@@ -0,0 +1,41 @@
+"""The POS product APIs: search as the cashier types, and the catalogue kept for offline use."""
+
+import pytest
+
+
+@pytest.fixture
+def products(app):
+    app.db.session.add_all([
+        app.StockItem(name=name, buying_price=1000, selling_price=price, quantity=quantity, size='42')
+        for name, price, quantity in (('Nike Cortez', 7000, 5), ('Adidas Samba', 8000, 3), ('Puma Suede', 5000, 0))
+    ])
+    app.db.session.commit()
+
+
+@pytest.mark.parametrize('cached', [True, False])
+def test_catalogue_lists_in_stock_products_by_name(app, login, products, monkeypatch, cached):
+    if not cached:
+        monkeypatch.setattr(app.catalogue_cache, 'items', lambda: None)  # catalogue too large to cache
+
+    data = login('cashier1').get('/api/products/catalogue').get_json()
+
+    assert [row[1:] for row in data['products']] == [['Adidas Samba', 8000, '42', 3], ['Nike Cortez', 7000, '42', 5]]
+    assert data['complete']
+
+
+def test_catalogue_is_capped(app, login, products, monkeypatch):
+    monkeypatch.setattr(app, 'OFFLINE_CATALOGUE_MAX', 1)
+
+    data = login('cashier1').get('/api/products/catalogue').get_json()
+
+    assert [row[1] for row in data['products']] == ['Adidas Samba']
+    assert not data['complete']
+
+
+def test_catalogue_needs_a_login(app):
+    assert app.app.test_client().get('/api/products/catalogue').status_code == 401
+
+
+def test_pos_page_knows_where_the_offline_catalogue_is(app, login):
+    page = login('cashier1').get('/pos').get_data(as_text=True)
+    assert '/api/products/catalogue' in page
@@ -0,0 +1,49 @@
+"""Sales pages run a fixed number of SQL statements, however many sales and lines there are."""
+
+import random
+
+import pytest
+from sqlalchemy import event
+
+import seed_data
+
+# Statements per request once the per-worker caches are warm
+MAX_STATEMENTS = {
+    '/sales': 5,            # page stamp, page of sales, their items, day subtotals, filtered totals
+    '/sales?payment_method=mpesa&seller=cashier1': 5,
+    '/sales-viewer': 2,     # page of sales, their items
+}
+
+
+def statements_per_request(app, client, route):
+    """SQL statements one (uncached) GET of route runs, after a warm-up request."""
+    count = [0]
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        count[0] += 1
+
+    app.page_cache.clear()
+    assert client.get(route).status_code == 200
+    app.page_cache.clear()
+    event.listen(app.db.engine, 'before_cursor_execute', record)
+    try:
+        assert client.get(route).status_code == 200
+    finally:
+        event.remove(app.db.engine, 'before_cursor_execute', record)
+    return count[0]
+
+
+@pytest.mark.parametrize('route', sorted(MAX_STATEMENTS))
+def test_sales_pages_run_a_bounded_number_of_statements(app, login, route):
+    rng = random.Random(3)
+    sellers = seed_data.seed_users(app)
+    seed_data.seed_stock(app, 40, rng)
+    client = login('admin')
+
+    counts = []
+    for size in (60, 600):
+        seed_data.seed_sales(app, size - app.Sale.query.count(), 0.2, sellers, rng)
+        app.invalidate_sales_filter_values()
+        counts.append(statements_per_request(app, client, route))
+
+    assert counts[0] == counts[1] <= MAX_STATEMENTS[route], counts
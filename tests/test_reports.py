@@ -0,0 +1,97 @@
+"""Report queries over the daily rollups: period comparison, best sellers per day/week/month."""
+
+from datetime import date, timedelta
+
+import pytest
+
+
+def add_product_day(app, day, name, quantity, item_id=None, price=100.0, cost=60.0):
+    app.db.session.add(app.DailyProductSales(
+        business_date=day, item_id=item_id or sum(map(ord, name)), name=name, quantity=quantity,
+        revenue=price * quantity, cost=cost * quantity, profit=(price - cost) * quantity))
+
+
+def test_period_comparison_against_the_previous_period_of_the_same_length(app):
+    for offset, revenue in ((0, 500.0), (6, 300.0), (7, 400.0), (13, 800.0), (14, 999.0)):
+        day = date(2026, 3, 14) - timedelta(days=offset)   # current week 8..14 March, previous 1..7
+        app.db.session.add(app.DailySalesSummary(business_date=day, sales_count=1, revenue=revenue,
+                                                 cost=revenue / 2, profit=revenue / 2))
+    add_product_day(app, date(2026, 3, 9), 'Samba', 2)       # profit 80
+    add_product_day(app, date(2026, 3, 2), 'Samba', 1)       # profit 40
+    add_product_day(app, date(2026, 3, 9), 'Gazelle', 10)
+    app.db.session.commit()
+
+    comparison = app.period_comparison(date(2026, 3, 8), date(2026, 3, 14), 'Samba')
+
+    assert comparison == {
+        'current': {'revenue': 800.0, 'profit': 400.0, 'product_profit': 80.0},
+        'previous': {'revenue': 1200.0, 'profit': 600.0, 'product_profit': 40.0},
+    }
+    assert app.percent_change(800.0, 1200.0) == pytest.approx(-33.333, abs=0.001)
+    assert app.percent_change(5.0, 0.0) == 0.0
+
+
+def test_period_comparison_with_no_sales(app):
+    assert app.period_comparison(date(2026, 3, 8), date(2026, 3, 14), 'Samba') == {
+        'current': {'revenue': 0.0, 'profit': 0.0, 'product_profit': 0.0},
+        'previous': {'revenue': 0.0, 'profit': 0.0, 'product_profit': 0.0},
+    }
+
+
+def test_week_and_month_start_dates(app):
+    days = [date(2025, 12, 20) + timedelta(days=n) for n in range(80)]  # over a year and month ends
+    for n, day in enumerate(days):
+        add_product_day(app, day, 'Samba', 1, item_id=n + 1)
+    app.db.session.commit()
+    column = app.DailyProductSales.business_date
+
+    rows = app.db.session.query(column, app.period_start_expr(column, 'week'),
+                                app.period_start_expr(column, 'month')).all()
+
+    assert len(rows) == len(days)
+    for day, week, month in rows:
+        day = date.fromisoformat(app.format_day_bucket(day))
+        assert app.format_day_bucket(week) == (day - timedelta(days=day.weekday())).isoformat(), day
+        assert app.format_day_bucket(month) == day.replace(day=1).isoformat(), day
+
+
+@pytest.fixture
+def best_seller_sales(app):
+    add_product_day(app, date(2026, 2, 28), 'Gazelle', 5)   # Saturday, the week of Mon 23 February
+    add_product_day(app, date(2026, 3, 2), 'Samba', 3)      # Monday
+    add_product_day(app, date(2026, 3, 7), 'Gazelle', 2)
+    add_product_day(app, date(2026, 3, 8), 'Gazelle', 2)    # Sunday, same week
+    add_product_day(app, date(2026, 3, 9), 'Samba', 1)      # next Monday
+    app.db.session.commit()
+
+
+def ranking(periods):
+    return [(period['period'], [(item['rank'], item['name'], item['quantity']) for item in period['items']])
+            for period in periods]
+
+
+def test_top_sellers_by_week(app, best_seller_sales):
+    assert ranking(app.top_sellers(date(2026, 2, 1), date(2026, 3, 31), 'week', k=2)) == [
+        ('2026-02-23', [(1, 'Gazelle', 5)]),
+        ('2026-03-02', [(1, 'Gazelle', 4), (2, 'Samba', 3)]),
+        ('2026-03-09', [(1, 'Samba', 1)]),
+    ]
+
+
+def test_top_sellers_by_month_break_ties_by_name(app, best_seller_sales):
+    assert ranking(app.top_sellers(date(2026, 2, 1), date(2026, 3, 31), 'month', k=2)) == [
+        ('2026-02-01', [(1, 'Gazelle', 5)]),
+        ('2026-03-01', [(1, 'Gazelle', 4), (2, 'Samba', 4)]),
+    ]
+
+
+def test_top_sellers_only_count_sales_inside_the_range(app, best_seller_sales):
+    assert ranking(app.top_sellers(date(2026, 3, 3), date(2026, 3, 8), 'week', k=2)) == [
+        ('2026-03-02', [(1, 'Gazelle', 4)]),
+    ]
+    assert ranking(app.top_sellers(date(2026, 3, 1), date(2026, 3, 9), 'day')) == [
+        ('2026-03-02', [(1, 'Samba', 3)]),
+        ('2026-03-07', [(1, 'Gazelle', 2)]),
+        ('2026-03-08', [(1, 'Gazelle', 2)]),
+        ('2026-03-09', [(1, 'Samba', 1)]),
+    ]
@@ -0,0 +1,38 @@
+"""Daily rollups: maintained at checkout, and rebuilt from the sale rows with rebuild_rollups()."""
+
+import json
+import uuid
+
+
+def sell(client, item_id, quantity, price):
+    cart = [{'id': item_id, 'quantity': quantity, 'price': price}]
+    response = client.post('/checkout', data={'cart': json.dumps(cart), 'payment_method': 'cash',
+                                              'total': str(quantity * price), 'idempotency_key': uuid.uuid4().hex})
+    assert response.status_code == 200
+
+
+def product_rows(app):
+    return sorted((row.name, row.quantity, row.revenue, row.profit) for row in app.DailyProductSales.query)
+
+
+def summary_totals(app):
+    return [(row.sales_count, row.revenue, row.profit) for row in app.DailySalesSummary.query]
+
+
+def test_rebuild_keeps_the_sales_of_deleted_items(app, login):
+    items = [app.StockItem(name=name, buying_price=price / 2, selling_price=price, quantity=10, size='42')
+             for name, price in (('Samba', 30.0), ('Gazelle', 20.0), ('Campus', 10.0))]
+    app.db.session.add_all(items)
+    app.db.session.commit()
+    client = login('cashier1')
+    for item, quantity in zip(items, (1, 2, 3)):
+        sell(client, item.id, quantity, item.selling_price)
+    before = product_rows(app), summary_totals(app)
+
+    for item in items[1:]:
+        login('admin').get(f'/admin/stock/delete/{item.id}')
+    assert app.SaleItem.query.filter(app.SaleItem.item_id.is_(None)).count() == 2
+    app.rebuild_rollups()
+
+    assert (product_rows(app), summary_totals(app)) == before
+    assert sum(row[2] for row in before[0]) == before[1][0][1] == 100.0
@@ -0,0 +1,88 @@
+"""Bulk CSV stock import: upserts keyed by name + size, rejected rows, batch boundaries."""
+
+import io
+
+import pytest
+
+HEADER = 'name,size,buying_price,selling_price,quantity,description\n'
+
+
+def run_import(app, body, add_quantities=False):
+    summary = app.import_stock_csv(io.StringIO(HEADER + body), add_quantities=add_quantities)
+    app.db.session.commit()
+    return summary
+
+
+def stock(app):
+    app.db.session.expire_all()
+    return {(item.name, item.size): (item.buying_price, item.selling_price, item.quantity)
+            for item in app.StockItem.query}
+
+
+@pytest.fixture
+def samba(app):
+    app.db.session.add(app.StockItem(name='Samba', size='42', buying_price=3000, selling_price=5000, quantity=4))
+    app.db.session.commit()
+
+
+@pytest.mark.parametrize('add_quantities, quantity', [(False, 6), (True, 10)])
+def test_import_updates_existing_items_and_adds_new_ones(app, samba, add_quantities, quantity):
+    summary = run_import(app, 'Samba,42,3200,5500,6,restock\n'
+                              'Samba,43,3200,5500,2,\n'
+                              'Cortez,,2000,4000,"1,000",\n', add_quantities)
+
+    assert (summary['rows'], summary['inserted'], summary['updated'], summary['rejected']) == (3, 2, 1, 0)
+    assert stock(app) == {('Samba', '42'): (3200, 5500, quantity), ('Samba', '43'): (3200, 5500, 2),
+                          ('Cortez', None): (2000, 4000, 1000)}
+    assert app.StockItem.query.filter_by(size='42').one().description == 'restock'
+
+
+def test_import_rejects_malformed_rows_and_keeps_the_rest(app):
+    summary = run_import(app, 'Gazelle,40,2000,4000,3,\n'
+                              ',41,2000,4000,3,\n'
+                              'Campus,41,abc,4000,2.5,\n'
+                              'Superstar,41,2000,-1,,\n'
+                              'Forum,42,2500,4500,1,\n')
+
+    assert (summary['rows'], summary['inserted'], summary['rejected']) == (5, 2, 3)
+    assert summary['errors'] == [
+        (3, ['name is required']),
+        (4, ['buying_price "abc" is not a valid number', 'quantity "2.5" is not a valid whole number']),
+        (5, ['selling_price cannot be negative', 'quantity is required']),
+    ]
+    assert set(stock(app)) == {('Gazelle', '40'), ('Forum', '42')}
+
+
+def test_import_needs_the_required_columns(app):
+    summary = app.import_stock_csv(io.StringIO('name,price\nSamba,5000\n'))
+
+    assert summary['errors'] == [(1, ['missing column(s): buying_price, selling_price, quantity'])]
+    assert app.StockItem.query.count() == 0
+
+
+@pytest.mark.parametrize('add_quantities, quantity', [(False, 2), (True, 9)])
+def test_import_across_batch_boundaries(app, samba, monkeypatch, add_quantities, quantity):
+    monkeypatch.setattr(app, 'STOCK_IMPORT_BATCH', 2)
+    rows = [f'Model {n},40,1000,2000,1,\n' for n in range(5)]
+    # Samba 42 appears in the first and the third batch, and twice within the third
+    rows[1:1] = ['Samba,42,3000,5000,1,\n']
+    rows[4:4] = ['Samba,42,3000,5000,2,\n', 'Samba,42,3100,5100,2,\n']
+
+    summary = run_import(app, ''.join(rows), add_quantities)
+
+    assert summary['rows'] == 8 and summary['rejected'] == 0
+    assert summary['inserted'] == 5
+    assert stock(app)[('Samba', '42')] == (3100, 5100, quantity)
+    assert app.StockItem.query.count() == 6
+
+
+def test_import_page_reports_the_summary(app, login):
+    client = login('admin')
+    response = client.post('/admin/stock/import', data={
+        'file': (io.BytesIO((HEADER + 'Samba,42,3000,5000,4,\nbad,42,x,5000,4,\n').encode('utf-8-sig')), 'stock.csv'),
+        'quantity_mode': 'replace'
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert 'Imported 1 of 2 rows (1 new, 0 updated, 1 rejected).' in response.get_data(as_text=True)
+    assert set(stock(app)) == {('Samba', '42')}
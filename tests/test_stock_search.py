@@ -0,0 +1,69 @@
+"""Stock search on SQLite, with and without the FTS5 trigram index."""
+
+import pytest
+from sqlalchemy import event
+
+
+def add_items(app):
+    app.db.session.add_all([
+        app.StockItem(name='Adidas Samba OG', buying_price=5000, selling_price=8000, quantity=3,
+                      size='42', description='white leather'),
+        app.StockItem(name='Nike Cortez', buying_price=4000, selling_price=7000, quantity=5,
+                      size='41', description='classic samba-style sole'),
+        app.StockItem(name='Puma Suede', buying_price=3000, selling_price=5000, quantity=2,
+                      size='40', description='blue suede'),
+    ])
+    app.db.session.commit()
+
+
+@pytest.fixture
+def without_trigram(app, monkeypatch):
+    """Drop the index and make the tokenizer unavailable, as on SQLite older than 3.34."""
+    def drop_index():
+        with app.db.engine.begin() as conn:
+            for trigger in ('stock_item_fts_ai', 'stock_item_fts_ad', 'stock_item_fts_au'):
+                conn.execute(app.db.text(f'DROP TRIGGER IF EXISTS {trigger}'))
+            conn.execute(app.db.text('DROP TABLE IF EXISTS stock_item_fts'))
+
+    drop_index()
+    monkeypatch.setattr(app, 'STOCK_SEARCH_FTS_TOKENIZER', 'no_such_tokenizer')
+    yield app
+    monkeypatch.undo()
+    drop_index()
+    app.ensure_stock_search_index()
+    assert app.sqlite_fts_available()
+
+
+def test_search_uses_the_index(app):
+    add_items(app)
+    assert app.sqlite_fts_available()
+    assert [item.name for item in app.search_stock('samba')] == ['Adidas Samba OG', 'Nike Cortez']
+
+
+def test_index_creation_failure_falls_back_to_like(without_trigram):
+    app = without_trigram
+    app.ensure_stock_search_index()  # must not raise: the app still starts
+
+    add_items(app)
+    assert not app.sqlite_fts_available()
+    assert [item.name for item in app.search_stock('samba')] == ['Adidas Samba OG', 'Nike Cortez']
+    assert [item.name for item in app.search_stock('SUEDE')] == ['Puma Suede']
+
+
+def test_short_terms_are_case_insensitive_and_literal(app):
+    add_items(app)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(app.db.engine, 'before_cursor_execute', record)
+    try:
+        assert [item.name for item in app.search_stock('og')] == ['Adidas Samba OG']
+    finally:
+        event.remove(app.db.engine, 'before_cursor_execute', record)
+    # ILIKE, which SQLite renders as lower() LIKE lower(): a plain LIKE is case-sensitive on PostgreSQL
+    assert 'lower(stock_item.name) LIKE lower(?)' in statements[-1]
+
+    assert [item.name for item in app.search_stock('4_')] == []
+    assert [item.name for item in app.search_stock('%')] == []
@@ -0,0 +1,110 @@
+"""Per-worker state shared by gthread request threads: sales filter values and the catalogue cache."""
+
+import random
+import sys
+import threading
+
+import pytest
+
+import seed_data
+
+THREADS = 8
+ROUNDS = 3000   # writes per writer thread: enough to lose updates without the locks
+RELOADS = 30
+
+
+@pytest.fixture(autouse=True)
+def frequent_switches():
+    # Switch threads every microsecond so unguarded read-modify-writes actually interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def hammer(app, workers):
+    """Run each worker(n) on its own thread with its own app context; re-raise the first error."""
+    errors = []
+    start = threading.Barrier(len(workers))
+
+    def run(n, worker):
+        with app.app.app_context():
+            try:
+                start.wait()
+                worker(n)
+            except Exception as e:  # noqa: BLE001 - reported below
+                errors.append(e)
+            finally:
+                app.db.session.remove()
+
+    threads = [threading.Thread(target=run, args=(n, worker)) for n, worker in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def test_sales_filter_values_under_concurrent_notes(app):
+    app.db.session.add(app.Sale(created_by='admin', payment_method='cash', total_amount=1.0))
+    app.db.session.commit()
+    app.sales_filter_values()  # load, so notes are applied in place
+
+    def noter(n):
+        for i in range(ROUNDS):
+            app.note_sales_filter_values(f'seller{n}-{i}', f'method{n}-{i % 7}')
+
+    def reader(n):
+        for _ in range(ROUNDS // 10):
+            sellers, methods = app.sales_filter_values()
+            assert sellers == sorted(sellers) and methods == sorted(methods)
+
+    hammer(app, [noter] * (THREADS // 2) + [reader] * (THREADS // 2))
+
+    sellers, methods = app.sales_filter_values()
+    assert len(sellers) == 1 + THREADS // 2 * ROUNDS
+    assert len(methods) == 1 + THREADS // 2 * 7
+
+
+def test_catalogue_cache_applies_every_concurrent_sale(app):
+    seed_data.seed_stock(app, 50, random.Random(1))
+    item = app.StockItem.query.order_by(app.StockItem.id).first()
+    item_id, start = item.id, item.quantity
+    cache = app.CatalogueCache(check_interval=3600, max_age=3600)
+    cache.items()
+
+    def seller(n):
+        for _ in range(ROUNDS):
+            cache.apply_sale({item_id: 1})
+
+    def reader(n):
+        for _ in range(ROUNDS // 10):
+            assert len(cache.items()) == 50
+            cache.search('nike', 10)
+
+    hammer(app, [seller] * (THREADS // 2) + [reader] * (THREADS // 2))
+
+    assert {item.id: item for item in cache.items()}[item_id].quantity == start - THREADS // 2 * ROUNDS
+
+
+def test_catalogue_cache_reloads_concurrently(app):
+    seed_data.seed_stock(app, 50, random.Random(2))
+    cache = app.CatalogueCache(check_interval=0, max_age=3600)
+
+    def invalidator(n):
+        for _ in range(RELOADS):
+            app.catalogue_changed()
+            app.db.session.commit()
+            cache.invalidate()
+
+    def worker(n):
+        for i in range(RELOADS):
+            items = cache.items()
+            assert items is not None and len(items) == 50
+            cache.apply_sale({items[i % 50].id: 1})
+
+    hammer(app, [invalidator] * 2 + [worker] * (THREADS - 2))
+
+    assert len(cache.items()) == 50
+    assert cache.stats()['misses'] > 1  # it really reloaded while the others read and sold